@@ -0,0 +1,117 @@
+'''
+End-to-end throughput of LaceworkInterface and report generation against the local mock Lacework API
+(benchmarks/mock_lacework_api.py).
+
+Each fetch method of LaceworkInterface is timed on its own, then the detailed report is gathered and rendered
+end to end. Server side counters (requests per endpoint, statuses, records, peak concurrent requests, injected errors
+and 429s) are recorded with every measurement so fetch concurrency, retry and paging behaviour can be compared:
+
+    python -m benchmarks.api_throughput --scale 100000 --page-size 1000 --latency 0.05
+    python -m benchmarks.api_throughput --scale 100000 --error-rate 0.02 --rate-limit 20 --output results.json
+'''
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+
+import logzero
+
+from benchmarks.mock_lacework_api import MockLaceworkAPI
+from benchmarks.run_benchmarks import basedir
+from modules.instrumentation import tracer
+from modules.lacework_interface import LaceworkInterface
+from modules.reports.reportgen_csa_detailed import ReportGenCSADetailed
+from modules.utils import LaceworkTime
+
+
+class MockAPIReport(ReportGenCSADetailed):
+
+    def __init__(self, lacework_interface):
+        self._mock_interface = lacework_interface
+        super().__init__(basedir)
+
+    def connect(self, api_key_file=None):
+        self.lacework_interface = self._mock_interface
+
+
+def measure(api: MockLaceworkAPI, func) -> dict:
+    api.reset_stats()
+    error = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            error = f'{type(e).__name__}: {str(e)}'
+        wall_s = time.perf_counter() - start
+    stats = api.get_stats()
+    stats.pop('in_flight')
+    return {'wall_s': round(wall_s, 4),
+            'requests_per_s': round(stats['requests'] / wall_s, 1) if wall_s else None,
+            'records_per_s': round(stats['records_served'] / wall_s, 1) if wall_s else None,
+            'error': error,
+            **stats}
+
+
+def get_benchmarks(lacework_interface: LaceworkInterface) -> list:
+    vulns_start, vulns_end = LaceworkTime('1:1').generate_time_string(), LaceworkTime('0:0').generate_time_string()
+    alerts_start, alerts_end = LaceworkTime('7:0').generate_time_string(), LaceworkTime('0:0').generate_time_string()
+    report = MockAPIReport(lacework_interface)
+    return [
+        ('get_cfg_account_ids', lacework_interface.get_cfg_account_ids),
+        ('get_compliance_reports', lambda: [lacework_interface.get_compliance_reports(cloud_provider=cloud_provider)
+                                            for cloud_provider in ('AWS', 'AZURE', 'GCP')]),
+        ('get_host_vulns', lambda: lacework_interface.get_host_vulns(vulns_start, vulns_end)),
+        ('get_container_vulns', lambda: lacework_interface.get_container_vulns(vulns_start, vulns_end)),
+        ('get_alerts', lambda: lacework_interface.get_alerts(alerts_start, alerts_end)),
+        ('get_secrets', lambda: lacework_interface.get_secrets(alerts_start, alerts_end)),
+        ('report_end_to_end', lambda: report.generate('Benchmark Customer', 'Benchmark Author')),
+    ]
+
+
+def run(iterations: int, **mock_options) -> dict:
+    results = []
+    with MockLaceworkAPI(**mock_options) as api:
+        lacework_interface = LaceworkInterface(lacework_client=api.client())
+        for iteration in range(iterations):
+            for name, func in get_benchmarks(lacework_interface):
+                result = {'benchmark': name, 'iteration': iteration, **measure(api, func)}
+                print(f"{name:<24} {result['wall_s']:>9.3f}s {result['requests']:>6} req "
+                      f"{result['records_per_s']:>12} rec/s  max in flight {result['max_in_flight']}"
+                      f"{'  ' + result['error'] if result['error'] else ''}", file=sys.stderr)
+                results.append(result)
+    return {'settings': {'iterations': iterations, **mock_options}, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure report throughput against a local mock Lacework API.')
+    parser.add_argument('--scale', type=int, default=10000, help='Number of host and container vulnerability records')
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--max-pages', type=int, default=100, help='Pages returned per search before truncating')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 503')
+    parser.add_argument('--rate-limit', type=float, default=None, help='Requests per second before returning 429s')
+    parser.add_argument('--iterations', type=int, default=1)
+    parser.add_argument('--output', type=str, help='Write the JSON results to this file')
+    parser.add_argument('--trace-file', type=str, help='Write a Chrome trace of every stage to this file')
+    args = parser.parse_args()
+
+    logzero.loglevel(logzero.CRITICAL)
+    if args.trace_file:
+        tracer.enable()
+    results = run(args.iterations, scale=args.scale, page_size=args.page_size, max_pages=args.max_pages,
+                  latency=args.latency, error_rate=args.error_rate, rate_limit=args.rate_limit)
+    if args.trace_file:
+        tracer.export(args.trace_file, trace_format='chrome')
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+'''
+Measure the start-up cost of lw_report_gen.
+
+Runs the CLI in fresh interpreters for the commands that should never touch the Lacework API or load the
+reporting libraries (--help, --list-reports) and records their wall time, plus the heaviest modules reported by
+"python -X importtime" for a --list-reports run. Results are printed as JSON.
+
+    python benchmarks/import_time.py --runs 5 --output import_time.json
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+basedir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+entry_point = os.path.join(basedir, 'lw_report_gen.py')
+commands = {'help': ['--help'],
+            'list_reports': ['--list-reports']}
+# libraries that should only be imported once a report actually runs
+heavy_modules = ('pandas', 'plotly', 'jinja2', 'laceworksdk', 'weasyprint', 'PySide6')
+
+
+def run_command(args: list, env: dict, cwd: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, entry_point] + args, env=env, cwd=cwd, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL, check=False)
+    return time.perf_counter() - start
+
+
+def parse_importtime(stderr: str, top: int) -> dict:
+    # lines look like "import time:       self [us] |  cumulative | imported package"
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, self_us, cumulative_us, name = line.replace('import time:', '|', 1).split('|')
+        # nested imports are indented by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append({'module': name.strip(), 'self_us': int(self_us), 'cumulative_us': int(cumulative_us),
+                        'depth': depth})
+    top_level = [module for module in modules if module.pop('depth') == 0]
+    loaded = {module['module'].split('.')[0] for module in modules}
+    return {'total_us': sum(module['self_us'] for module in modules),
+            'heaviest': sorted(top_level, key=lambda x: x['cumulative_us'], reverse=True)[:top],
+            'heavy_modules_loaded': sorted(loaded.intersection(heavy_modules))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark lw_report_gen start-up time.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='Number of heaviest imports to report')
+    parser.add_argument('--output', type=str, help='Write the JSON results to this file')
+    args = parser.parse_args()
+
+    # dummy credentials, the measured commands must not contact the API
+    env = {**os.environ, 'LW_ACCOUNT': 'benchmark', 'LW_API_KEY': 'benchmark', 'LW_API_SECRET': 'benchmark'}
+    results = {'python': sys.version.split()[0], 'runs': args.runs, 'commands': {}}
+    with tempfile.TemporaryDirectory() as cwd:
+        for name, command_args in commands.items():
+            timings = [run_command(command_args, env, cwd) for _ in range(args.runs)]
+            results['commands'][name] = {'min_s': min(timings),
+                                         'median_s': statistics.median(timings),
+                                         'max_s': max(timings)}
+        completed = subprocess.run([sys.executable, '-X', 'importtime', entry_point, '--list-reports'], env=env,
+                                   cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=False)
+        results['importtime'] = parse_importtime(completed.stderr, args.top)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
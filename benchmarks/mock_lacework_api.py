@@ -0,0 +1,326 @@
+'''
+Local stand-in for the Lacework v2 API, serving synthetic data (benchmarks/synthetic_data.py) for load and
+throughput testing without touching a real tenant.
+
+Only the endpoints LaceworkInterface uses are implemented: access tokens, CloudAccounts, Configs/AzureSubscriptions,
+Alerts/search, Vulnerabilities/Hosts|Containers/search (with nextPage paging), Reports and Queries/execute. Page size,
+the page cap, latency, injected 5xx errors and a token bucket rate limit (429 + Retry-After) are configurable, and the
+server counts requests, statuses, records and concurrent requests so the client behaviour can be checked:
+
+    with MockLaceworkAPI(scale=100000, page_size=1000, latency=0.05, error_rate=0.01) as api:
+        lacework_interface = LaceworkInterface(lacework_client=api.client())
+        ...
+        print(api.get_stats())
+'''
+import argparse
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from benchmarks import synthetic_data
+from benchmarks.run_benchmarks import dataset_sizes
+from modules.lql import LQL_MAX_RESULT_ROWS, parse_lacework_time, format_lacework_time
+
+SEARCH_RESOURCES = {'/api/v2/Alerts/search': ('alerts_search', 'alerts'),
+                    '/api/v2/Vulnerabilities/Hosts/search': ('host_vulns_search', 'host_vulns'),
+                    '/api/v2/Vulnerabilities/Containers/search': ('container_vulns_search', 'container_vulns')}
+CLOUD_ACCOUNT_TYPES = {'AWS': 'AwsCfg', 'AZURE': 'AzureCfg', 'GCP': 'GcpCfg'}
+COMPLIANCE_ACCOUNT_ID_FIELDS = {'AWS': 'ACCOUNT_ID', 'AZURE': 'TENANT_ID', 'GCP': 'PROJECT_ID'}
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        '''Take a token, returns 0 on success or the number of seconds until one is available.'''
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class MockLaceworkAPI:
+
+    def __init__(self, scale: int = 10000, page_size: int = 500, max_pages: int = 100, latency: float = 0.0,
+                 error_rate: float = 0.0, rate_limit: float = None, lql_max_rows: int = LQL_MAX_RESULT_ROWS,
+                 cloud_accounts: int = 3, host: str = '127.0.0.1', port: int = 0, seed: int = 7):
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limiter = TokenBucket(rate_limit) if rate_limit else None
+        self.lql_max_rows = lql_max_rows
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+        sizes = dataset_sizes(scale)
+        self.records = {'host_vulns': synthetic_data.host_vulns(sizes['host_vulns']),
+                        'container_vulns': synthetic_data.container_vulns(sizes['container_vulns']),
+                        'alerts': synthetic_data.alerts(sizes['alerts'])}
+        # secrets are spread evenly over the week before the server started so LQL time windows select a subset
+        self.started = datetime.now(timezone.utc).replace(microsecond=0)
+        secrets = synthetic_data.secrets(sizes['secrets'])['data']
+        self.secrets = [(self.started - timedelta(days=7) * (1 - i / len(secrets)), row)
+                        for i, row in enumerate(secrets)]
+        self.compliance_reports = {}
+        for cloud_provider in CLOUD_ACCOUNT_TYPES:
+            compliance = synthetic_data.compliance(max(cloud_accounts, sizes['compliance']), accounts=cloud_accounts,
+                                                   cloud_provider=cloud_provider)
+            for report in compliance['reports']:
+                account_id = report['recommendations'][0][COMPLIANCE_ACCOUNT_ID_FIELDS[cloud_provider]]
+                self.compliance_reports[(cloud_provider, account_id)] = report
+
+        self._searches = {}
+        self._search_ids = itertools.count(1)
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_domain(self) -> str:
+        return f'{self.server.server_address[0]}:{self.server.server_address[1]}'
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.base_domain}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+    def client(self, subaccount=None):
+        '''Return a LaceworkClient talking to this server, the access token is requested from the mock as well.'''
+        from laceworksdk import LaceworkClient
+        # the bootstrap token stops the client from contacting the real token endpoint while it is constructed
+        lacework_client = LaceworkClient(account='mock', subaccount=subaccount, api_key='MOCK_KEY_ID',
+                                         api_secret='_mock_secret', api_token='bootstrap', base_domain=self.base_domain)
+        lacework_client._session._base_url = self.base_url
+        lacework_client._session._access_token = None
+        lacework_client._session._check_access_token()
+        return lacework_client
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats = {'requests': 0, 'by_endpoint': {}, 'by_status': {}, 'records_served': 0, 'bytes_served': 0,
+                          'in_flight': 0, 'max_in_flight': 0, 'injected_errors': 0, 'rate_limited': 0}
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            return json.loads(json.dumps(self.stats))
+
+    def _count(self, endpoint: str, status: int, records: int, body_size: int):
+        with self._stats_lock:
+            self.stats['requests'] += 1
+            self.stats['by_endpoint'][endpoint] = self.stats['by_endpoint'].get(endpoint, 0) + 1
+            self.stats['by_status'][str(status)] = self.stats['by_status'].get(str(status), 0) + 1
+            self.stats['records_served'] += records
+            self.stats['bytes_served'] += body_size
+
+    def _enter(self):
+        with self._stats_lock:
+            self.stats['in_flight'] += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+
+    def _exit(self):
+        with self._stats_lock:
+            self.stats['in_flight'] -= 1
+
+    def _inject_error(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._random_lock:
+            return self._random.random() < self.error_rate
+
+    def _page(self, search_id: int, page: int) -> dict:
+        records = self._searches[search_id]
+        data = records[page * self.page_size:(page + 1) * self.page_size]
+        next_page = None
+        if (page + 1) * self.page_size < len(records) and page + 1 < self.max_pages:
+            next_page = f'{self.base_url}/api/v2/Pages/{search_id}-{page + 1}'
+        else:
+            # last page served, the search results are no longer needed
+            self._searches.pop(search_id, None)
+        return {'paging': {'rows': len(data), 'totalRows': len(records), 'urls': {'nextPage': next_page}},
+                'data': data}
+
+    def _search(self, dataset: str, body: dict) -> dict:
+        records = self.records[dataset]
+        for record_filter in body.get('filters', []):
+            field = record_filter['field']
+            if record_filter['expression'] == 'eq':
+                records = [record for record in records if str(record.get(field)) == str(record_filter['value'])]
+            elif record_filter['expression'] == 'in':
+                values = {str(value) for value in record_filter['values']}
+                records = [record for record in records if str(record.get(field)) in values]
+        if body.get('returns'):
+            # only the requested top level fields are sent, as by the API
+            records = [{field: record[field] for field in body['returns'] if field in record} for record in records]
+        search_id = next(self._search_ids)
+        self._searches[search_id] = records
+        return self._page(search_id, 0)
+
+    def _cloud_accounts(self) -> dict:
+        accounts = []
+        for cloud_provider, account_id in self.compliance_reports:
+            account = {'name': f'{cloud_provider.lower()}-{account_id}', 'type': CLOUD_ACCOUNT_TYPES[cloud_provider],
+                       'enabled': 1, 'state': {'ok': True}}
+            if cloud_provider == 'AWS':
+                account['data'] = {'crossAccountCredentials': {'roleArn': f'arn:aws:iam::{account_id}:role/lacework'}}
+            elif cloud_provider == 'AZURE':
+                account['data'] = {'tenantId': account_id}
+            else:
+                account['data'] = {'id': account_id}
+            accounts.append(account)
+        return {'data': accounts}
+
+    def _azure_subscriptions(self, params: dict) -> dict:
+        tenant_id = params.get('tenantId', [''])[0]
+        return {'data': [{'tenantId': tenant_id, 'subscriptions': [f'{tenant_id} (mock-subscription)']}]}
+
+    def _reports(self, params: dict) -> dict:
+        cloud_provider = {'AWS': 'AWS', 'AZU': 'AZURE', 'GCP': 'GCP'}[params.get('reportType', ['AWS'])[0][:3]]
+        account_id = params.get('primaryQueryId', params.get('secondaryQueryId', ['']))[0]
+        report = self.compliance_reports.get((cloud_provider, account_id))
+        return {'data': [report] if report else []}
+
+    def _execute_query(self, body: dict) -> dict:
+        arguments = {argument['name']: argument['value'] for argument in body.get('arguments', [])}
+        start = parse_lacework_time(arguments.get('StartTimeRange', format_lacework_time(self.started - timedelta(days=7))))
+        end = parse_lacework_time(arguments.get('EndTimeRange', format_lacework_time(self.started)))
+        rows = [row for row_time, row in self.secrets if start <= row_time < end]
+        return {'data': rows[:self.lql_max_rows]}
+
+    def handle(self, method: str, url: str, body: dict):
+        '''Return (endpoint, status, headers, payload) for a request.'''
+        url_parts = urlsplit(url)
+        path = url_parts.path.rstrip('/')
+        params = parse_qs(url_parts.query)
+        if method == 'POST' and path == '/api/v2/access/tokens':
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=body.get('expiryTime', 3600))
+            return 'access_tokens', 201, {}, {'token': 'MOCK_ACCESS_TOKEN',
+                                              'expiresAt': expires_at.strftime('%Y-%m-%dT%H:%M:%S.%fZ')}
+        if method == 'POST' and path in SEARCH_RESOURCES:
+            endpoint, dataset = SEARCH_RESOURCES[path]
+            handler = lambda: self._search(dataset, body)
+        elif method == 'GET' and path.startswith('/api/v2/Pages/'):
+            endpoint = 'next_page'
+            search_id, page = (int(part) for part in path.rsplit('/', 1)[1].split('-'))
+            if search_id not in self._searches:
+                return endpoint, 404, {}, {'message': 'Search results expired'}
+            handler = lambda: self._page(search_id, page)
+        elif method == 'GET' and path == '/api/v2/CloudAccounts':
+            endpoint, handler = 'cloud_accounts', self._cloud_accounts
+        elif method == 'GET' and path == '/api/v2/Configs/AzureSubscriptions':
+            endpoint, handler = 'azure_subscriptions', lambda: self._azure_subscriptions(params)
+        elif method == 'GET' and path == '/api/v2/Reports':
+            endpoint, handler = 'reports', lambda: self._reports(params)
+        elif method == 'POST' and path == '/api/v2/Queries/execute':
+            endpoint, handler = 'queries_execute', lambda: self._execute_query(body)
+        else:
+            return 'unknown', 404, {}, {'message': f'No mock for {method} {path}'}
+
+        if self.rate_limiter:
+            retry_after = self.rate_limiter.acquire()
+            if retry_after:
+                with self._stats_lock:
+                    self.stats['rate_limited'] += 1
+                return endpoint, 429, {'Retry-After': str(math.ceil(retry_after))}, {'message': 'Rate limit exceeded'}
+        if self.latency:
+            time.sleep(self.latency)
+        if self._inject_error():
+            with self._stats_lock:
+                self.stats['injected_errors'] += 1
+            return endpoint, 503, {}, {'message': 'Injected error'}
+        return endpoint, 200, {}, handler()
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def _respond(self):
+                api._enter()
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    request_body = self.rfile.read(length) if length else b''
+                    endpoint, status, headers, payload = api.handle(self.command, self.path,
+                                                                    json.loads(request_body) if request_body else {})
+                    response_body = json.dumps(payload).encode('utf-8')
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(response_body)))
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    self.wfile.write(response_body)
+                    records = len(payload.get('data', [])) if status == 200 and endpoint != 'access_tokens' else 0
+                    api._count(endpoint, status, records, len(response_body))
+                finally:
+                    api._exit()
+
+            do_GET = _respond
+            do_POST = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local mock of the Lacework API backed by synthetic data.')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--scale', type=int, default=10000, help='Number of host and container vulnerability records')
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--max-pages', type=int, default=100, help='Pages returned per search before truncating')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 503')
+    parser.add_argument('--rate-limit', type=float, default=None, help='Requests per second before returning 429s')
+    args = parser.parse_args()
+    api = MockLaceworkAPI(scale=args.scale, page_size=args.page_size, max_pages=args.max_pages, latency=args.latency,
+                          error_rate=args.error_rate, rate_limit=args.rate_limit, port=args.port)
+    print(f'Serving mock Lacework API on {api.base_url}')
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.server.server_close()
+        print(json.dumps(api.get_stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
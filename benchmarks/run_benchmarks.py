@@ -0,0 +1,227 @@
+'''
+Offline benchmarks for the report data models, charts and template rendering.
+
+Synthetic payloads (benchmarks/synthetic_data.py) are generated at each requested scale and every model method used
+by the reports is timed. Peak memory is measured in a second, tracemalloc traced run of the same call. Results are
+written as JSON and can be compared against a previous run to catch regressions:
+
+    python -m benchmarks.run_benchmarks --scales 10000,100000 --output results.json
+    python -m benchmarks.run_benchmarks --scales 10000,100000 --compare results.json
+
+The scale is the number of host and container vulnerability records, the other datasets are derived from it.
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from benchmarks import synthetic_data
+from modules.alerts import Alerts
+from modules.compliance import Compliance
+from modules.container_vulnerabilities import ContainerVulnerabilities
+from modules.host_vulnerabilities import HostVulnerabilities
+from modules.secrets import Secrets
+from modules.reports.reportgen_csa_detailed import ReportGenCSADetailed
+from modules.utils import LaceworkTime
+
+basedir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# size of each dataset relative to the requested scale
+DATASET_RATIOS = {'host_vulns': 1, 'container_vulns': 1, 'alerts': 0.01, 'compliance': 0.05, 'secrets': 0.01}
+
+
+def dataset_sizes(scale: int) -> dict:
+    return {name: max(10, int(scale * ratio)) for name, ratio in DATASET_RATIOS.items()}
+
+
+class SyntheticLaceworkInterface:
+    '''Stands in for LaceworkInterface, serving synthetic models instead of calling the API.'''
+
+    def __init__(self, scale: int):
+        sizes = dataset_sizes(scale)
+        self.use_cache = False
+        self.host_vulns = synthetic_data.host_vulns(sizes['host_vulns'])
+        self.container_vulns = synthetic_data.container_vulns(sizes['container_vulns'])
+        self.alerts = synthetic_data.alerts(sizes['alerts'])
+        self.compliance = synthetic_data.compliance(sizes['compliance'])
+        self.secrets = synthetic_data.secrets(sizes['secrets'])
+
+    def get_host_vulns(self, start_time, end_time, **kwargs):
+        return HostVulnerabilities(self.host_vulns)
+
+    def get_container_vulns(self, start_time, end_time, **kwargs):
+        return ContainerVulnerabilities(self.container_vulns)
+
+    def get_alerts(self, start_time, end_time, **kwargs):
+        return Alerts(self.alerts)
+
+    def get_compliance_reports(self, cloud_provider='AWS', report_type='CIS'):
+        if cloud_provider != 'AWS':
+            return Compliance({'cloud_provider': cloud_provider, 'report_type': report_type, 'reports': []})
+        return Compliance(self.compliance)
+
+    def get_secrets(self, start_time, end_time):
+        return Secrets(self.secrets)
+
+    def get_datasets(self, dataset_classes, start_time, end_time):
+        return {dataset_class.dataset_name: Secrets(self.secrets) for dataset_class in dataset_classes
+                if dataset_class.dataset_name == 'ssh_private_keys'}
+
+
+class SyntheticReport(ReportGenCSADetailed):
+
+    def __init__(self, lacework_interface, graph_scale=1):
+        self._synthetic_interface = lacework_interface
+        super().__init__(basedir, graph_scale=graph_scale)
+
+    def connect(self, api_key_file=None):
+        self.lacework_interface = self._synthetic_interface
+
+
+def measure(func, track_memory: bool) -> dict:
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func()
+        wall_s = time.perf_counter() - start
+        peak_mb = None
+        if track_memory:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            func()
+            peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+    measurement = {'wall_s': round(wall_s, 6), 'peak_mb': round(peak_mb, 3) if peak_mb is not None else None}
+    if isinstance(result, pd.DataFrame):
+        measurement['rows_out'] = len(result)
+    elif isinstance(result, (bytes, str)):
+        measurement['bytes_out'] = len(result)
+    return measurement
+
+
+def get_benchmarks(interface: SyntheticLaceworkInterface, skip_charts: bool) -> list:
+    host_vulns = interface.get_host_vulns(None, None)
+    container_vulns = interface.get_container_vulns(None, None)
+    alerts = interface.get_alerts(None, None)
+    compliance = interface.get_compliance_reports()
+    secrets = interface.get_secrets(None, None)
+    benchmarks = [
+        ('host_vulns', 'total_evaluated', host_vulns.total_evaluated),
+        ('host_vulns', 'summary_by_host', lambda: host_vulns.summary_by_host(limit=25)),
+        ('host_vulns', 'summary', host_vulns.summary),
+        ('host_vulns', 'fixable_vulns', lambda: host_vulns.fixable_vulns(severities=["Critical"])),
+        ('container_vulns', 'total_evaluated', container_vulns.total_evaluated),
+        ('container_vulns', 'summary_by_image', lambda: container_vulns.summary_by_image(limit=25)),
+        ('container_vulns', 'summary', container_vulns.summary),
+        ('container_vulns', 'summary_by_package', container_vulns.summary_by_package),
+        ('container_vulns', 'fixable_vulns', lambda: container_vulns.fixable_vulns(severities=['Critical'])),
+        ('alerts', 'processed_alerts', lambda: alerts.processed_alerts(limit=25)),
+        ('compliance', 'get_compliance_details', compliance.get_compliance_details),
+        ('compliance', 'get_compliance_summary', compliance.get_compliance_summary),
+        ('compliance', 'critical_compliance_details', compliance.critical_compliance_details),
+        ('compliance', 'get_summary_by_account', compliance.get_summary_by_account),
+        ('compliance', 'get_summary_by_service', compliance.get_summary_by_service),
+        ('secrets', 'processed_secrets', secrets.processed_secrets),
+    ]
+    if not skip_charts:
+        benchmarks += [
+            ('charts', 'host_vulns_by_severity_bar', lambda: host_vulns.host_vulns_by_severity_bar(width=1200, height=350)),
+            ('charts', 'top_packages_bar', lambda: container_vulns.top_packages_bar(width=1200, height=350)),
+            ('charts', 'compliance_summary_by_account_bar_graph',
+             lambda: compliance.get_summary_by_account_bar_graph(width=1200, height=350)),
+            ('charts', 'compliance_summary_by_service_bar_graph',
+             lambda: compliance.get_summary_by_service_bar_graph(width=1200, height=350)),
+        ]
+        report = SyntheticReport(interface)
+        times = (LaceworkTime('7:0'), LaceworkTime('0:0'), LaceworkTime('7:0'), LaceworkTime('0:0'))
+        benchmarks += [
+            ('report', 'gather', lambda: report.gather(*times)),
+            ('report', 'render', lambda: report.render('Benchmark Customer', 'Benchmark Author')),
+        ]
+    return benchmarks
+
+
+def run(scales: list, sections: list, track_memory: bool, skip_charts: bool) -> dict:
+    results = []
+    for scale in scales:
+        interface = SyntheticLaceworkInterface(scale)
+        sizes = dataset_sizes(scale)
+        for section, name, func in get_benchmarks(interface, skip_charts):
+            if sections and section not in sections:
+                continue
+            measurement = measure(func, track_memory)
+            result = {'section': section, 'benchmark': name, 'scale': scale,
+                      'records_in': sizes.get(section, sizes['host_vulns']), **measurement}
+            memory = '' if result['peak_mb'] is None else f"  {result['peak_mb']:>10.2f}MB"
+            print(f"{scale:>9} {section:>16} {name:<42} {result['wall_s']:>10.4f}s{memory}", file=sys.stderr)
+            results.append(result)
+    return {'metadata': {'timestamp': datetime.now(timezone.utc).isoformat(),
+                         'python': platform.python_version(),
+                         'pandas': pd.__version__,
+                         'platform': platform.platform()},
+            'results': results}
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    baseline_results = {(r['section'], r['benchmark'], r['scale']): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        previous = baseline_results.get((result['section'], result['benchmark'], result['scale']))
+        if not previous:
+            continue
+        for metric in ('wall_s', 'peak_mb'):
+            if not result.get(metric) or not previous.get(metric):
+                continue
+            ratio = result[metric] / previous[metric]
+            result[f'{metric}_ratio'] = round(ratio, 3)
+            if ratio > threshold:
+                regressions.append(f"{result['section']}.{result['benchmark']}@{result['scale']} {metric}: "
+                                   f"{previous[metric]} -> {result[metric]} ({ratio:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run offline benchmarks against synthetic Lacework data.')
+    parser.add_argument('--scales', type=str, default='10000',
+                        help='Comma separated number of vulnerability records, e.g. 10000,100000,1000000')
+    parser.add_argument('--sections', type=str, default='',
+                        help='Comma separated sections to run (host_vulns, container_vulns, alerts, compliance, '
+                             'secrets, charts, report). Default is all.')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the traced run that measures peak memory')
+    parser.add_argument('--skip-charts', action='store_true', help='Skip chart and report rendering (needs kaleido)')
+    parser.add_argument('--output', type=str, help='Write the JSON results to this file')
+    parser.add_argument('--compare', type=str, help='Baseline JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='Ratio against the baseline above which a benchmark counts as a regression')
+    args = parser.parse_args()
+
+    scales = [int(scale) for scale in args.scales.split(',') if scale]
+    sections = [section for section in args.sections.split(',') if section]
+    results = run(scales, sections, not args.no_memory, args.skip_charts)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        results['regressions'] = regressions
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    for regression in regressions:
+        print(f'REGRESSION: {regression}', file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+'''
+Synthetic Lacework API payloads for offline benchmarks and tests.
+
+Every generator is deterministic for a given seed and returns records shaped like the Lacework v2 API responses
+consumed by the models in modules/ (only the fields the models read are populated, plus some bulk metadata so the
+records have a realistic size).
+'''
+import random
+from datetime import datetime, timedelta, timezone
+
+SEVERITIES = ("Critical", "High", "Medium", "Low", "Info")
+# rough distribution of severities in real tenants
+SEVERITY_WEIGHTS = (5, 20, 40, 30, 5)
+PACKAGES = ("openssl", "glibc", "libxml2", "curl", "zlib", "openssh", "sudo", "bash", "systemd", "python3",
+            "nodejs", "busybox", "expat", "libpng", "nginx", "log4j-core", "jackson-databind", "spring-core",
+            "golang.org/x/net", "urllib3")
+REPOS = ("library/nginx", "library/redis", "acme/api", "acme/web", "acme/worker", "library/postgres",
+         "library/python", "acme/batch", "library/alpine", "acme/auth")
+ALERT_TYPES = ("NewExternalServerDNSConn", "NewChildLaunched", "CloudTrailChanged", "SuspiciousLogin",
+               "UnauthorizedAPICall", "NewViolations", "ComplianceChanged", "ChangedFile", "NewBinaryType",
+               "PotentiallyCompromisedHost")
+COMPLIANCE_CATEGORIES = ("S3", "IAM", "EC2", "VPC", "RDS", "KMS", "CloudTrail", "Logging", "Networking",
+                         "Storage")
+SSH_KEY_TYPES = ("RSA", "ED25519", "ECDSA", "DSA")
+
+
+def _cve(rng: random.Random) -> str:
+    return f"CVE-{rng.randint(2014, 2024)}-{rng.randint(1000, 49999)}"
+
+
+def _version(rng: random.Random) -> str:
+    return f"{rng.randint(0, 9)}.{rng.randint(0, 20)}.{rng.randint(0, 40)}"
+
+
+def host_vulns(records: int, hosts: int = None, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    hosts = hosts or max(1, records // 200)
+    host_names = [f"ip-10-{i // 65536 % 256}-{i // 256 % 256}-{i % 256}.ec2.internal" for i in range(hosts)]
+    results = []
+    for _ in range(records):
+        host = rng.randrange(hosts)
+        fix_available = rng.random() < 0.6
+        severity = rng.choices(SEVERITIES, SEVERITY_WEIGHTS)[0]
+        results.append({
+            'mid': 1000 + host,
+            'severity': severity,
+            'vulnId': _cve(rng),
+            'status': 'Active',
+            'evalCtx': {'hostname': host_names[host],
+                        'mc_eval_guid': f'{rng.getrandbits(64):016x}'},
+            'featureKey': {'name': rng.choice(PACKAGES),
+                           'namespace': 'ubuntu:22.04',
+                           'package_active': 1,
+                           'version_installed': _version(rng)},
+            'fixInfo': {'fix_available': '1' if fix_available else '0',
+                        'fixed_version': _version(rng) if fix_available else ''},
+            'cveProps': {'description': 'A synthetic vulnerability description used for benchmarking. ' * 3,
+                         'link': 'https://nvd.nist.gov/',
+                         'metadata': {'NVD': {'CVSSv3': {'Score': round(rng.uniform(1, 10), 1)}}}},
+            'startTime': '2024-01-01T00:00:00.000Z',
+        })
+    return results
+
+
+def container_vulns(records: int, images: int = None, seed: int = 2) -> list:
+    rng = random.Random(seed)
+    images = images or max(1, records // 300)
+    image_ids = [f"sha256:{rng.getrandbits(256):064x}" for _ in range(images)]
+    image_repos = [rng.choice(REPOS) for _ in range(images)]
+    image_tags = [[f"v{i}.{t}" for t in range(rng.randint(1, 3))] for i in range(images)]
+    results = []
+    for _ in range(records):
+        image = rng.randrange(images)
+        fix_available = rng.random() < 0.6
+        severity = rng.choices(SEVERITIES, SEVERITY_WEIGHTS)[0]
+        results.append({
+            'imageId': image_ids[image],
+            'severity': severity,
+            'vulnId': _cve(rng),
+            'status': 'VULNERABLE',
+            'evalCtx': {'image_info': {'repo': image_repos[image],
+                                       'tags': image_tags[image],
+                                       'registry': 'index.docker.io',
+                                       'size': rng.randint(10_000_000, 900_000_000)}},
+            'featureKey': {'name': rng.choice(PACKAGES),
+                           'namespace': 'debian:12',
+                           'version': _version(rng)},
+            'fixInfo': {'fix_available': 1 if fix_available else 0,
+                        'fixed_version': _version(rng) if fix_available else ''},
+            'cveProps': {'description': 'A synthetic vulnerability description used for benchmarking. ' * 3,
+                         'metadata': {'NVD': {'CVSSv3': {'Score': round(rng.uniform(1, 10), 1)}}}},
+            'startTime': '2024-01-01T00:00:00.000Z',
+        })
+    return results
+
+
+def alerts(records: int, seed: int = 3) -> list:
+    rng = random.Random(seed)
+    base_time = datetime(2024, 1, 8, tzinfo=timezone.utc)
+    results = []
+    for alert_id in range(records):
+        alert_type = rng.choice(ALERT_TYPES)
+        results.append({
+            'alertId': 100000 + alert_id,
+            'alertName': f'{alert_type} detected',
+            'alertType': alert_type,
+            'severity': rng.choices(SEVERITIES, SEVERITY_WEIGHTS)[0],
+            'startTime': (base_time - timedelta(minutes=rng.randint(0, 7 * 24 * 60))).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            'status': 'Open',
+            'alertInfo': {'description': f'Synthetic {alert_type} alert for benchmarking.',
+                          'subject': 'benchmark'},
+        })
+    return results
+
+
+def compliance(recommendations: int, accounts: int = 10, cloud_provider: str = 'AWS', seed: int = 4) -> dict:
+    '''Return the dict Compliance() is constructed with, recommendations is the total across all accounts.'''
+    rng = random.Random(seed)
+    account_id_field = {'AWS': 'ACCOUNT_ID', 'AZURE': 'TENANT_ID', 'GCP': 'PROJECT_ID'}[cloud_provider]
+    per_account = max(1, recommendations // accounts)
+    reports = []
+    for account in range(accounts):
+        account_id = f'{123456789000 + account}'
+        report_recommendations = []
+        for rec_id in range(per_account):
+            non_compliant = rng.random() < 0.4
+            violations = [{'region': rng.choice(('us-east-1', 'us-west-2', 'eu-west-1')),
+                           'resource': f'arn:aws:s3:::bucket-{account}-{rec_id}-{v}',
+                           'reasons': ['Synthetic violation reason']}
+                          for v in range(rng.randint(1, 5) if non_compliant else 0)]
+            report_recommendations.append({
+                account_id_field: account_id,
+                'REC_ID': f'REC_{rec_id}',
+                'STATUS': 'NonCompliant' if non_compliant else 'Compliant',
+                'SEVERITY': rng.randint(1, 5),
+                'CATEGORY': rng.choice(COMPLIANCE_CATEGORIES),
+                'TITLE': f'Synthetic control {rec_id}',
+                'VIOLATIONS': violations,
+                'ASSESSED_RESOURCE_COUNT': len(violations) + rng.randint(0, 20),
+            })
+        reports.append({'reportType': 'AWS_CIS_14', 'recommendations': report_recommendations})
+    return {'cloud_provider': cloud_provider, 'report_type': 'CIS', 'reports': reports}
+
+
+def secrets(records: int, hosts: int = None, seed: int = 5) -> dict:
+    '''Return the LQL response Secrets() is constructed with.'''
+    rng = random.Random(seed)
+    hosts = hosts or max(1, records // 3)
+    return {'data': [{'HOSTNAME': f'host-{rng.randrange(hosts)}',
+                      'FILE_PATH': f'/home/user{rng.randrange(50)}/.ssh/id_{rng.randrange(4)}',
+                      'SSH_KEY_TYPE': rng.choice(SSH_KEY_TYPES)} for _ in range(records)]}
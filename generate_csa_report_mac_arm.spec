@@ -7,6 +7,7 @@ added_files = [
     ( 'assets/*', 'assets' ),
     ( 'modules/*', 'modules' ),
     ( 'modules/reports/*', 'modules/reports' ),
+    ( 'modules/datasets/*', 'modules/datasets' ),
     ( 'VERSION', '.')
     ]
 added_files += copy_metadata("laceworksdk")
@@ -16,7 +17,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=added_files,
-    hiddenimports=['jinja2'],
+    hiddenimports=['jinja2', 'modules.reportgen'],  # reports are imported on demand, see utils.load_report_class
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
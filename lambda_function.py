@@ -1,26 +1,57 @@
 import sys
 import requests
 from modules.reports.reportgen_csa_detailed import ReportGenCSADetailed
+from modules.output_sinks import S3MultipartSink
+from modules.outputs import write_pdf
+from modules.instrumentation import tracer, span
+from modules.checkpoints import S3CheckpointStore
+from modules.utils import LaceworkTime
 from marketorestpython.client import MarketoClient
 import os
 import datetime
+import time
 import boto3
 import boto3.session
-from weasyprint import HTML, CSS
 from weasyprint.text.fonts import FontConfiguration
 #import pdfkit
 import json
 from botocore.exceptions import ClientError
 
 
+# Warm container reuse: anything created through the helpers below lives at module level and is reused by every
+# invocation served by the same Lambda container. Only the per-tenant LaceworkInterface is recreated per request.
+WARM_START = os.getenv('WARM_START', 'true').lower() != 'false'
+SECRET_CACHE_TTL = int(os.getenv('SECRET_CACHE_TTL', '300'))
+# record per stage timings of each invocation, logged and uploaded next to the report under traces/
+TRACE_REPORT = os.getenv('TRACE_REPORT', 'false').lower() == 'true'
+# losslessly recompress the PNG images embedded in the report
+COMPRESS_IMAGES = os.getenv('COMPRESS_IMAGES', 'false').lower() == 'true'
+# save the downloaded data to the report bucket under checkpoints/ as it arrives, so a failed invocation can be resumed
+# with its run_id (also enabled per invocation with "checkpoint": true in the event)
+CHECKPOINT_REPORT = os.getenv('CHECKPOINT_REPORT', 'false').lower() == 'true'
+
+_boto3_clients = {}
+_secret_cache = {}
+_report_generator = None
+_font_config = None
+
+
+def get_boto3_client(service_name, region_name, **credentials):
+    key = (service_name, region_name, credentials.get('aws_access_key_id'))
+    if not WARM_START or key not in _boto3_clients:
+        session = boto3.session.Session(**credentials)
+        _boto3_clients[key] = session.client(service_name=service_name, region_name=region_name)
+    return _boto3_clients[key]
+
+
 def get_secret(secret_name, region_name):
 
+    cached = _secret_cache.get((secret_name, region_name))
+    if WARM_START and cached and time.monotonic() - cached[0] < SECRET_CACHE_TTL:
+        return cached[1]
+
     # Create a Secrets Manager client
-    session = boto3.session.Session()
-    client = session.client(
-        service_name='secretsmanager',
-        region_name=region_name
-    )
+    client = get_boto3_client('secretsmanager', region_name)
 
     try:
         get_secret_value_response = client.get_secret_value(
@@ -32,9 +63,81 @@ def get_secret(secret_name, region_name):
         raise e
 
     # Decrypts secret using the associated KMS key.
-    secret = get_secret_value_response['SecretString']
+    secret = json.loads(get_secret_value_response['SecretString'])
+    _secret_cache[(secret_name, region_name)] = (time.monotonic(), secret)
+
+    return secret
+
+
+def lacework_api_key_file(event):
+    '''
+    The API key file of the Lacework instance an event is for, as the --api-key-file of the command line tool.
+    '''
+    api_key_file = {'account': str(event['lacework_instance']).split(".")[0],
+                    'keyId': event['key'],
+                    'secret': event['secret']}
+    if event.get('lacework_subaccount'):
+        api_key_file['subAccount'] = event['lacework_subaccount']
+    return api_key_file
+
+
+def get_checkpoints(s3_client, s3_bucket, event, api_key_file):
+    '''
+    Return the S3CheckpointStore of an invocation, None unless checkpointing is enabled. A run is only resumed by an
+    invocation for the customer and Lacework account it was started for, which is checked before any of its saved
+    data is loaded.
+    '''
+    if not (CHECKPOINT_REPORT or event.get('checkpoint')):
+        if event.get('run_id'):
+            raise ValueError('Resuming a run needs checkpointing, set "checkpoint" in the event or CHECKPOINT_REPORT')
+        return None
+    owner = {'customer': event['customer'],
+             'account': api_key_file['account'],
+             'subaccount': api_key_file.get('subAccount')}
+    checkpoints = S3CheckpointStore(s3_client, s3_bucket, run_id=event.get('run_id'))
+    if checkpoints.exists():
+        if {name: checkpoints.metadata.get(name) for name in owner} != owner:
+            raise ValueError(f'Run {checkpoints.run_id} was not started for this customer and Lacework account')
+        print(f"Resuming run {checkpoints.run_id} started at {checkpoints.metadata['reference_time']}")
+    else:
+        checkpoints.start(**owner)
+        print(f"run id:{checkpoints.run_id}")
+    return checkpoints
+
+
+def get_report_generator(basedir, api_key_file):
+    '''
+    Return the report generator for this container, templates and base64 assets are only loaded once.
+    The Lacework connection is replaced on every call with the client of api_key_file, the tenant of the invocation.
+    '''
+    global _report_generator
+    if not WARM_START or _report_generator is None:
+        _report_generator = ReportGenCSADetailed(basedir, graph_scale=1.4)
+        _report_generator.assets.recompress_png = COMPRESS_IMAGES
+    _report_generator.connect(api_key_file=api_key_file)
+    return _report_generator
+
 
-    return json.loads(secret)
+def get_font_config():
+    global _font_config
+    if not WARM_START or _font_config is None:
+        _font_config = FontConfiguration()
+    return _font_config
+
+
+def write_html_report(report_gen, customer, sink):
+    # a standalone page, its images are embedded
+    report_gen.assets.mode = 'embedded'
+    with span('write_html', category='output', path=sink.location), sink:
+        report_gen.render_to(sink, customer, 'Lacework', pagesize='a2')
+    return sink.response
+
+
+def write_pdf_report(report_gen, customer, sink):
+    # rendered with external images, as the PDFs of the command line tool
+    with sink:
+        write_pdf(report_gen, sink, customer, 'Lacework', font_config=get_font_config(), pagesize='a2', pdf=True)
+    return sink.response
 
 
 def assume_role(role_arn, session_name='my_session'):
@@ -57,12 +160,10 @@ def assume_role(role_arn, session_name='my_session'):
 
 def gen_presigned_url(s3_key, s3_bucket, aws_region):
     creds = get_secret('report_download_creds', aws_region)
-    session = boto3.Session(
-        aws_access_key_id=creds['key'],
-        aws_secret_access_key=creds['secret']
-    )
     presigned_url_args = {'Bucket': s3_bucket, 'Key': s3_key}
-    s3_client = session.client("s3", region_name=aws_region)
+    s3_client = get_boto3_client("s3", aws_region,
+                                 aws_access_key_id=creds['key'],
+                                 aws_secret_access_key=creds['secret'])
     presigned_url = s3_client.generate_presigned_url('get_object', Params=presigned_url_args, ExpiresIn=604799)
     return presigned_url
 
@@ -79,6 +180,8 @@ def lambda_handler(event, context):
         'customer': Str,                                    # the name of the Customer
         'marketplace_email': Str                            # the email tied to original aws marketplace request (and Marketo Lead)
         'email': Str,                                       # the email to send the download link to
+        'checkpoint': Bool                                  # optional, save the downloaded data so a failed invocation can be resumed
+        'run_id': Str                                       # optional, the run ID of a failed checkpointed invocation to resume
 
     :param context:
     :return:
@@ -94,15 +197,11 @@ def lambda_handler(event, context):
     print(f"email:{event['email']}")
     if 'marketo_email' in event:
         print(f"marketo email:{event['marketo_email']}")
-    # set credentials for Lacework
+    # credentials for Lacework, passed to the client of this invocation rather than set in the environment a warm
+    # container keeps for the next one
     basedir = os.path.dirname(os.path.abspath(__file__))
-    short_instance_name = str(event['lacework_instance']).split(".")[0]
-    print(f"Using {short_instance_name} as instance name.")
-    os.environ['LW_ACCOUNT'] = short_instance_name
-    if 'lacework_subaccount' in event:
-        os.environ['LW_SUBACCOUNT'] = event['lacework_subaccount']
-    os.environ['LW_API_KEY'] = event['key']
-    os.environ['LW_API_SECRET'] = event['secret']
+    api_key_file = lacework_api_key_file(event)
+    print(f"Using {api_key_file['account']} as instance name.")
 
     # S3 Bucket to write report to
     s3_bucket = os.getenv('S3_BUCKET')
@@ -126,46 +225,68 @@ def lambda_handler(event, context):
             print('Failed to get Marketo credentials from ENV variables too. Exiting...')
             sys.exit()
 
-    # create report html
-    report_gen = ReportGenCSADetailed(basedir, graph_scale=1.4)
-    report = report_gen.generate(event['customer'], 'Lacework', pagesize='a2')
-    s3_key_name_html = f'html/{event["customer"]}_CSA_{datetime.datetime.now().strftime("%Y%m%d")}.html'
-    try:
-        aws_s3_client = boto3.client('s3', region_name=aws_region)
-        response = aws_s3_client.put_object(
-            Body=report,
-            Bucket=s3_bucket,
-            Key=s3_key_name_html)
-    except Exception as e:
-        return {"statusCode": 502,
-                "message": "Failed to write html to S3",
-                "details": str(e)}
-    # generate pdf from html
-    pdf_file_name = "/tmp/report.pdf"
-    lambda_client = boto3.client('lambda', region_name=aws_region)
+    if TRACE_REPORT:
+        tracer.enable()
     try:
+        aws_s3_client = get_boto3_client('s3', aws_region)
+        # when checkpointing, downloaded data is saved to S3 as it arrives, invoking again with the run_id reuses it
+        try:
+            checkpoints = get_checkpoints(aws_s3_client, s3_bucket, event, api_key_file)
+        except ValueError as e:
+            return {"statusCode": 400,
+                    "message": str(e),
+                    "run_id": event.get('run_id')}
+        run_id = checkpoints.run_id if checkpoints else None
+        reference_time = checkpoints.reference_time if checkpoints else None
+        # create report html
+        report_gen = get_report_generator(basedir, api_key_file)
+        report_gen.lacework_interface.checkpoints = checkpoints
+        try:
+            report_gen.gather(LaceworkTime('7:0', reference_time=reference_time),
+                              LaceworkTime('0:0', reference_time=reference_time),
+                              LaceworkTime('7:0', reference_time=reference_time),
+                              LaceworkTime('0:0', reference_time=reference_time))
+        except Exception as e:
+            return {"statusCode": 502,
+                    "message": "Failed to gather report data",
+                    "run_id": run_id,
+                    "details": str(e)}
+        s3_key_name_html = f'html/{event["customer"]}_CSA_{datetime.datetime.now().strftime("%Y%m%d")}.html'
+        s3_key_name_pdf = f'reports/{event["customer"]}_CSA_{datetime.datetime.now().strftime("%Y%m%d")}.pdf'
 
-        #result = pdfkit.from_string(report, pdf_file_name, configuration=pdfkit_config, options=pdfkit_options, verbose=True)
-        font_config = FontConfiguration()
-        html = HTML(string=report)
-        html.write_pdf(pdf_file_name, font_config=font_config)
-
-    except Exception as e:
-        return {"statusCode": 502,
-                "message": "Failed to create pdf",
-                "response": response,
-                "details": str(e)}
-    s3_key_name_pdf = f'reports/{event["customer"]}_CSA_{datetime.datetime.now().strftime("%Y%m%d")}.pdf'
-    try:
-        aws_s3_client = boto3.client('s3', region_name=aws_region)
-        response = aws_s3_client.upload_file(
-            pdf_file_name,
-            s3_bucket,
-            s3_key_name_pdf)
-    except Exception as e:
-        return {"statusCode": 502,
-                "message": "Failed to write pdf to S3",
-                "details": str(e)}
+        # the html is uploaded before the pdf is rendered, a failed upload returns without waiting for the pdf
+        try:
+            response = write_html_report(report_gen, event['customer'],
+                                         S3MultipartSink(aws_s3_client, s3_bucket, s3_key_name_html, 'text/html'))
+        except Exception as e:
+            return {"statusCode": 502,
+                    "message": "Failed to write html to S3",
+                    "run_id": run_id,
+                    "details": str(e)}
+        try:
+            write_pdf_report(report_gen, event['customer'],
+                             S3MultipartSink(aws_s3_client, s3_bucket, s3_key_name_pdf, 'application/pdf'))
+        except Exception as e:
+            return {"statusCode": 502,
+                    "message": "Failed to create pdf",
+                    "response": response,
+                    "run_id": run_id,
+                    "details": str(e)}
+        if checkpoints:
+            checkpoints.delete()
+
+        if TRACE_REPORT:
+            print('\n'.join(tracer.summary()))
+            try:
+                aws_s3_client.put_object(Bucket=s3_bucket, Key=f'traces/{event["customer"]}_CSA_{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}.json',
+                                         Body=json.dumps(tracer.to_dict(), default=str).encode('utf-8'),
+                                         ContentType='application/json')
+            except Exception as e:
+                print(f'Failed to upload report trace: {str(e)}')
+    finally:
+        # the tracer is shared by every invocation of a warm lambda
+        tracer.disable()
+        tracer.reset()
 
     presigned_url = gen_presigned_url(s3_key_name_pdf, s3_bucket, aws_region)
     marketo_presigned_url = presigned_url.removeprefix('https://')
@@ -4,11 +4,14 @@ import logzero
 import datetime
 import traceback
 import platform
+import atexit
+import multiprocessing
 from logzero import logger
 from modules.process_args import get_validated_arguments, pre_process_args
 from modules.utils import get_available_reports
 from modules.utils import alert_new_release
-from modules.reportgen import ReportGen  # do not remove, needed by pyinstaller
+from modules.instrumentation import tracer
+from modules.outputs import get_graph_scale, get_outputs, write_outputs
 
 
 def main():
@@ -25,7 +28,7 @@ def main():
     # Setup up log file, always write verbose logs
     logzero.logfile('lw_report_gen.log', loglevel=logzero.DEBUG)
 
-    # Dynamically import report classes from "modules/reports" subdirectory
+    # Find the report classes in the "modules/reports" subdirectory, they are imported once one is selected to run
     available_reports: list = get_available_reports(basedir)
     if len(available_reports) == 0:
         logger.debug('No available reports to run. You should not get this error since there is a default report.')
@@ -37,6 +40,11 @@ def main():
     args = get_validated_arguments()
     pre_processed_args = pre_process_args(args, available_reports)
 
+    if args.trace_file:
+        # written on every exit so the trace of a failed run is kept too
+        tracer.enable()
+        atexit.register(tracer.export, args.trace_file, args.trace_format)
+
     if args.gui:
         # Bring up the GUI interface
         from modules.gui_main import ExtensibleReportingGUI
@@ -50,34 +58,45 @@ def main():
                 custom_logo = args.logo
             else:
                 custom_logo = None
-            if args.report_format == "HTML":
-                report_generator = pre_processed_args['report_to_run'](basedir, use_cache=args.cache_data, api_key_file=pre_processed_args['api_key_file'])
-                report = report_generator.generate(args.customer,
-                                                args.author,
-                                                vulns_start_time=pre_processed_args['vulns_start_time'],
-                                                vulns_end_time=pre_processed_args['vulns_end_time'],
-                                                alerts_start_time=pre_processed_args['alerts_start_time'],
-                                                alerts_end_time=pre_processed_args['alerts_end_time'],
-                                                custom_logo=custom_logo
-                                                )
-            elif args.report_format == "PDF":
-                report_generator = pre_processed_args['report_to_run'](basedir, use_cache=args.cache_data, api_key_file=pre_processed_args['api_key_file'], graph_scale=1.4)
-                report = report_generator.generate(args.customer,
-                                                args.author,
-                                                vulns_start_time=pre_processed_args['vulns_start_time'],
-                                                vulns_end_time=pre_processed_args['vulns_end_time'],
-                                                alerts_start_time=pre_processed_args['alerts_start_time'],
-                                                alerts_end_time=pre_processed_args['alerts_end_time'],
-                                                custom_logo=custom_logo,
-                                                pagesize='a2',
-                                                pdf=True,
-                                                )
+            report_generator = pre_processed_args['report_to_run'](basedir, use_cache=args.cache_data, api_key_file=pre_processed_args['api_key_file'],
+                                                                   graph_scale=get_graph_scale(args.report_formats))
+            report_generator.assets.recompress_png = args.compress_images
+            if args.from_snapshot:
+                metadata = report_generator.load_snapshot(args.from_snapshot)
+                logger.warning(f"Rendering the report from the snapshot saved at {metadata['created']}")
+                time_ranges = {name: metadata.get(name) for name in ('vulns_start_time', 'vulns_end_time', 'alerts_start_time', 'alerts_end_time')}
+            else:
+                report_generator.lacework_interface.checkpoints = pre_processed_args['checkpoints']
+                # the report is rendered straight into its output file below
+                report_generator.gather(pre_processed_args['vulns_start_time'],
+                                        pre_processed_args['vulns_end_time'],
+                                        pre_processed_args['alerts_start_time'],
+                                        pre_processed_args['alerts_end_time'])
+                time_ranges = {name: pre_processed_args[name].generate_time_string() for name in ('vulns_start_time', 'vulns_end_time', 'alerts_start_time', 'alerts_end_time')}
+            if args.baseline_snapshot:
+                metadata = report_generator.compare_to_snapshot(args.baseline_snapshot)
+                logger.warning(f"Compared with the snapshot saved at {metadata['created']}")
+            if args.results_store:
+                from modules.results_store import ResultsStore
+                results_store = ResultsStore(args.results_store)
+                if not args.from_snapshot:
+                    # a resumed run is recorded at the time it started
+                    checkpoints = pre_processed_args['checkpoints']
+                    run_time = checkpoints.reference_time if checkpoints else None
+                    report_generator.record_results(results_store, args.customer, run_time=run_time, **time_ranges)
+                report_generator.trend_data = report_generator.gather_trend_data(results_store, args.customer)
+                results_store.close()
+            if args.save_snapshot:
+                report_generator.save_snapshot(args.save_snapshot, customer=args.customer, **time_ranges)
+                logger.warning(f'Saved the report data to the snapshot {args.save_snapshot}')
 
         except Exception as e:
             logger.error(f"Report Generation failed for report {args.report}, did you specify one that exists? Check what's available with the '--list-reports' flag.")
             logger.error("Exiting....")
             logger.error(str(e))
             logger.error(traceback.format_exc())
+            if pre_processed_args['checkpoints']:
+                logger.error(f"The data downloaded so far was saved, continue this run with --resume {pre_processed_args['checkpoints'].run_id}")
             sys.exit()
 
         # Generate a filename if one was not specified
@@ -86,31 +105,19 @@ def main():
         else:
             report_file_name = args.report_path
 
-        if args.report_format == "HTML":
-            report_file_name += ".html"
-            # Write out the report file
-            logger.info(f'Writing report to {report_file_name}')
-            try:
-                with open(str(report_file_name), 'w') as file:
-                    file.write(report)
-            except Exception as e:
-                logger.error(f'Failed writing report file {report_file_name}: {str(e)}')
-                sys.exit()
-        elif args.report_format == "PDF":
-            report_file_name += ".pdf"
-            logger.info(f'Writing report to {report_file_name}')
-            try:
-                from weasyprint import HTML, CSS
-                from weasyprint.text.fonts import FontConfiguration
-                import logging as log
-                weasyprint_log = log.getLogger('weasyprint')
-                weasyprint_log.addHandler(log.FileHandler('weasyprint.log'))
-                font_config = FontConfiguration()
-                html = HTML(string=report, base_url=basedir)
-                html.write_pdf(report_file_name, font_config=font_config)
-            except Exception as e:
-                logger.error(f'Failed writing report file {report_file_name}: {str(e)}')
-                sys.exit()    
+        # one gather, every format and page size requested is written from it
+        outputs = get_outputs(args.report_formats, report_file_name, page_sizes=args.page_sizes, asset_mode=args.asset_mode)
+        try:
+            write_outputs(report_generator, outputs, args.customer, args.author, custom_logo=custom_logo)
+        except Exception as e:
+            logger.error(f'Failed writing report file(s) {", ".join(output.path for output in outputs)}: {str(e)}')
+            logger.error(traceback.format_exc())
+            sys.exit()
+        # the report is written, the data saved to resume this run is no longer needed
+        if pre_processed_args['checkpoints']:
+            pre_processed_args['checkpoints'].delete()    
 
 if __name__ == "__main__":
+    # the process pools of large vulnerability datasets and of multi-output runs start workers from frozen binaries too
+    multiprocessing.freeze_support()
     main()
@@ -1,5 +1,6 @@
 import pandas as pd
 from logzero import logger
+from modules.instrumentation import traced
 from datetime import *
 
 event_short_to_long = {
@@ -178,12 +179,27 @@ event_short_to_long = {
 
 class Alerts:
 
+    # the fields of the API records read below, the only ones decoded from the alert search pages
+    fields = {'alertId': ('alertId',),
+              'alertName': ('alertName',),
+              'alertType': ('alertType',),
+              'severity': ('severity',),
+              'startTime': ('startTime',),
+              'alertInfo.description': ('alertInfo', 'description')}
+
     def __init__(self, raw_data):
         self.data = raw_data
 
     def count_alerts(self):
         return len(self.data)
 
+    def count_alerts_by_severity(self) -> dict:
+        counts = {}
+        for item in self.data:
+            counts[item['severity']] = counts.get(item['severity'], 0) + 1
+        return counts
+
+    @traced(category='model')
     def processed_alerts(self,
                          severities=("Critical", "High"),
                          excluded_alert_types=("CloudTrailDefaultAlert", "CloudActivityLogIngestionFailed", "NewViolations", "ComplianceChanged"),
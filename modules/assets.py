@@ -0,0 +1,175 @@
+'''
+Images placed in the rendered reports.
+
+Every image a report shows (logos, the polygraph graphic and the plotly charts) goes through the report's
+ReportAssets. Assets are stored by the digest of their content, so an image added several times is optimized, base64
+encoded and written once, and every tag showing it refers to the same data. SVGs are minified and, with
+recompress_png, PNGs are losslessly recompressed (needs Pillow) the first time they are output.
+
+The tags are resolved when the template renders them, in one of two modes:
+
+    embedded  (default) a self-contained report, images are inlined as data URIs. Identical images share one URI,
+              which WeasyPrint decodes only once.
+    external  images are referenced as assets/<digest>.<extension>, written by write() next to the report. Used
+              for report directories and for the HTML WeasyPrint turns into a PDF.
+'''
+import base64
+import hashlib
+import io
+import os
+import re
+import weakref
+
+from logzero import logger
+
+ASSET_MODES = ('embedded', 'external')
+ASSET_DIRECTORY = 'assets'
+FILE_EXTENSIONS = {'svg+xml': 'svg', 'jpeg': 'jpg'}
+
+# recompressed PNGs by digest of the original, shared by every report instance (the GUI creates one per run)
+_recompressed = {}
+
+ATTRIBUTE_VALUE = re.compile(r'="([^"]*)"')
+# plotly writes coordinates with full float precision, e.g. translate(0,216.17000000000002)
+LONG_DECIMAL = re.compile(r'(\d+\.\d{2})\d+')
+SVG_SIZE = re.compile(r'<svg[^>]* width="([\d.]+)" height="([\d.]+)"')
+EMPTY_GROUP = re.compile(r'<g(?: class="[^"]*")?(?:/>|></g>)')
+CLASS_ATTRIBUTE = re.compile(r' class="[^"]*"')
+
+
+def minify_attribute(match) -> str:
+    value = LONG_DECIMAL.sub(r'\1', match.group(1))
+    return '="' + value.replace(': ', ':').replace('; ', ';').replace(', ', ',') + '"'
+
+
+def minify_svg(svg: bytes) -> bytes:
+    '''Drop what an SVG shown as an image does not need: excess precision, empty groups and unused classes.
+
+    Only attribute values are rewritten, the text of labels and titles is left as it is.
+    '''
+    text = svg.decode('utf-8')
+    text = ATTRIBUTE_VALUE.sub(minify_attribute, text).replace(' style=""', '')
+    if '<style' not in text:
+        # without a stylesheet the classes plotly sets for its javascript select nothing
+        text = CLASS_ATTRIBUTE.sub('', text)
+    previous = None
+    while previous != text:
+        previous, text = text, EMPTY_GROUP.sub('', text)
+    return text.encode('utf-8')
+
+
+def recompress_png(png: bytes) -> bytes:
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.debug('Pillow is not installed, PNG images are embedded as they are')
+        return png
+    with Image.open(io.BytesIO(png)) as image:
+        output = io.BytesIO()
+        image.save(output, format='PNG', optimize=True)
+    return output.getvalue() if output.tell() < len(png) else png
+
+
+class Asset:
+
+    def __init__(self, store, data: bytes, file_format: str):
+        self.store = store
+        self.original = data
+        self.file_format = file_format
+        self.digest = hashlib.sha1(data).hexdigest()[:16]
+        self.file_name = f'{self.digest}.{FILE_EXTENSIONS.get(file_format, file_format)}'
+        self._data = None
+        self._data_uri = None
+
+    @property
+    def data(self) -> bytes:
+        # optimized on first use, so the options of the store can still be changed after the asset was added
+        if self._data is None:
+            self._data = self.store.optimize(self.original, self.file_format)
+        return self._data
+
+    @property
+    def data_uri(self) -> str:
+        if self._data_uri is None:
+            b64content = base64.b64encode(self.data).decode('utf-8')
+            self._data_uri = f'data:image/{self.file_format};charset=utf-8;base64,{b64content}'
+        return self._data_uri
+
+
+    @property
+    def size(self) -> tuple:
+        '''(width, height) of an SVG, None when it does not state them.'''
+        match = SVG_SIZE.search(self.original.decode('utf-8', errors='ignore'))
+        return (float(match.group(1)), float(match.group(2))) if match else None
+
+
+class AssetImage:
+    '''An <img> tag of an asset, rendered according to the mode of the store when the template outputs it.'''
+
+    def __init__(self, asset: Asset, align: str):
+        self.asset = asset
+        self.align = align
+
+    def __html__(self):
+        store = self.asset.store
+        if store.mode == 'external':
+            src = f'{ASSET_DIRECTORY}/{self.asset.file_name}'
+        else:
+            src = self.asset.data_uri
+        size = ''
+        if store.chart_scale != 1 and self.asset.file_format == 'svg+xml' and self.asset.size:
+            # charts are vector images, shown larger without rendering them again
+            width, height = self.asset.size
+            size = f" width='{width * store.chart_scale:g}' height='{height * store.chart_scale:g}'"
+        return f"<img src='{src}' align='{self.align}'{size}/>"
+
+    def __str__(self):
+        return self.__html__()
+
+
+class ReportAssets:
+
+    def __init__(self, mode: str = 'embedded', recompress_png: bool = False, chart_scale: float = 1):
+        self.mode = mode
+        self.recompress_png = recompress_png
+        # size of the SVG charts relative to the size they were drawn at
+        self.chart_scale = chart_scale
+        # assets are kept while a tag refers to them, the charts of an earlier gather are dropped with its data
+        self.assets = weakref.WeakValueDictionary()
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    @mode.setter
+    def mode(self, mode: str):
+        if mode not in ASSET_MODES:
+            raise ValueError(f'Unknown asset mode {mode}, expected one of {", ".join(ASSET_MODES)}')
+        self._mode = mode
+
+    def optimize(self, data: bytes, file_format: str) -> bytes:
+        if file_format == 'svg+xml':
+            return minify_svg(data)
+        if file_format == 'png' and self.recompress_png:
+            digest = hashlib.sha1(data).hexdigest()
+            if digest not in _recompressed:
+                _recompressed[digest] = recompress_png(data)
+            return _recompressed[digest]
+        return data
+
+    def add(self, data: bytes, file_format: str) -> Asset:
+        asset = Asset(self, data, file_format)
+        return self.assets.setdefault(asset.digest, asset)
+
+    def image_tag(self, data: bytes, file_format: str, align: str = 'left') -> AssetImage:
+        return AssetImage(self.add(data, file_format), align)
+
+    def write(self, directory: str):
+        '''Write every asset into the assets directory of directory, files already there are kept.'''
+        asset_directory = os.path.join(directory, ASSET_DIRECTORY)
+        os.makedirs(asset_directory, exist_ok=True)
+        for asset in list(self.assets.values()):
+            path = os.path.join(asset_directory, asset.file_name)
+            if not os.path.exists(path):
+                with open(path, 'wb') as asset_file:
+                    asset_file.write(asset.data)
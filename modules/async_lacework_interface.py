@@ -0,0 +1,283 @@
+'''
+Asyncio client of the Lacework API, for fetching from many tenants or reports concurrently in one process.
+
+AsyncLaceworkInterface has the getters of LaceworkInterface and returns the same models, but its requests are
+coroutines on one aiohttp session instead of laceworksdk calls made from threads:
+
+    async with AsyncLaceworkInterface(api_key_file) as lacework:
+        host_vulns, alerts = await asyncio.gather(lacework.get_host_vulns(start_time, end_time),
+                                                  lacework.get_alerts(start_time, end_time))
+
+The session keeps a pool of keep-alive connections (at most max_connections requests in flight). The access token is
+requested once and refreshed before it expires by whichever request needs it first, the others wait for it. Searches
+follow the nextPage URLs of their results. Every request gets the retries, backoff and per account rate limit of
+RequestExecutor, sharing the token bucket of any LaceworkInterface of the same account. Severities, compliance
+reports and LQL time chunks are fetched concurrently. The response cache and checkpoints of LaceworkInterface are not
+used.
+
+Needs aiohttp (the async extra, poetry install --extras async), imported when an AsyncLaceworkInterface is created.
+'''
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from importlib.metadata import version
+
+import requests
+from laceworksdk import config as lacework_config
+from laceworksdk.exceptions import ApiError
+from logzero import logger
+from requests.structures import CaseInsensitiveDict
+from tenacity import AsyncRetrying
+
+from modules.alerts import Alerts
+from modules.compliance import Compliance
+from modules.container_vulnerabilities import ContainerVulnerabilities
+from modules.datasets.ssh_private_keys import SSHPrivateKeys
+from modules.host_vulnerabilities import HostVulnerabilities
+from modules.lacework_interface import (COMPLIANCE_PROVIDER_LOOKUP, COMPLIANCE_REPORT_LOOKUP, get_account_details,
+                                        get_config_accounts, get_credentials, severity_search_filters)
+from modules.json_decode import decode_json
+from modules.lql import LQL_MAX_RESULT_ROWS, format_lacework_time, parse_lacework_time, split_time_range
+from modules.request_executor import (DEFAULT_MAX_CONNECTIONS, DEFAULT_TIMEOUT, RETRY_POLICIES, get_rate_limiter,
+                                      is_retryable, retry_options)
+
+# tokens are refreshed this long before they expire, so a request never carries an expired one
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+SUCCESS_STATUS_CODES = (200, 201, 204)
+
+
+def api_error(status: int, reason: str, headers, body: bytes, method: str, url: str) -> ApiError:
+    '''The laceworksdk ApiError of a failed aiohttp request, so errors are handled as those of LaceworkInterface.'''
+    response = requests.Response()
+    response.status_code = status
+    response.reason = reason
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body
+    response.url = url
+    response.request = requests.Request(method, url).prepare()
+    return ApiError(response)
+
+
+def is_retryable_async(exception: BaseException) -> bool:
+    import aiohttp
+    return is_retryable(exception) or isinstance(
+        exception, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError, json.JSONDecodeError))
+
+
+class AsyncLaceworkInterface:
+
+    def __init__(self, api_key_file: dict = None, base_url: str = None, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 rate_limiter=None, policies: dict = None):
+        import aiohttp
+        self._aiohttp = aiohttp
+        credentials = get_credentials(api_key_file)
+        if not credentials['account'] or not credentials['api_key'] or not credentials['api_secret']:
+            raise ValueError('No Lacework API credentials were found')
+        self.subaccount = credentials['subaccount']
+        self.api_key = credentials['api_key']
+        self.api_secret = credentials['api_secret']
+        self.base_url = base_url or f"https://{credentials['account']}.{credentials['base_domain']}"
+        self.max_connections = max_connections
+        # the bucket of a LaceworkInterface of the same account, see RequestExecutor
+        self.rate_limiter = rate_limiter or get_rate_limiter(self.base_url)
+        self.policies = {**RETRY_POLICIES, **(policies or {})}
+        self.session = None
+        self._access_token = None
+        self._access_token_expiry = None
+        self._token_lock = asyncio.Lock()
+        self._user_agent = f"laceworksdk-python-client/{version('laceworksdk')}"
+
+    async def open(self):
+        if self.session is None:
+            connector = self._aiohttp.TCPConnector(limit=self.max_connections)
+            timeout = self._aiohttp.ClientTimeout(sock_connect=DEFAULT_TIMEOUT[0], sock_read=DEFAULT_TIMEOUT[1])
+            self.session = self._aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+        return False
+
+    async def call(self, endpoint: str, func, *args, **kwargs):
+        '''Await func(*args, **kwargs) with the retry policy of endpoint, the last exception is raised once it gives up.'''
+        policy = self.policies.get(endpoint, self.policies['default'])
+        retrying = AsyncRetrying(**retry_options(endpoint, policy, self.rate_limiter, retryable=is_retryable_async))
+        return await retrying(func, *args, **kwargs)
+
+    async def _send(self, method: str, url: str, headers: dict, fields: dict = None, **kwargs):
+        await self.rate_limiter.acquire_async()
+        if not url.startswith('http'):
+            url = self.base_url + url
+        logger.info(f"{method} request to URI: {url}")
+        async with self.session.request(method, url, headers=headers, **kwargs) as response:
+            body = await response.read()
+            if response.status not in SUCCESS_STATUS_CODES:
+                raise api_error(response.status, response.reason, response.headers, body, method, url)
+        return decode_json(body, fields) if body else {}
+
+    async def access_token(self) -> str:
+        # a single refresh, requests needing the token meanwhile wait for it rather than requesting their own
+        async with self._token_lock:
+            if self._access_token is None or self._access_token_expiry - TOKEN_REFRESH_MARGIN < datetime.now(timezone.utc):
+                logger.info("Creating Access Token in Lacework...")
+                headers = {"X-LW-UAKS": self.api_secret, "Content-Type": "application/json", "User-Agent": self._user_agent}
+                data = {"keyId": self.api_key, "expiryTime": lacework_config.DEFAULT_ACCESS_TOKEN_EXPIRATION}
+                token = await self.call('access_tokens', self._send, 'POST', '/api/v2/access/tokens', headers, json=data)
+                self._access_token = token['token']
+                self._access_token_expiry = datetime.strptime(token['expiresAt'].replace("Z", "+0000"),
+                                                              "%Y-%m-%dT%H:%M:%S.%f%z")
+        return self._access_token
+
+    async def _request(self, method: str, url: str, **kwargs):
+        headers = {"Authorization": f"Bearer {await self.access_token()}", "Org-Access": "false",
+                   "User-Agent": self._user_agent}
+        if self.subaccount:
+            headers["Account-Name"] = self.subaccount
+        return await self._send(method, url, headers, **kwargs)
+
+    async def request(self, endpoint: str, method: str, url: str, **kwargs):
+        return await self.call(endpoint, self._request, method, url, **kwargs)
+
+    async def search(self, path: str, filters: dict, fields: dict = None):
+        '''Yield the pages of a search, following the nextPage URL of each page. With fields (RecordColumns fields)
+        the records only hold those fields.'''
+        page = await self.request('search', 'POST', path, json=filters, fields=fields)
+        while True:
+            yield page
+            next_page = (page.get('paging') or {}).get('urls', {}).get('nextPage')
+            if not next_page:
+                break
+            page = await self.request('next_page', 'GET', next_page, fields=fields)
+
+    async def _search_severities(self, name: str, path: str, start_time, end_time, severities, add_records,
+                                 fields: dict = None, returns: list = None):
+        async def search_severity(severity):
+            pages = 0
+            try:
+                async for page in self.search(path, severity_search_filters(start_time, end_time, severity, returns), fields):
+                    pages += 1
+                    add_records(page['data'])
+            except Exception as e:
+                logger.error(f"Failed to retrieve list of {name} from Lacework API:{str(e)}")
+                raise e
+            logger.info(f'Total records for severity {severity}: {pages} pages')
+            if pages >= 100:
+                logger.warning(f"Lacework API returned maximum pages of {name} results (100 pages). Processed dataset "
+                               f"is likely incomplete.")
+        await asyncio.gather(*(search_severity(severity) for severity in severities))
+
+    async def get_cfg_account_ids(self):
+        try:
+            accounts = (await self.request('cloud_accounts', 'GET', '/api/v2/CloudAccounts'))['data']
+        except Exception as e:
+            logger.error(f"Failed to retrieve list of cloud accounts from Lacework API:{str(e)}")
+            raise e
+
+        async def account_details(config_account):
+            azure_tenant_data = None
+            if config_account['type'] == 'AzureCfg':
+                azure_tenant_data = (await self.request('azure_subscriptions', 'GET', '/api/v2/Configs/AzureSubscriptions',
+                                                        params={'tenantId': config_account['data']['tenantId']}))['data']
+            return get_account_details(config_account, azure_tenant_data)
+        details = await asyncio.gather(*(account_details(account) for account in get_config_accounts(accounts)))
+        return [detail for account_detail in details for detail in account_detail]
+
+    async def get_alerts(self, start_time, end_time, severities=('Critical', 'High')):
+        logger.debug(f'Getting alerts from {start_time} to {end_time}:')
+        alerts_list = []
+        await self._search_severities('alerts', '/api/v2/Alerts/search', start_time, end_time, severities,
+                                      alerts_list.extend, Alerts.fields)
+        logger.info(f'{len(alerts_list)} alerts returned.')
+        return Alerts(alerts_list)
+
+    async def get_host_vulns(self, start_time, end_time, severities=("Critical", "High", "Medium")):
+        host_vulns = HostVulnerabilities([])
+        await self._search_severities('host vulnerabilities', '/api/v2/Vulnerabilities/Hosts/search', start_time,
+                                      end_time, severities, host_vulns.add_records,
+                                      HostVulnerabilities.fields, HostVulnerabilities.returns)
+        logger.info(f'Total host vulnerability records retrieved: {len(host_vulns.records)}')
+        return host_vulns
+
+    async def get_container_vulns(self, start_time, end_time, severities=("Critical", "High", "Medium")):
+        container_vulns = ContainerVulnerabilities([])
+        await self._search_severities('container vulnerabilities', '/api/v2/Vulnerabilities/Containers/search',
+                                      start_time, end_time, severities, container_vulns.add_records,
+                                      ContainerVulnerabilities.fields, ContainerVulnerabilities.returns)
+        return container_vulns
+
+    async def get_compliance_reports(self, cloud_provider='AWS', report_type='CIS'):
+        '''Retrieve all reports of specified type for specified cloud provider.
+            Valid Cloud Providers are: AWS, GCP, AZURE
+            Valid Report Types are: CIS, PCI
+            '''
+        compliance_provider = COMPLIANCE_PROVIDER_LOOKUP[str(cloud_provider).upper()]
+        compliance_accounts = [account for account in await self.get_cfg_account_ids()
+                               if account['type'] == compliance_provider]
+
+        async def get_report(compliance_account):
+            params = {'primaryQueryId': compliance_account['primary_query_id'],
+                      'secondaryQueryId': compliance_account['secondary_query_id'],
+                      'format': 'json',
+                      'latest': 'true',
+                      'reportType': COMPLIANCE_REPORT_LOOKUP[compliance_provider][report_type]}
+            try:
+                report = await self.request('reports', 'GET', '/api/v2/Reports',
+                                            params={name: value for name, value in params.items() if value is not None})
+            except Exception as e:
+                logger.error(f"Failed to retrieve {report_type} report for {cloud_provider} from Lacework API:{str(e)}")
+                raise e
+            return report['data'][0] if report['data'] else None
+        reports = await asyncio.gather(*(get_report(account) for account in compliance_accounts))
+        return Compliance({'cloud_provider': cloud_provider,
+                           'report_type': report_type,
+                           'reports': [report for report in reports if report]})
+
+    async def execute_query(self, query_text: str, start_time: datetime, end_time: datetime,
+                            min_chunk: timedelta = timedelta(minutes=15)) -> list:
+        '''Rows of an LQL query, the time window is halved while it fails with a transient error or a timeout or its
+        results are truncated, as by LQLExecutor.'''
+        window = f"{format_lacework_time(start_time)} -> {format_lacework_time(end_time)}"
+        json_body = {'query': {'queryText': query_text},
+                     'arguments': [{'name': 'StartTimeRange', 'value': format_lacework_time(start_time)},
+                                   {'name': 'EndTimeRange', 'value': format_lacework_time(end_time)}]}
+        try:
+            rows = (await self.request('queries', 'POST', '/api/v2/Queries/execute', json=json_body)).get('data', [])
+        except Exception as e:
+            if end_time - start_time <= min_chunk or not (is_retryable_async(e) or isinstance(e, TimeoutError)):
+                logger.error(f"LQL chunk {window} failed: {str(e)}")
+                raise e
+            logger.warning(f"LQL chunk {window} failed, splitting and retrying: {str(e)}")
+            rows = None
+        if rows is not None and len(rows) < LQL_MAX_RESULT_ROWS:
+            return rows
+        if rows is not None and end_time - start_time <= min_chunk:
+            logger.warning(f"LQL chunk {window} hit the {LQL_MAX_RESULT_ROWS} row limit at minimum chunk size. "
+                           f"Results are likely incomplete.")
+            return rows
+        midpoint = start_time + (end_time - start_time) / 2
+        halves = await asyncio.gather(self.execute_query(query_text, start_time, midpoint, min_chunk),
+                                      self.execute_query(query_text, midpoint, end_time, min_chunk))
+        return halves[0] + halves[1]
+
+    async def get_dataset(self, dataset_class, start_time, end_time, chunk_size: timedelta = timedelta(days=1)):
+        dataset = dataset_class()
+        model = dataset.create_model()
+        chunks = split_time_range(parse_lacework_time(start_time), parse_lacework_time(end_time), chunk_size)
+        try:
+            for rows in await asyncio.gather(*(self.execute_query(dataset.lql_query, *chunk) for chunk in chunks)):
+                model.add_rows(dataset.project(rows))
+        except Exception as e:
+            logger.error(f"Failed to retrieve dataset {dataset.dataset_name} from Lacework API:{str(e)}")
+            raise e
+        return model
+
+    async def get_secrets(self, start_time, end_time):
+        return await self.get_dataset(SSHPrivateKeys, start_time, end_time)
@@ -0,0 +1,230 @@
+'''
+Checkpoints of the data fetched for a report run, so a run that dies part way can be resumed.
+
+Everything LaceworkInterface fetches is persisted as it arrives under the run ID: every page of a paginated search,
+every completed LQL time chunk, every compliance report and the result of every getter once it returns. A resumed
+run uses the reference time recorded when the run started, so its relative time windows resolve to the same
+timestamps, and skips (or continues) whatever the previous attempt already fetched.
+'''
+import functools
+import json
+import os
+import pickle
+import shutil
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from logzero import logger
+
+from modules.utils import LaceworkTime, generate_md5_from_obj
+
+DEFAULT_CHECKPOINT_DIR = 'lw_csa_checkpoints'
+REFERENCE_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def generate_run_id() -> str:
+    return f'{datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")}-{uuid.uuid4().hex[:8]}'
+
+
+class SearchCheckpoint:
+    '''Pages received so far for one paginated search and the nextPage URL to continue from.'''
+
+    def __init__(self, store, key: str):
+        self.store = store
+        self.key = key
+        state = store.read_json(f'{key}.search.json')
+        self.page_count = state['page_count'] if state else 0
+        self.next_page = state['next_page'] if state else None
+        self.complete = state['complete'] if state else False
+
+    def _save_state(self):
+        self.store.write_json(f'{self.key}.search.json', {'page_count': self.page_count,
+                                                          'next_page': self.next_page,
+                                                          'complete': self.complete})
+
+    def pages(self):
+        for page_number in range(self.page_count):
+            yield self.store.read_json(f'{self.key}.page{page_number}.json')
+
+    def add_page(self, page: dict):
+        self.store.write_json(f'{self.key}.page{self.page_count}.json', page)
+        self.page_count += 1
+        self.next_page = (page.get('paging') or {}).get('urls', {}).get('nextPage')
+        self.complete = not self.next_page
+        self._save_state()
+
+    def reset(self):
+        self.page_count = 0
+        self.next_page = None
+        self.complete = False
+        self._save_state()
+
+
+class ChunkCheckpoint:
+    '''Completed time chunks of one LQL query and their rows.'''
+
+    def __init__(self, store, key: str):
+        self.store = store
+        self.key = key
+        state = store.read_json(f'{key}.chunks.json')
+        # [start, end] time strings of each saved chunk, in the order they were saved
+        self.chunks = state['chunks'] if state else []
+
+    def completed_ranges(self) -> list:
+        return [(start, end) for start, end in self.chunks]
+
+    def rows(self):
+        for chunk_number in range(len(self.chunks)):
+            yield self.store.read_json(f'{self.key}.chunk{chunk_number}.json')
+
+    def add_chunk(self, start: str, end: str, rows: list):
+        self.store.write_json(f'{self.key}.chunk{len(self.chunks)}.json', rows)
+        self.chunks.append([start, end])
+        self.store.write_json(f'{self.key}.chunks.json', {'chunks': self.chunks})
+
+
+class CheckpointStore:
+    '''Base class of the checkpoint storage backends, subclasses implement _read, _write and delete.'''
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self._metadata = None
+
+    def _read(self, name: str):
+        raise NotImplementedError
+
+    def _write(self, name: str, data: bytes):
+        raise NotImplementedError
+
+    def delete(self):
+        raise NotImplementedError
+
+    def read_json(self, name: str):
+        data = self._read(name)
+        return json.loads(data) if data is not None else None
+
+    def write_json(self, name: str, obj):
+        self._write(name, json.dumps(obj).encode('utf-8'))
+
+    @property
+    def metadata(self) -> dict:
+        if self._metadata is None:
+            self._metadata = self.read_json('run.json')
+        return self._metadata
+
+    def exists(self) -> bool:
+        return self.metadata is not None
+
+    def start(self, **metadata):
+        '''Record the start of a new run, relative time windows of the run are resolved against the current time.'''
+        self._metadata = {'run_id': self.run_id,
+                          'reference_time': datetime.now(timezone.utc).strftime(REFERENCE_TIME_FORMAT),
+                          **metadata}
+        self.write_json('run.json', self._metadata)
+        return self
+
+    @property
+    def reference_time(self) -> datetime:
+        return datetime.strptime(self.metadata['reference_time'], REFERENCE_TIME_FORMAT).replace(tzinfo=timezone.utc)
+
+    def lacework_time(self, time_input: str) -> LaceworkTime:
+        return LaceworkTime(time_input, reference_time=self.reference_time)
+
+    def get_result(self, key: str):
+        '''Return (True, result) for a saved result, (False, None) otherwise.'''
+        data = self._read(f'{key}.result.pickle')
+        if data is None:
+            return False, None
+        try:
+            return True, pickle.loads(data)
+        except Exception as e:
+            logger.error(f'Checkpoint {key} of run {self.run_id} could not be loaded, fetching it again: {str(e)}')
+            return False, None
+
+    def save_result(self, key: str, result):
+        self._write(f'{key}.result.pickle', pickle.dumps(result))
+
+    def get_or_fetch(self, key: str, fetch):
+        found, result = self.get_result(key)
+        if not found:
+            result = fetch()
+            self.save_result(key, result)
+        return result
+
+    def search(self, key: str) -> SearchCheckpoint:
+        return SearchCheckpoint(self, key)
+
+    def chunks(self, key: str) -> ChunkCheckpoint:
+        return ChunkCheckpoint(self, key)
+
+
+class FileCheckpointStore(CheckpointStore):
+
+    def __init__(self, run_id: str = None, directory: str = DEFAULT_CHECKPOINT_DIR):
+        super().__init__(run_id or generate_run_id())
+        self.path = Path(directory) / self.run_id
+
+    def _read(self, name: str):
+        try:
+            return (self.path / name).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, name: str, data: bytes):
+        # the downloaded data is readable by the current user only
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.path.mkdir(mode=0o700, exist_ok=True)
+        # write then rename so a run killed mid write never leaves a truncated checkpoint behind
+        temp_path = self.path / f'.{name}.tmp'
+        temp_path.write_bytes(data)
+        os.replace(temp_path, self.path / name)
+
+    def delete(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class S3CheckpointStore(CheckpointStore):
+
+    def __init__(self, s3_client, bucket: str, run_id: str = None, prefix: str = 'checkpoints'):
+        super().__init__(run_id or generate_run_id())
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = f'{prefix}/{self.run_id}'
+
+    def _read(self, name: str):
+        try:
+            return self.s3_client.get_object(Bucket=self.bucket, Key=f'{self.prefix}/{name}')['Body'].read()
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+
+    def _write(self, name: str, data: bytes):
+        self.s3_client.put_object(Bucket=self.bucket, Key=f'{self.prefix}/{name}', Body=data)
+
+    def delete(self):
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f'{self.prefix}/'):
+            objects = [{'Key': item['Key']} for item in page.get('Contents', [])]
+            if objects:
+                self.s3_client.delete_objects(Bucket=self.bucket, Delete={'Objects': objects})
+
+
+def checkpoint_key(name: str, *args, **kwargs) -> str:
+    return f'{name}_{generate_md5_from_obj([args, kwargs])}'
+
+
+def checkpoint_results(func):
+    '''Save the result of a LaceworkInterface getter to the interface's checkpoint store and reuse it on resume.'''
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if not self.checkpoints:
+            return func(self, *args, **kwargs)
+        key = checkpoint_key(func.__name__, *args, **kwargs)
+        found, result = self.checkpoints.get_result(key)
+        if found:
+            logger.info(f'Using {func.__name__} results from checkpoint of run {self.checkpoints.run_id}')
+            return result
+        result = func(self, *args, **kwargs)
+        self.checkpoints.save_result(key, result)
+        return result
+    return wrapper
@@ -2,6 +2,7 @@ import pandas as pd
 
 import plotly.graph_objects as go
 from logzero import logger
+from modules.instrumentation import traced
 
 
 def process_compliance_violations(violations):
@@ -35,11 +36,13 @@ class Compliance:
                 results.append({**{'reportType': report_type}, **recommendation})
         return results
 
+    @traced(category='model')
     def get_total_accounts_evaluated(self):
         df = pd.DataFrame(self.all_recommendations)
         unique_accounts = df[self.account_id_string].nunique()
         return unique_accounts
 
+    @traced(category='model')
     def get_compliance_details(self, severities=["Critical", "High"]):
         df = pd.DataFrame(self.all_recommendations)
         df = df[df['STATUS'].isin(["NonCompliant"])]
@@ -61,6 +64,21 @@ class Compliance:
 
         return df
 
+    @traced(category='model')
+    def violations(self, severities=("Critical", "High")):
+        '''One row per account and non-compliant control, the key a violation is compared by across runs.'''
+        df = pd.DataFrame(self.all_recommendations)
+        df = df[df['STATUS'].isin(["NonCompliant"])]
+        df = df.replace({'SEVERITY': {1: "Critical", 2: "High", 3: "Medium", 4: "Low", 5: "Info"}})
+        df = df[df['SEVERITY'].isin(severities)]
+        df['RESOURCE_COUNT'] = df['VIOLATIONS'].str.len()
+        df = df[[self.account_id_string, 'CATEGORY', 'TITLE', 'SEVERITY', 'RESOURCE_COUNT']]
+        df = df.drop_duplicates([self.account_id_string, 'TITLE'])
+        df = df.rename(columns={self.account_id_string: self.account_id_rename_string, 'CATEGORY': 'Category',
+                                'TITLE': 'Control', 'SEVERITY': 'Severity', 'RESOURCE_COUNT': 'Resources'})
+        return df.reset_index(drop=True)
+
+    @traced(category='model')
     def critical_compliance_details(self):
         df = pd.DataFrame(self.all_recommendations)
         df = df[df['STATUS'].isin(["NonCompliant"])]
@@ -74,6 +92,7 @@ class Compliance:
 
         return df
 
+    @traced(category='model')
     def get_compliance_summary(self, severities=["Critical", "High"]):
         df = pd.DataFrame(self.all_recommendations)
         df = df[df['STATUS'].isin(["NonCompliant"])]
@@ -101,6 +120,7 @@ class Compliance:
 
         return df
 
+    @traced(category='model')
     def get_summary_by_account(self, severities=["Critical", "High", "Medium", "Low"]):
         df = pd.DataFrame(self.all_recommendations)
         df = df[df['STATUS'].isin(["NonCompliant"])]
@@ -134,6 +154,7 @@ class Compliance:
 
         return df
 
+    @traced(category='model')
     def get_summary_by_service(self, severities=["Critical", "High", "Medium", "Low"]):
         df = pd.DataFrame(self.all_recommendations)
         df = df[df['STATUS'].isin(["NonCompliant"])]
@@ -159,6 +180,7 @@ class Compliance:
         df = pd.pivot_table(df, values='count', index=self.account_id_string, columns='CATEGORY', sort=False)
         return df
 
+    @traced(category='chart')
     def get_summary_by_account_bar_graph(self, width=600, height=350, format='svg'):
         df = self.get_summary_by_account()
         colors = [
@@ -202,6 +224,7 @@ class Compliance:
         img_bytes = fig.to_image(format=format, width=width, height=height)
         return img_bytes
 
+    @traced(category='chart')
     def get_summary_by_service_bar_graph(self, width=600, height=350, format='svg'):
         df = self.get_summary_by_service()
         # colors = [
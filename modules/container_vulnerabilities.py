@@ -2,50 +2,101 @@ import json
 
 import pandas as pd
 from logzero import logger
+from modules.instrumentation import traced
+from modules.records import RecordColumns, search_returns
+from modules.partitioned import run_partitioned
 
 
-class ContainerVulnerabilities:
+def count_severities_by_image(df, severities):
+    # delete extra columns
+    df = df[['evalCtx.image_info.repo', 'evalCtx.image_info.tags', 'featureKey.name', 'fixInfo.fix_available', 'vulnId',
+             'severity', 'imageId']]
 
-    def __init__(self, raw_data):
-        self.data = raw_data
+    # filter
+    df = df[df['severity'].isin(severities)]
+    if df.empty:
+        return df
 
-    def total_evaluated(self):
-        df = pd.DataFrame(self.data)
-        unique_containers = df['imageId'].nunique()
-        return unique_containers
+    # combine repo and tags into newline separated repo_tag
+    df['repo_tags'] = df.apply(
+        lambda y: "\n".join(list(map(lambda x: y['evalCtx.image_info.repo'] + ':' + x, y['evalCtx.image_info.tags']))),
+        axis=1)
+    df.drop(columns=['evalCtx.image_info.tags'], inplace=True)
+    df.drop_duplicates(inplace=True)
 
-    def summary_by_image(self, severities=["Critical", "High", "Medium", "Low"], limit=False):
-        df = pd.json_normalize(self.data, meta=[['evalCtx', 'image_info', 'repo'], ['evalCtx', 'image_info', 'tags'],
-                                                      ['featureKey', 'name'], ['fixInfo', 'fix_available'], 'vulnId',
-                                                      'severity', 'imageId'])
+    # assemble multiple repos / tags into one line per imageid
+    df = df.groupby(['imageId', 'vulnId', 'featureKey.name']).agg(repositories=('repo_tags', f"\n".join),
+                                                                  fix_available=('fixInfo.fix_available', 'first'),
+                                                                  severity=('severity', 'first')).reset_index()
 
-        # delete extra columns
-        df = df[['evalCtx.image_info.repo', 'evalCtx.image_info.tags', 'featureKey.name', 'fixInfo.fix_available', 'vulnId',
-                 'severity', 'imageId']]
+    # count by severity
+    return df.groupby(['imageId', 'severity']).agg(repositories=('repositories', 'first'),
+                                                   count=('vulnId', 'count')).reset_index()
 
-        # filter
-        df = df[df['severity'].isin(severities)]
 
-        # combine repo and tags into newline separated repo_tag
-        df['repo_tags'] = df.apply(
-            lambda y: "\n".join(list(map(lambda x: y['evalCtx.image_info.repo'] + ':' + x, y['evalCtx.image_info.tags']))),
-            axis=1)
-        df.drop(columns=['evalCtx.image_info.tags'], inplace=True)
-        df.drop_duplicates(inplace=True)
+def group_fixable_vulns(df, severities):
+    if 'severity' not in df:
+        df['severity'] = False
+    df = df[df['severity'].isin(severities)]
+    df = df[df['fixInfo.fix_available'] == 1]
+    if not df.empty:
+        df = df[['evalCtx.image_info.repo', 'imageId', 'severity', 'featureKey.name', 'featureKey.version', 'vulnId', 'fixInfo.fixed_version']]
+        df = df.groupby(['evalCtx.image_info.repo', 'imageId', 'severity', 'featureKey.name', 'featureKey.version', 'vulnId'],
+                        as_index=False).agg(pd.unique).applymap(lambda x: x[0] if len(x) == 1 else x)
+        df = df.groupby(['evalCtx.image_info.repo', 'imageId', 'severity', 'featureKey.name', 'fixInfo.fixed_version', 'featureKey.version'], as_index=False).agg({'vulnId': ', '.join})
+    return df
 
-        # assemble multiple repos / tags into one line per imageid
-        df = df.groupby(['imageId', 'vulnId', 'featureKey.name']).agg(repositories=('repo_tags', f"\n".join),
-                                                                      fix_available=('fixInfo.fix_available', 'first'),
-                                                                      severity=('severity', 'first')).reset_index()
 
-        # count by severity
-        df = df.groupby(['imageId', 'severity']).agg(repositories=('repositories', 'first'),
-                                                     count=('vulnId', 'count')).reset_index()
+class ContainerVulnerabilities:
 
-        # sort and concat severities
+    # the fields of the API records read below, everything else (e.g. cveProps) is dropped as records are added
+    fields = {'imageId': ('imageId',),
+              'severity': ('severity',),
+              'vulnId': ('vulnId',),
+              'evalCtx.image_info.repo': ('evalCtx', 'image_info', 'repo'),
+              'evalCtx.image_info.tags': ('evalCtx', 'image_info', 'tags'),
+              'featureKey.name': ('featureKey', 'name'),
+              'featureKey.version': ('featureKey', 'version'),
+              'fixInfo.fix_available': ('fixInfo', 'fix_available'),
+              'fixInfo.fixed_version': ('fixInfo', 'fixed_version')}
+    # the only fields requested from the vulnerability search
+    returns = search_returns(fields)
+
+    def __init__(self, raw_data, workers=None):
+        self.records = RecordColumns(self.fields, raw_data)
+        # processes used for the per image aggregations of large datasets, LW_REPORT_WORKERS by default
+        self.workers = workers
+
+    def add_records(self, records):
+        self.records.add(records)
+
+    @property
+    def data(self):
+        '''The records as API style dicts (only the stored fields), built on each access.'''
+        return list(self.records.to_records())
+
+    @traced(category='model')
+    def total_evaluated(self):
+        df = self.records.to_frame(['imageId'])
+        unique_containers = df['imageId'].nunique()
+        return unique_containers
+
+    @traced(category='model')
+    def summary_by_image(self, severities=["Critical", "High", "Medium", "Low"], limit=False):
+        df = run_partitioned(count_severities_by_image, self.records,
+                             ['evalCtx.image_info.repo', 'evalCtx.image_info.tags', 'featureKey.name',
+                              'fixInfo.fix_available', 'vulnId', 'severity', 'imageId'], 'imageId',
+                             ['imageId', 'severity'], severities, workers=self.workers)
+
+        # rank images by their most severe severity count
         df['severity'] = pd.Categorical(df['severity'], ["Critical", "High", "Medium", "Low", "Info"])
-        df['sev_merged'] = df['severity'].astype('string') + ": " + df['count'].astype('string')
         df = df.sort_values(by=['severity', 'count'], ascending=[True, False])
+        if limit:
+            # only the images shown get their severity counts joined into strings
+            df = df[df['imageId'].isin(df['imageId'].drop_duplicates().head(limit))]
+
+        # concat severities
+        df['sev_merged'] = df['severity'].astype('string') + ": " + df['count'].astype('string')
         df = df.groupby('imageId', sort=False).agg(repositories=('repositories', 'first'),
                                                    severities=('sev_merged', f"\n".join)).reset_index()
 
@@ -60,26 +111,15 @@ class ContainerVulnerabilities:
             df = df.head(limit)
         return df
 
+    @traced(category='model')
     def fixable_vulns(self, severities=("Critical", "High"), limit=False):
-        df = pd.json_normalize(self.data,
-                               meta=[['evalCtx', 'image_info', 'repo'],
-                                     'imageId',
-                                     ['featureKey', 'name'],
-                                     'vulnId',
-                                     'severity',
-                                     ['fixInfo', 'fix_available'],
-                                     ['fixInfo', 'fixed_version'],
-                                     ['featureKey', 'version']])
-        if 'severity' not in df:
-            df['severity'] = False
-        df = df[df['severity'].isin(severities)]
-        df = df[df['fixInfo.fix_available'] == 1]
+        # every group contains a single image, so images are processed in parallel for large datasets
+        df = run_partitioned(group_fixable_vulns, self.records,
+                             ['evalCtx.image_info.repo', 'imageId', 'featureKey.name', 'vulnId', 'severity',
+                              'fixInfo.fix_available', 'fixInfo.fixed_version', 'featureKey.version'], 'imageId',
+                             ['evalCtx.image_info.repo', 'imageId', 'severity', 'featureKey.name',
+                              'fixInfo.fixed_version', 'featureKey.version'], severities, workers=self.workers)
         if not df.empty:
-            df = df[['evalCtx.image_info.repo', 'imageId', 'severity', 'featureKey.name', 'featureKey.version', 'vulnId', 'fixInfo.fixed_version']]
-            df = df.groupby(['evalCtx.image_info.repo', 'imageId', 'severity', 'featureKey.name', 'featureKey.version', 'vulnId'],
-                            as_index=False).agg(pd.unique).applymap(lambda x: x[0] if len(x) == 1 else x)
-            df = df.groupby(['evalCtx.image_info.repo', 'imageId', 'severity', 'featureKey.name', 'fixInfo.fixed_version', 'featureKey.version'], as_index=False).agg({'vulnId': ', '.join})
-
             df.rename(columns={'evalCtx.image_info.repo': 'Repository',
                                'imageId': 'Image ID',
                                'severity': 'Severity',
@@ -92,10 +132,20 @@ class ContainerVulnerabilities:
             df = df[['Repository', 'Image ID', 'CVE', 'Severity', 'Package Name', 'Installed Version', 'Fixed Version(s)']]
         return df
 
+    @traced(category='model')
+    def findings(self, severities=("Critical", "High")):
+        '''One row per repository and CVE, the key a vulnerability is compared by across runs.
+
+        Images are identified by repository rather than image ID, a rebuilt image is the same image with new digests.
+        '''
+        df = self.records.to_frame(['evalCtx.image_info.repo', 'vulnId', 'severity'])
+        df = df[df['severity'].isin(severities)].drop_duplicates(['evalCtx.image_info.repo', 'vulnId'])
+        df = df.rename(columns={'evalCtx.image_info.repo': 'Repository', 'vulnId': 'CVE', 'severity': 'Severity'})
+        return df.reset_index(drop=True)
+
+    @traced(category='model')
     def summary(self, severities=["Critical", "High", "Medium", "Low"]):
-        df = pd.json_normalize(self.data,
-                               meta=[['evalCtx', 'image_info', 'repo'], ['featureKey', 'name'], 'vulnId', 'severity',
-                                     'imageId'])
+        df = self.records.to_frame(['evalCtx.image_info.repo', 'featureKey.name', 'vulnId', 'severity', 'imageId'])
 
         # filter
         df = df[df['severity'].isin(severities)]
@@ -122,8 +172,9 @@ class ContainerVulnerabilities:
 
         return df
 
+    @traced(category='model')
     def summary_by_package(self, severities=["Critical", "High", "Medium", "Low"]):
-        df = pd.json_normalize(self.data, meta=[['featureKey', 'name'], 'vulnId', 'severity', 'imageId'])
+        df = self.records.to_frame(['featureKey.name', 'vulnId', 'severity', 'imageId'])
 
         # clean and santiize
         df.rename(columns={'featureKey.name': 'packageName'}, inplace=True)
@@ -163,6 +214,7 @@ class ContainerVulnerabilities:
 
         return df
 
+    @traced(category='chart')
     def top_packages_bar(self, width=600, height=350, format='svg', limit: int = 10):
         df = self.summary_by_package().head(limit)
         import plotly.graph_objects as go
@@ -0,0 +1,19 @@
+from modules.lql import LQLDataset
+from modules.secrets import Secrets
+
+
+class SSHPrivateKeys(LQLDataset):
+
+    dataset_name = 'ssh_private_keys'
+    template_variable = 'secrets_data'
+    time_window = 'alerts'
+    lql_query = "{source { LW_HE_SECRETS_SSH_PRIVATE_KEYS } return {HOSTNAME, FILE_PATH, SSH_KEY_TYPE} }"
+    columns = ('HOSTNAME', 'FILE_PATH', 'SSH_KEY_TYPE')
+    model = Secrets
+
+    def process(self, model: Secrets) -> dict:
+        print(f'Found {model.count_secrets()} total secrets')
+        return {
+            "secrets_raw": model.processed_secrets(),
+            "secrets_count": model.count_secrets()
+        }
@@ -0,0 +1,25 @@
+'''
+Differences between the findings of two runs of a report.
+
+Findings are DataFrames with a natural key, e.g. (Hostname, CVE) for host vulnerabilities or (Cloud, Account,
+Control) for compliance violations. diff_findings() hashes the key columns of every row into one 64 bit integer
+(pandas.util.hash_pandas_object) and compares the runs by membership of those hashes, a single hash table pass over
+each table. The diff stays linear in the number of findings, where a merge on the key columns would compare strings.
+'''
+import pandas as pd
+
+
+def key_hashes(df: pd.DataFrame, keys: tuple) -> pd.Series:
+    # hashed as strings, so a key column read back from a snapshot with another dtype hashes the same
+    columns = {key: df[key] if df[key].dtype == object else df[key].astype(str) for key in keys}
+    return pd.util.hash_pandas_object(pd.DataFrame(columns), index=False)
+
+
+def diff_findings(current: pd.DataFrame, previous: pd.DataFrame, keys: tuple) -> tuple:
+    '''Return the rows of current whose key is not in previous (new) and the rows of previous not in current
+    (resolved).'''
+    current_hashes = key_hashes(current, keys)
+    previous_hashes = key_hashes(previous, keys)
+    new = current[~current_hashes.isin(previous_hashes).to_numpy()]
+    resolved = previous[~previous_hashes.isin(current_hashes).to_numpy()]
+    return new.reset_index(drop=True), resolved.reset_index(drop=True)
@@ -0,0 +1,62 @@
+'''
+The Lacework API searches of a report, each made once with what all of its sections read.
+
+Sections read the same source with different severities: the vulnerability summaries count Critical to Low, the
+fixable vulnerability tables only Critical, the Delta report Critical and High. Reports declare those needs as
+(source, time window, severities) in ReportGen.fetch_needs. gather() plans them into one FetchPlan, so each source
+and time window is searched once with the union of the severities of its sections. Every section gets the same model
+and filters it to its own severities. A source no section needs is never searched. The fields requested are fixed by
+the schema of each model (see search_returns()).
+
+A section reading severities that were not planned still gets them. If the source was already searched, it is
+searched again with the union and a warning is logged, so the needs of the report should be declared.
+'''
+import threading
+
+from logzero import logger
+
+SEVERITIES = ("Critical", "High", "Medium", "Low", "Info")
+# the LaceworkInterface getter of each source searched by severity
+SOURCE_GETTERS = {'host_vulns': 'get_host_vulns',
+                  'container_vulns': 'get_container_vulns',
+                  'alerts': 'get_alerts'}
+
+
+def ordered_severities(severities) -> tuple:
+    # in a fixed order, the severities are part of the cache and checkpoint keys of the getters
+    return tuple(severity for severity in SEVERITIES if severity in set(severities))
+
+
+class FetchPlan:
+
+    def __init__(self, lacework_interface, needs=(), windows: dict = None):
+        self.lacework_interface = lacework_interface
+        # (source, start time, end time) -> severities of every section reading it
+        self.severities = {}
+        # (source, start time, end time) -> (severities searched, model)
+        self.results = {}
+        self.lock = threading.Lock()
+        for source, window, severities in needs:
+            self.add(source, *windows[window], severities)
+
+    def add(self, source: str, start_time: str, end_time: str, severities):
+        if source not in SOURCE_GETTERS:
+            raise ValueError(f"Unknown source {source}, expected one of {', '.join(SOURCE_GETTERS)}")
+        key = (source, start_time, end_time)
+        self.severities[key] = ordered_severities((*self.severities.get(key, ()), *severities))
+
+    def get(self, source: str, start_time: str, end_time: str, severities):
+        '''The model of source holding (at least) severities, searched once for all the sections planned.'''
+        key = (source, start_time, end_time)
+        with self.lock:
+            self.add(source, start_time, end_time, severities)
+            planned = self.severities[key]
+            if key in self.results:
+                searched, model = self.results[key]
+                if searched == planned:
+                    return model
+                logger.warning(f"{', '.join(planned)} {source} were not planned, searching them again. Declare them "
+                               f"in the fetch_needs of the report.")
+            model = getattr(self.lacework_interface, SOURCE_GETTERS[source])(start_time, end_time, severities=planned)
+            self.results[key] = (planned, model)
+            return model
@@ -3,7 +3,8 @@ from PySide6.QtCore import Qt
 from PySide6.QtUiTools import QUiLoader
 from PySide6.QtWebEngineWidgets import QWebEngineView
 from logzero import logger
-from modules.utils import LaceworkTime
+from modules.utils import LaceworkTime, load_report_class
+from modules.checkpoints import FileCheckpointStore
 from modules.mainwindow import Ui_MainWindow
 from __feature__ import true_property
 import traceback
@@ -204,7 +205,7 @@ class ExtensibleReportingGUI(QApplication):
         self.window.ui.spinBoxAlertEndTimeHours.value = int(self.args.alerts_end_time.split(":")[1])
 
     def report_changed(self, report_name):
-        self.report_to_run = [report['report_class'] for report in self.available_reports if report['report_name'] == report_name][0]
+        self.report_to_run = load_report_class([report for report in self.available_reports if report['report_name'] == report_name][0])
         self.report_generator = self.report_to_run(self.basedir, use_cache=bool(self.window.ui.checkBoxUseCache.checkState()), api_key_file=self.pre_processed_args['api_key_file'])
         logger.debug(f"Currently Selected Report: {report_name}")
         self.report = None
@@ -215,10 +216,14 @@ class ExtensibleReportingGUI(QApplication):
 
     def run_report(self):
         try:
-            vuln_start_time = LaceworkTime(f"{self.window.ui.spinBoxVulnStartTimeDays.value}:{self.window.ui.spinBoxVulnStartTimeHours.value}")
-            vuln_end_time = LaceworkTime(f"{self.window.ui.spinBoxVulnEndTimeDays.value}:{self.window.ui.spinBoxVulnEndTimeHours.value}")
-            alert_start_time = LaceworkTime(f"{self.window.ui.spinBoxAlertStartTimeDays.value}:{self.window.ui.spinBoxAlertStartTimeHours.value}")
-            alert_end_time = LaceworkTime(f"{self.window.ui.spinBoxAlertEndTimeDays.value}:{self.window.ui.spinBoxAlertEndTimeHours.value}")
+            # running again after a failure reuses the data saved by the failed run
+            checkpoints = self.pre_processed_args['checkpoints']
+            self.report_generator.lacework_interface.checkpoints = checkpoints
+            reference_time = checkpoints.reference_time if checkpoints else None
+            vuln_start_time = LaceworkTime(f"{self.window.ui.spinBoxVulnStartTimeDays.value}:{self.window.ui.spinBoxVulnStartTimeHours.value}", reference_time=reference_time)
+            vuln_end_time = LaceworkTime(f"{self.window.ui.spinBoxVulnEndTimeDays.value}:{self.window.ui.spinBoxVulnEndTimeHours.value}", reference_time=reference_time)
+            alert_start_time = LaceworkTime(f"{self.window.ui.spinBoxAlertStartTimeDays.value}:{self.window.ui.spinBoxAlertStartTimeHours.value}", reference_time=reference_time)
+            alert_end_time = LaceworkTime(f"{self.window.ui.spinBoxAlertEndTimeDays.value}:{self.window.ui.spinBoxAlertEndTimeHours.value}", reference_time=reference_time)
             if self.window.ui.lineEditCustomLogo.text == "None":
                 custom_logo = None
             else:
@@ -232,6 +237,10 @@ class ExtensibleReportingGUI(QApplication):
                                                          custom_logo=custom_logo)
             self.report_saved = False
             self.report_preview.load_report(self.report)
+            if checkpoints:
+                # the next run fetches fresh data
+                checkpoints.delete()
+                self.pre_processed_args['checkpoints'] = FileCheckpointStore().start(report=checkpoints.metadata['report'])
 
         except:
             traceback_message = traceback.format_exc()
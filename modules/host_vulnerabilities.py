@@ -1,41 +1,86 @@
 import pandas as pd
 import plotly.graph_objects as go
 from logzero import logger
+from modules.instrumentation import traced
+from modules.records import RecordColumns, search_returns
+from modules.partitioned import run_partitioned
 import json
 
 
-class HostVulnerabilities:
+def count_severities_by_host(df, severities):
+    # filter
+    df = df[df['severity'].isin(severities)]
+
+    # delete extra columns
+    df = df[['evalCtx.hostname', 'mid', 'severity']]
+
+    # count severities by MID
+    return df.groupby(['mid', 'severity', 'evalCtx.hostname']).size().reset_index(name='count')
+
 
-    def __init__(self, raw_data):
-        self.data = raw_data
+def group_fixable_vulns(df, severities):
+    df = df[df['severity'].isin(severities)]
+    df = df[df['fixInfo.fix_available'] == '1']
+    if not df.empty:
+        #cve_count = df.groupby('evalCtx.hostname')['vulnId'].nunique()
+        #print(cve_count)
+        df = df[['evalCtx.hostname', 'severity', 'vulnId', 'featureKey.name', 'featureKey.version_installed', 'fixInfo.fixed_version']]
+        # df = df.groupby(['evalCtx.hostname', 'featureKey.name', 'featureKey.version_installed', 'severity', 'vulnId'],
+        #                 as_index=False).agg({'fixInfo.fixed_version': ', '.join})
+        df = df.groupby(['evalCtx.hostname', 'severity', 'vulnId', 'featureKey.name', 'featureKey.version_installed'],
+                        as_index=False).agg(lambda x: ', '.join(x.unique()) if x.dtype == 'object' else x.iloc[0])
+        df = df.groupby(['evalCtx.hostname', 'severity', 'featureKey.name', 'fixInfo.fixed_version','featureKey.version_installed' ], as_index=False).agg({'vulnId': ', '.join})
+    return df
+
+
+class HostVulnerabilities:
 
+    # the fields of the API records read below, everything else (e.g. cveProps) is dropped as records are added
+    fields = {'mid': ('mid',),
+              'severity': ('severity',),
+              'vulnId': ('vulnId',),
+              'evalCtx.hostname': ('evalCtx', 'hostname'),
+              'featureKey.name': ('featureKey', 'name'),
+              'featureKey.version_installed': ('featureKey', 'version_installed'),
+              'fixInfo.fix_available': ('fixInfo', 'fix_available'),
+              'fixInfo.fixed_version': ('fixInfo', 'fixed_version')}
+    # the only fields requested from the vulnerability search
+    returns = search_returns(fields)
+
+    def __init__(self, raw_data, workers=None):
+        self.records = RecordColumns(self.fields, raw_data)
+        # processes used for the per host aggregations of large datasets, LW_REPORT_WORKERS by default
+        self.workers = workers
+
+    def add_records(self, records):
+        self.records.add(records)
+
+    @property
+    def data(self):
+        '''The records as API style dicts (only the stored fields), built on each access.'''
+        return list(self.records.to_records())
+
+    @traced(category='model')
     def total_evaluated(self):
-        df = pd.DataFrame(self.data)
+        df = self.records.to_frame(['mid'])
         # count severities by host & total sum
         unique_hosts = df.mid.nunique()
         return unique_hosts
 
+    @traced(category='model')
     def summary_by_host(self, severities=("Critical", "High", "Medium", "Low"), limit=False):
-        df = pd.json_normalize(self.data,
-                               meta=[['cveProps', 'metadata'], ['evalCtx', 'hostname'], ['featureKey', 'name'],
-                                     'vulnId', 'severity', 'mid'])
-
-        if 'severity' not in df:
-            df['severity'] = False
-
-        # filter
-        df = df[df['severity'].isin(severities)]
+        df = run_partitioned(count_severities_by_host, self.records, ['evalCtx.hostname', 'mid', 'severity'], 'mid',
+                             ['mid', 'severity', 'evalCtx.hostname'], severities, workers=self.workers)
 
-        # delete extra columns
-        df = df[['evalCtx.hostname', 'mid', 'severity']]
-
-        # count severities by MID
-        df = df.groupby(['mid', 'severity', 'evalCtx.hostname']).size().reset_index(name='count')
-
-        # summarize severities onto one column (and sort)
-        df['sev_merged'] = df['severity'].astype('string') + ": " + df['count'].astype('string')
+        # rank hosts by their most severe severity count
         df['severity'] = pd.Categorical(df['severity'], ["Critical", "High", "Medium", "Low", "Info"])
         df = df.sort_values(by=['severity', 'count'], ascending=[True, False])
+        if limit:
+            # only the hosts shown get their severity counts joined into strings
+            df = df[df['mid'].isin(df['mid'].drop_duplicates().head(limit))]
+
+        # summarize severities onto one column
+        df['sev_merged'] = df['severity'].astype('string') + ": " + df['count'].astype('string')
         df = df.groupby('mid', sort=False, as_index=False).agg(
             {'mid': 'first', 'evalCtx.hostname': 'first', 'sev_merged': f"\n".join})
 
@@ -48,28 +93,15 @@ class HostVulnerabilities:
             df = df.head(limit)
         return df
 
+    @traced(category='model')
     def fixable_vulns(self, severities=("Critical", "High"), limit=False):
-        df = pd.json_normalize(self.data,
-                               meta=[['evalCtx', 'hostname'],
-                                     ['featureKey', 'name'],
-                                     'vulnId',
-                                     'severity',
-                                     ['fixInfo', 'fix_available'],
-                                     ['fixInfo', 'fixed_version'],
-                                     ['featureKey', 'version_installed']])
-        if 'severity' not in df:
-            df['severity'] = False
-        df = df[df['severity'].isin(severities)]
-        df = df[df['fixInfo.fix_available'] == '1']
+        # every group contains a single hostname, so hosts are processed in parallel for large datasets
+        df = run_partitioned(group_fixable_vulns, self.records,
+                             ['evalCtx.hostname', 'featureKey.name', 'vulnId', 'severity', 'fixInfo.fix_available',
+                              'fixInfo.fixed_version', 'featureKey.version_installed'], 'evalCtx.hostname',
+                             ['evalCtx.hostname', 'severity', 'featureKey.name', 'fixInfo.fixed_version',
+                              'featureKey.version_installed'], severities, workers=self.workers)
         if not df.empty:
-            #cve_count = df.groupby('evalCtx.hostname')['vulnId'].nunique()
-            #print(cve_count)
-            df = df[['evalCtx.hostname', 'severity', 'vulnId', 'featureKey.name', 'featureKey.version_installed', 'fixInfo.fixed_version']]
-            # df = df.groupby(['evalCtx.hostname', 'featureKey.name', 'featureKey.version_installed', 'severity', 'vulnId'],
-            #                 as_index=False).agg({'fixInfo.fixed_version': ', '.join})
-            df = df.groupby(['evalCtx.hostname', 'severity', 'vulnId', 'featureKey.name', 'featureKey.version_installed'],
-                            as_index=False).agg(lambda x: ', '.join(x.unique()) if x.dtype == 'object' else x.iloc[0])
-            df = df.groupby(['evalCtx.hostname', 'severity', 'featureKey.name', 'fixInfo.fixed_version','featureKey.version_installed' ], as_index=False).agg({'vulnId': ', '.join})
             # rename columns
             df.rename(columns={'evalCtx.hostname': 'Hostname',
                                'severity': 'Severity',
@@ -81,9 +113,17 @@ class HostVulnerabilities:
             df = df[['Hostname', 'CVE', 'Severity', 'Package Name', 'Installed Version', 'Fixed Version(s)']]
         return df
 
+    @traced(category='model')
+    def findings(self, severities=("Critical", "High")):
+        '''One row per host and CVE, the key a vulnerability is compared by across runs.'''
+        df = self.records.to_frame(['evalCtx.hostname', 'vulnId', 'severity'])
+        df = df[df['severity'].isin(severities)].drop_duplicates(['evalCtx.hostname', 'vulnId'])
+        df = df.rename(columns={'evalCtx.hostname': 'Hostname', 'vulnId': 'CVE', 'severity': 'Severity'})
+        return df.reset_index(drop=True)
+
+    @traced(category='model')
     def summary(self, severities=("Critical", "High", "Medium", "Low")):
-        df = pd.json_normalize(self.data,
-                               meta=[['evalCtx', 'hostname'], ['featureKey', 'name'], 'vulnId', 'severity', 'mid'])
+        df = self.records.to_frame(['evalCtx.hostname', 'mid', 'severity'])
 
         if 'severity' not in df:
             df['severity'] = False
@@ -114,6 +154,7 @@ class HostVulnerabilities:
 
         return df
 
+    @traced(category='chart')
     def host_vulns_by_severity_bar(self, severities=["Critical", "High", "Medium", "Low"], width=600, height=350, format='svg'):
         df = self.summary(severities=severities)
 
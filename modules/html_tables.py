@@ -0,0 +1,77 @@
+'''
+Chunked rendering of DataFrames as HTML tables in the report templates.
+
+DataFrame.to_html builds a table as one string, which the rendered report then copies into an even larger one. The
+html_table filter yields the table a chunk of rows at a time instead, each chunk formatted by to_html exactly as the
+whole table would be, so a template rendered with Template.generate() or stream() never holds a whole table:
+
+    {% for chunk in alerts_data.alerts_raw | html_table(index=False, section='alerts') %}{{ chunk }}{% endfor %}
+
+Rows shown per section are controlled with the table_options template variable, e.g.
+{'alerts': {'max_rows': 1000}} truncates the alerts table to 1000 rows and {'alerts': {'page_rows': 200}} splits it
+into tables of 200 rows, each with its own header.
+'''
+import jinja2
+import pandas as pd
+from markupsafe import Markup
+from pandas.io.formats.format import format_array
+
+DEFAULT_CHUNK_ROWS = 500
+TBODY_START = '<tbody>\n'
+TBODY_END = '  </tbody>'
+
+
+def split_table(html: str) -> tuple:
+    '''Split the output of to_html into the markup before, within and after its tbody.'''
+    body_start = html.index(TBODY_START) + len(TBODY_START)
+    body_end = html.rindex(TBODY_END)
+    return html[:body_start], html[body_start:body_end], html[body_end:]
+
+
+def column_formatters(df: pd.DataFrame) -> list:
+    '''to_html formatters writing the values of each chunk as the whole of df is written.
+
+    to_html formats float and datetime columns from all of their values (e.g. the decimals shown), the formatters
+    of those columns look up the formatting of the whole column.'''
+    formatters = []
+    for _, values in df.items():
+        if values.dtype.kind in 'fcmM':
+            formatted = dict(zip(values, (value.strip() for value in format_array(values._values, None))))
+            formatters.append(formatted.get)
+        else:
+            formatters.append(None)
+    return formatters
+
+
+def generate_table(df: pd.DataFrame, index: bool = True, max_rows: int = None, page_rows: int = None,
+                   chunk_rows: int = DEFAULT_CHUNK_ROWS, newlines_to_br: bool = False):
+    '''Yield the HTML of df in chunks of at most chunk_rows rows.'''
+    def format_html(html):
+        # to_html writes newlines within values as a literal \n
+        return Markup(html.replace("\\n", "<br>") if newlines_to_br else html)
+
+    total_rows = len(df)
+    if max_rows is not None and total_rows > max_rows:
+        df = df.head(max_rows)
+    if len(df) <= min(chunk_rows, page_rows or chunk_rows):
+        # an empty table too, which has no pages
+        yield format_html(df.to_html(index=index))
+    else:
+        formatters = column_formatters(df)
+        page_rows = page_rows or len(df)
+        for page_start in range(0, len(df), page_rows):
+            page = df.iloc[page_start:page_start + page_rows]
+            for chunk_start in range(0, len(page), chunk_rows):
+                chunk = page.iloc[chunk_start:chunk_start + chunk_rows]
+                head, rows, tail = split_table(chunk.to_html(index=index, formatters=formatters))
+                yield format_html((head if chunk_start == 0 else '') + rows)
+            yield format_html(tail)
+    if len(df) < total_rows:
+        yield Markup(f'<p class="table_truncated">Showing the first {len(df)} of {total_rows} rows.</p>')
+
+
+@jinja2.pass_context
+def html_table(context, df: pd.DataFrame, index: bool = True, section: str = None, **options):
+    '''Jinja filter, the options of the section in table_options apply unless given in the template.'''
+    section_options = context.get('table_options', {}).get(section, {}) if section else {}
+    return generate_table(df, index=index, **{**section_options, **options})
@@ -0,0 +1,230 @@
+'''
+Spans around the stages of report generation: Lacework API calls, model transformations, charts, template rendering
+and PDF writing.
+
+Tracing is disabled by default, span() and current_span() then hand out a shared no-op span so instrumented code costs
+next to nothing. Once enabled, every span records its wall time, the CPU time of the thread running it, the process
+peak RSS when it finished (and how much the span grew it), plus any counters set on it, e.g. pages, records, HTTP
+requests, bytes and per-request latency for API calls. Finished spans are exported as a JSON trace file or in the
+Chrome trace event format (open in chrome://tracing or https://ui.perfetto.dev).
+'''
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak RSS is then not recorded
+    resource = None
+
+
+def get_peak_rss_mb():
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes everywhere else
+    return peak_rss / (1024 * 1024) if sys.platform == 'darwin' else peak_rss / 1024
+
+
+class Span:
+
+    def __init__(self, span_id, name, category, parent_id, attributes):
+        self.span_id = span_id
+        self.name = name
+        self.category = category
+        self.parent_id = parent_id
+        self.thread = threading.current_thread().name
+        self.attributes = dict(attributes)
+        self.counters = {}
+        self.error = None
+        self.start = None
+        self.wall_s = None
+        self.cpu_s = None
+        self.peak_rss_mb = None
+        self.rss_growth_mb = None
+        self._lock = threading.Lock()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, counter, value=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def append(self, series, value):
+        with self._lock:
+            self.counters.setdefault(series, []).append(value)
+
+    def to_dict(self, origin: float) -> dict:
+        return {'id': self.span_id,
+                'parent_id': self.parent_id,
+                'name': self.name,
+                'category': self.category,
+                'thread': self.thread,
+                'start_s': round(self.start - origin, 6),
+                'wall_s': round(self.wall_s, 6),
+                'cpu_s': round(self.cpu_s, 6),
+                'peak_rss_mb': round(self.peak_rss_mb, 2) if self.peak_rss_mb is not None else None,
+                'rss_growth_mb': round(self.rss_growth_mb, 2) if self.rss_growth_mb is not None else None,
+                'error': self.error,
+                'attributes': self.attributes,
+                'counters': self.counters}
+
+
+class NoopSpan:
+    span_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, counter, value=1):
+        pass
+
+    def append(self, series, value):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Tracer:
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self.origin = time.perf_counter()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self):
+        self.reset()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.spans = []
+            self.origin = time.perf_counter()
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def current_span(self):
+        stack = self._stack() if self.enabled else None
+        return stack[-1] if stack else NOOP_SPAN
+
+    @contextmanager
+    def span(self, name: str, category: str = 'report', parent=None, **attributes):
+        '''Time the enclosed block. parent links spans started in worker threads to the span that submitted them.'''
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        stack = self._stack()
+        parent = parent or (stack[-1] if stack else None)
+        span = Span(next(self._ids), name, category, parent.span_id if parent else None, attributes)
+        stack.append(span)
+        peak_rss_start = get_peak_rss_mb()
+        cpu_start = time.thread_time()
+        span.start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f'{type(e).__name__}: {str(e)}'
+            raise
+        finally:
+            span.wall_s = time.perf_counter() - span.start
+            span.cpu_s = time.thread_time() - cpu_start
+            span.peak_rss_mb = get_peak_rss_mb()
+            if span.peak_rss_mb is not None:
+                span.rss_growth_mb = span.peak_rss_mb - peak_rss_start
+            stack.pop()
+            with self._lock:
+                self.spans.append(span)
+
+    def record_http_response(self, response, *args, **kwargs):
+        '''requests response hook, counts the request against the span active in the calling thread.'''
+        if not self.enabled:
+            # installed on pooled sessions, which outlive a traced run
+            return
+        span = self.current_span()
+        span.add('http_requests')
+        span.add('bytes', len(response.content or b''))
+        span.append('request_latency_s', round(response.elapsed.total_seconds(), 4))
+        if response.status_code >= 400:
+            span.add('http_errors')
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return {'pid': os.getpid(),
+                'peak_rss_mb': get_peak_rss_mb(),
+                'spans': [span.to_dict(self.origin) for span in spans]}
+
+    def to_chrome_trace(self) -> dict:
+        trace = self.to_dict()
+        thread_ids = {}
+        events = []
+        for span in trace['spans']:
+            thread_id = thread_ids.setdefault(span['thread'], len(thread_ids) + 1)
+            args = {**span['attributes'], **span['counters'], 'cpu_s': span['cpu_s'],
+                    'peak_rss_mb': span['peak_rss_mb'], 'rss_growth_mb': span['rss_growth_mb']}
+            if span['error']:
+                args['error'] = span['error']
+            events.append({'name': span['name'], 'cat': span['category'], 'ph': 'X', 'pid': trace['pid'],
+                           'tid': thread_id, 'ts': round(span['start_s'] * 1e6), 'dur': round(span['wall_s'] * 1e6),
+                           'args': args})
+        for thread_name, thread_id in thread_ids.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': trace['pid'], 'tid': thread_id,
+                           'args': {'name': thread_name}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, path: str, trace_format: str = 'json'):
+        trace = self.to_chrome_trace() if trace_format == 'chrome' else self.to_dict()
+        with open(path, 'w') as f:
+            json.dump(trace, f, indent=1, default=str)
+
+    def summary(self, limit: int = 20) -> list:
+        '''Return lines describing the slowest spans.'''
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.wall_s, reverse=True)[:limit]
+        return [f"{span.wall_s:>10.3f}s wall {span.cpu_s:>10.3f}s cpu "
+                f"{'' if span.peak_rss_mb is None else f'{span.peak_rss_mb:>9.1f}MB peak '}"
+                f"{span.category}:{span.name}{' ' + json.dumps(span.attributes) if span.attributes else ''}"
+                for span in spans]
+
+
+tracer = Tracer()
+
+
+def span(name: str, category: str = 'report', parent=None, **attributes):
+    return tracer.span(name, category=category, parent=parent, **attributes)
+
+
+def current_span():
+    return tracer.current_span()
+
+
+def traced(name: str = None, category: str = 'report'):
+    '''Decorator running the function inside a span, named after the function unless name is given.'''
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(span_name, category=category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,79 @@
+'''
+Decoding of the JSON pages of the Lacework API.
+
+requests decodes a response with the json module into dicts holding every field of every record, most of which the
+models never read. Pages of records whose model declares the fields it reads (the RecordColumns fields of a model)
+are decoded by msgspec against a schema built from those fields instead: the rest of each record (e.g. the cveProps
+of a vulnerability) is skipped by the parser without being built into Python objects, and the records are dicts
+holding only the model's fields. Other responses are decoded by orjson.
+
+Both are optional, the fast-json extra of the project. Without them, or for a page that does not match the schema (e.g. a
+field holding an unexpected type), the response is decoded by the json module as before.
+'''
+import functools
+import importlib
+import json
+from typing import Any, Optional, TypedDict
+
+from logzero import logger
+
+
+@functools.lru_cache(maxsize=None)
+def optional_module(name: str):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        logger.debug(f'{name} is not installed, decoding API responses with the json module')
+        return None
+
+
+def record_type(name: str, paths) -> type:
+    '''TypedDict of API records holding the fields at paths (tuples of keys), any nested object may be null.'''
+    tree = {}
+    for path in paths:
+        node = tree
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+            if node is None:
+                # the whole object is read already
+                break
+        else:
+            node[path[-1]] = None
+    fields = {key: Any if subtree is None else Optional[record_type(f'{name}_{key}', subtree_paths(subtree))]
+              for key, subtree in tree.items()}
+    return TypedDict(name, fields, total=False)
+
+
+def subtree_paths(tree: dict, parents: tuple = ()) -> list:
+    return [path for key, subtree in tree.items()
+            for path in ([(*parents, key)] if subtree is None else subtree_paths(subtree, (*parents, key)))]
+
+
+@functools.lru_cache(maxsize=None)
+def page_decoder(paths: tuple):
+    '''msgspec decoder of search pages of records holding the fields at paths, None without msgspec.'''
+    msgspec = optional_module('msgspec')
+    if msgspec is None:
+        return None
+    page_type = TypedDict('Page', {'paging': Any, 'data': list[record_type('Record', paths)]}, total=False)
+    return msgspec.json.Decoder(page_type)
+
+
+def decode_json(content: bytes, fields: dict = None, fallback=json.loads):
+    '''The JSON of an API response, the records of a page with fields (RecordColumns fields) hold only those fields.
+    Content the fast decoders reject is decoded by fallback, which raises the errors of malformed content.'''
+    try:
+        decoder = page_decoder(tuple(fields.values())) if fields else None
+        if decoder is not None:
+            return decoder.decode(content)
+        orjson = optional_module('orjson')
+        if orjson is not None:
+            return orjson.loads(content)
+    except Exception as e:
+        logger.debug(f'Fast JSON decoding failed ({str(e)}), decoding with the json module')
+    return fallback(content)
+
+
+def decode_response(response, fields: dict = None):
+    '''decode_json() of a requests Response, falling back to response.json().'''
+    return decode_json(response.content, fields, fallback=lambda content: response.json())
@@ -1,6 +1,12 @@
+import configparser
+import functools
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from laceworksdk import LaceworkClient
+from laceworksdk import config as lacework_config
 from laceworksdk import exceptions
 from logzero import logger
 from modules.host_vulnerabilities import HostVulnerabilities
@@ -8,114 +14,235 @@ from modules.container_vulnerabilities import ContainerVulnerabilities
 from modules.alerts import Alerts
 from modules.compliance import Compliance
 from modules.secrets import Secrets
+from modules.lql import LQLExecutor
+from modules.request_executor import RequestExecutor
+from modules.datasets.ssh_private_keys import SSHPrivateKeys
 from modules.utils import cache_results
+from modules.checkpoints import checkpoint_results, checkpoint_key
+from modules.instrumentation import tracer, traced, current_span
+
+
+COMPLIANCE_PROVIDER_LOOKUP = {'AWS': 'AwsCfg',
+                              'GCP': 'GcpCfg',
+                              'AZURE': 'AzureCfg'}
+COMPLIANCE_REPORT_LOOKUP = {'AwsCfg':
+                                {'CIS': 'AWS_CIS_14',
+                                 'PCI': 'AWS_PCI_DSS_3.2.1',
+                                 },
+                            'AzureCfg':
+                                {'CIS': 'AZURE_CIS_1_5',
+                                 'PCI': 'AZURE_PCI_DSS_3_2_1_CIS_1_5',
+                                 },
+                            'GcpCfg':
+                                {'CIS': 'GCP_CIS13',
+                                 'PCI': 'GCP_PCI_Rev2',
+                                 }
+                            }
+
+
+def severity_search_filters(start_time, end_time, severity, returns: list = None) -> dict:
+    '''Search body of the records of one severity, with returns only those fields of each record are sent.'''
+    filters = {
+        "timeFilter": {
+            "startTime": start_time,
+            "endTime": end_time
+        },
+        "filters":
+            [
+                {
+                    "field": "severity",
+                    "expression": "eq",
+                    "value": str(severity)
+                }
+            ]
+    }
+    if returns:
+        filters["returns"] = list(returns)
+    return filters
+
+
+def get_config_accounts(accounts: list) -> list:
+    '''The enabled, healthy cloud accounts of the CloudAccounts API that compliance reports are run for.'''
+    return [account for account in accounts if ("Cfg" in account['type'] and account['enabled'] == 1 and account['state']['ok'] is True)]
+
+
+def get_account_details(config_account: dict, azure_tenant_data: list = None) -> list:
+    '''The report query IDs of a config account, azure_tenant_data is the AzureSubscriptions of an AzureCfg tenant.'''
+    logger.debug(f"Found Account: {json.dumps(config_account['data'])}")
+    if config_account['type'] == 'GcpCfg':
+        return [{'name': config_account['name'],
+                 'type': config_account['type'],
+                 'primary_query_id': None,
+                 'secondary_query_id': config_account['data']['id'],
+                 }]
+    if config_account['type'] == 'AzureCfg':
+        return [{'name': config_account['name'],
+                 'type': config_account['type'],
+                 'primary_query_id': config_account['data']['tenantId'],
+                 'secondary_query_id': str(subscription).split(' ')[0],
+                 } for subscription in azure_tenant_data[0]['subscriptions']]
+    if config_account['type'] == 'AwsCfg':
+        arn_elements = config_account['data']['crossAccountCredentials']['roleArn'].split(':')
+        return [{'name': config_account['name'],
+                 'type': config_account['type'],
+                 'primary_query_id': arn_elements[4],
+                 'secondary_query_id': None,
+                 }]
+    return []
+
+
+def get_credentials(api_key_file: dict = None) -> dict:
+    '''Account, subaccount, key and secret of an API key file, else as LaceworkClient() finds them: the LW_*
+    environment variables, then the profile of ~/.lacework.toml.'''
+    base_domain = os.getenv(lacework_config.LACEWORK_API_BASE_DOMAIN_ENVIRONMENT_VARIABLE) or \
+        lacework_config.DEFAULT_BASE_DOMAIN
+    if api_key_file:
+        credentials = {'account': api_key_file['account'], 'subaccount': api_key_file.get('subAccount'),
+                       'api_key': api_key_file['keyId'], 'api_secret': api_key_file['secret']}
+    else:
+        credentials = {'account': os.getenv(lacework_config.LACEWORK_ACCOUNT_ENVIRONMENT_VARIABLE),
+                       'subaccount': os.getenv(lacework_config.LACEWORK_SUBACCOUNT_ENVIRONMENT_VARIABLE),
+                       'api_key': os.getenv(lacework_config.LACEWORK_API_KEY_ENVIRONMENT_VARIABLE),
+                       'api_secret': os.getenv(lacework_config.LACEWORK_API_SECRET_ENVIRONMENT_VARIABLE)}
+        config_file_path = os.path.join(os.path.expanduser("~"), lacework_config.LACEWORK_CLI_CONFIG_RELATIVE_PATH)
+        profile = os.getenv(lacework_config.LACEWORK_API_CONFIG_SECTION_ENVIRONMENT_VARIABLE, "default")
+        config = configparser.ConfigParser()
+        config.read([config_file_path])
+        if config.has_section(profile):
+            profile_values = {name: config[profile].get(name, "").strip('"') or None
+                              for name in ('account', 'subaccount', 'api_key', 'api_secret')}
+            # the subaccount of the profile is only used with the account of the profile
+            if credentials['account'] or credentials['subaccount']:
+                profile_values['subaccount'] = None
+            credentials = {name: value or profile_values[name] for name, value in credentials.items()}
+    if credentials['account']:
+        credentials['account'] = credentials['account'].removesuffix(f'.{base_domain}')
+    credentials['base_domain'] = base_domain
+    return credentials
+
+
+def lacework_client_arguments(api_key_file: dict = None) -> dict:
+    '''LaceworkClient arguments of an API key file. Without one LaceworkClient() finds the credentials itself, in the
+    LW_* environment variables or the profile of ~/.lacework.toml.'''
+    if not api_key_file:
+        return {}
+    arguments = {'account': api_key_file['account'],
+                 'api_key': api_key_file['keyId'],
+                 'api_secret': api_key_file['secret']}
+    if 'subAccount' in api_key_file:
+        arguments['subaccount'] = api_key_file['subAccount']
+    return arguments
+
+
+_lacework_clients = {}
+_lacework_clients_lock = threading.Lock()
+# a lock per pooled client, held while its access token is checked and renewed
+_access_token_locks = {}
+
+
+def get_lacework_client(api_key_file: dict = None) -> LaceworkClient:
+    '''The LaceworkClient of an API key, shared by every LaceworkInterface and thread using the same account,
+    subaccount, key and base domain. Its HTTP session keeps its connections open and its access token is reused until
+    it expires, so only the first report of a process authenticates.'''
+    arguments = lacework_client_arguments(api_key_file)
+    # keyed on the credentials the client ends up with, those of the environment can change between calls
+    credentials = get_credentials(api_key_file)
+    key = (credentials['account'], credentials['subaccount'], credentials['api_key'], credentials['base_domain'])
+    with _lacework_clients_lock:
+        if key not in _lacework_clients:
+            lacework_client = LaceworkClient(**arguments)
+            _access_token_locks[id(lacework_client)] = threading.Lock()
+            _lacework_clients[key] = lacework_client
+        return _lacework_clients[key]
+
+
+def refresh_access_token(lacework_client: LaceworkClient):
+    '''Renew the access token of a pooled client once it expired, in one thread while the others wait for it. The SDK
+    renews an expired token in every thread that makes a request.'''
+    token_lock = _access_token_locks.get(id(lacework_client))
+    if token_lock is not None:
+        with token_lock:
+            lacework_client._session._check_access_token()
+
+
+def clear_lacework_clients():
+    '''Close and forget the pooled clients, e.g. after API keys were rotated.'''
+    with _lacework_clients_lock:
+        for lacework_client in _lacework_clients.values():
+            lacework_client._session._session.close()
+        _lacework_clients.clear()
+        _access_token_locks.clear()
 
 
 class LaceworkInterface:
 
-    def __init__(self, api_key_file=None, use_cache=False):
-        if api_key_file:
-            if 'subAccount' in api_key_file:
-                self.lacework = LaceworkClient(account=api_key_file['account'],
-                                               subaccount=api_key_file['subAccount'],
-                                               api_key=api_key_file['keyId'],
-                                               api_secret=api_key_file['secret']
-                                               )
-            else:
-                self.lacework = LaceworkClient(account=api_key_file['account'],
-                                               api_key=api_key_file['keyId'],
-                                               api_secret=api_key_file['secret']
-                                               )
-        else:
-            self.lacework = LaceworkClient()
+    def __init__(self, api_key_file=None, use_cache=False, lacework_client=None, checkpoints=None):
+        # pooled, every LaceworkInterface of the same API key shares one HTTP session and access token
+        self.lacework = lacework_client or get_lacework_client(api_key_file)
+        # count every HTTP response (bytes, latency) against the span of the call that made it
+        if tracer.record_http_response not in self.lacework._session._session.hooks['response']:
+            self.lacework._session._session.hooks['response'].append(tracer.record_http_response)
+        # retries, backoff and the rate limit shared by every request made with this account
+        self.request_executor = RequestExecutor(self.lacework,
+                                                before_request=functools.partial(refresh_access_token, self.lacework))
         self.use_cache = use_cache
-        self.compliance_provider_lookup = {'AWS': 'AwsCfg',
-                                           'GCP': 'GcpCfg',
-                                           'AZURE': 'AzureCfg'}
-        self.compliance_report_lookup = {'AwsCfg':
-                                             {'CIS': 'AWS_CIS_14',
-                                              'PCI': 'AWS_PCI_DSS_3.2.1',
-                                              },
-                                         'AzureCfg':
-                                             {'CIS': 'AZURE_CIS_1_5',
-                                              'PCI': 'AZURE_PCI_DSS_3_2_1_CIS_1_5',
-                                              },
-                                         'GcpCfg':
-                                             {'CIS': 'GCP_CIS13',
-                                              'PCI': 'GCP_PCI_Rev2',
-                                              }
-                                         }
+        # CheckpointStore of the current run, everything fetched is saved to it as it arrives
+        self.checkpoints = checkpoints
+        # LQL dataset classes by dataset_name, registered by get_datasets()
+        self.datasets = {}
+        self.compliance_provider_lookup = COMPLIANCE_PROVIDER_LOOKUP
+        self.compliance_report_lookup = COMPLIANCE_REPORT_LOOKUP
 
     def write_json_file(self, obj, name):
         with open(name, 'w') as f:
             json.dump(obj, f)
 
+    def search_checkpoint(self, name, filters):
+        return self.checkpoints.search(checkpoint_key(f'search_{name}', filters)) if self.checkpoints else None
+
+    def checkpointed(self, key, fetch):
+        return self.checkpoints.get_or_fetch(key, fetch) if self.checkpoints else fetch()
+
+    @traced(name='lacework.get_cfg_account_ids', category='api')
     @cache_results
+    @checkpoint_results
     def get_cfg_account_ids(self):
         try:
-            accounts = self.lacework.cloud_accounts.get()['data']
+            accounts = self.request_executor.call('cloud_accounts', self.lacework.cloud_accounts.get)['data']
         except Exception as e:
             logger.error(f"Failed to retrieve list of cloud accounts from Lacework API:{str(e)}")
             raise e
         account_details = []
-        config_accounts = [account for account in accounts if ("Cfg" in account['type'] and account['enabled'] == 1 and account['state']['ok'] is True)]
-        for config_account in config_accounts:
-            logger.debug(f"Found Account: {json.dumps(config_account['data'])}")
-            if config_account['type'] == 'GcpCfg':
-                #project_data = self.lacework.configs.gcp_projects.get()
-                account_details.append({'name': config_account['name'],
-                                        'type': config_account['type'],
-                                        'primary_query_id': None,
-                                        'secondary_query_id': config_account['data']['id'],
-                                        })
-            elif config_account['type'] == 'AzureCfg':
-                tenant_data = self.lacework.configs.azure_subscriptions.get(tenantId=config_account['data']['tenantId'])['data']
-                for subscription in tenant_data[0]['subscriptions']:
-                    #logger.info(f"Adding tenant:{config_account['data']['tenantId']} Subscription:{str(subscription).split(' ')[0]}")
-                    account_details.append({'name': config_account['name'],
-                                            'type': config_account['type'],
-                                            'primary_query_id': config_account['data']['tenantId'],
-                                            'secondary_query_id': str(subscription).split(' ')[0],
-                                            })
-            elif config_account['type'] == 'AwsCfg':
-                arn_elements = config_account['data']['crossAccountCredentials']['roleArn'].split(':')
-                account_details.append({'name': config_account['name'],
-                                        'type': config_account['type'],
-                                        'primary_query_id': arn_elements[4],
-                                        'secondary_query_id': None,
-                                        })
+        for config_account in get_config_accounts(accounts):
+            azure_tenant_data = None
+            if config_account['type'] == 'AzureCfg':
+                azure_tenant_data = self.request_executor.call('azure_subscriptions', self.lacework.configs.azure_subscriptions.get,
+                                                               tenantId=config_account['data']['tenantId'])['data']
+            account_details.extend(get_account_details(config_account, azure_tenant_data))
         return account_details
 
+    @traced(name='lacework.get_alerts', category='api')
     @cache_results
+    @checkpoint_results
     def get_alerts(self, start_time, end_time, severities=('Critical', 'High')):
         logger.debug(f'Getting alerts from {start_time} to {end_time}:')
         alerts_list = []
         for severity in severities:
-            filters = {
-                "timeFilter": {
-                    "startTime": start_time,
-                    "endTime": end_time
-                },
-                "filters":
-                    [
-                        {
-                            "field": "severity",
-                            "expression": "eq",
-                            "value": severity
-                        }
-                    ]
-            }
+            filters = severity_search_filters(start_time, end_time, severity)
 
+            i = 1
             try:
-                alerts = self.lacework.alerts.search(json=filters)
+                for page in self.request_executor.search(self.lacework.alerts, filters,
+                                                         checkpoint=self.search_checkpoint('alerts', filters),
+                                                         fields=Alerts.fields):
+                    logger.info('Saving page ' + str(i))
+                    i = i + 1
+                    current_span().add('pages')
+                    current_span().add('records', len(page['data']))
+                    alerts_list.extend(page['data'])
             except Exception as e:
                 logger.error(f"Failed to retrieve list of alerts from Lacework API:{str(e)}")
                 raise e
-            i = 1
-            for page in alerts:
-                logger.info('Saving page ' + str(i))
-                i = i + 1
-                alerts_list.extend(page['data'])
             if i > 100:
                 logger.warning(
                     "Lacework API returned maximum pages of host vuln results (100 pages). Processed dataset is likely incomplete.")
@@ -123,104 +250,116 @@ class LaceworkInterface:
         alerts = Alerts(alerts_list)
         return alerts
 
-    @cache_results
     def get_secrets(self, start_time, end_time):
-        logger.debug(f'Getting secrets from {start_time} to {end_time}:')
-        lql_query = "{source { LW_HE_SECRETS_SSH_PRIVATE_KEYS } return {HOSTNAME, FILE_PATH, SSH_KEY_TYPE} }"
-        lql_query_args = {"StartTimeRange": start_time,
-                          "EndTimeRange": end_time}
+        self.datasets.setdefault(SSHPrivateKeys.dataset_name, SSHPrivateKeys)
+        return self.get_dataset(start_time, end_time, dataset_name=SSHPrivateKeys.dataset_name)
 
+    def get_datasets(self, dataset_classes, start_time, end_time):
+        '''Run several LQL datasets concurrently.
+            Returns a dict of dataset_name -> populated model, or the exception raised while fetching that dataset.
+            '''
+        results = {}
+        if not dataset_classes:
+            return results
+        for dataset_class in dataset_classes:
+            self.datasets[dataset_class.dataset_name] = dataset_class
+        with ThreadPoolExecutor(max_workers=min(len(dataset_classes), 4)) as pool:
+            futures = {pool.submit(self.get_dataset, start_time, end_time, dataset_name=dataset_class.dataset_name):
+                           dataset_class.dataset_name for dataset_class in dataset_classes}
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    results[futures[future]] = e
+        return results
+
+    @traced(name='lacework.get_dataset', category='api')
+    @cache_results
+    @checkpoint_results
+    def get_dataset(self, start_time, end_time, dataset_name=None):
+        logger.debug(f'Getting dataset {dataset_name} from {start_time} to {end_time}:')
+        dataset = self.datasets[dataset_name]()
+        model = dataset.create_model()
+        lql_executor = LQLExecutor(self.lacework, request_executor=self.request_executor)
         try:
-            secrets = self.lacework.queries.execute(query_text=lql_query, arguments=lql_query_args)
+            chunk_checkpoint = self.checkpoints.chunks(checkpoint_key(f'lql_{dataset_name}', start_time, end_time)) \
+                if self.checkpoints else None
+            for rows in lql_executor.execute(dataset.lql_query, start_time, end_time, checkpoint=chunk_checkpoint):
+                current_span().add('records', len(rows))
+                model.add_rows(dataset.project(rows))
         except Exception as e:
-            logger.error(f"Failed to retrieve list of secrets from Lacework API:{str(e)}")
+            logger.error(f"Failed to retrieve dataset {dataset_name} from Lacework API:{str(e)}")
             raise e
-        return Secrets(secrets)
+        return model
 
+    @traced(name='lacework.get_host_vulns', category='api')
     @cache_results
+    @checkpoint_results
     def get_host_vulns(self, start_time, end_time, severities=("Critical", "High", "Medium")):
-        results = []
+        # pages are added to the model as they arrive, only the fields it reads are kept
+        host_vulns = HostVulnerabilities([])
         for severity in severities:
-            filters = {
-                "timeFilter": {
-                    "startTime": start_time,
-                    "endTime": end_time
-                },
-                "filters":
-                    [
-                        {
-                            "field": "severity",
-                            "expression": "eq",
-                            "value": str(severity)
-                        }
-                    ]
-                }
+            filters = severity_search_filters(start_time, end_time, severity, returns=HostVulnerabilities.returns)
             logger.debug(f'Getting Host Vulns with following filters:{filters}')
 
+            i = 1
             try:
-                host_vulns = self.lacework.vulnerabilities.hosts.search(json=filters)
+                for page in self.request_executor.search(self.lacework.vulnerabilities.hosts, filters,
+                                                         checkpoint=self.search_checkpoint('host_vulns', filters),
+                                                         fields=HostVulnerabilities.fields):
+                    logger.info('Saving page ' + str(i) + f' with {len(page.get("data", []))} records')
+                    i = i + 1
+                    current_span().add('pages')
+                    current_span().add('records', len(page['data']))
+                    host_vulns.add_records(page['data'])
             except Exception as e:
                 logger.error(f"Failed to retrieve list of host vulnerabilities from Lacework API:{str(e)}")
                 raise e
-
-            i = 1
-            for page in host_vulns:
-                logger.info('Saving page ' + str(i) + f' with {len(page.get("data", []))} records')
-                i = i + 1
-                results.extend(page['data'])
             logger.info(f'Total records for severity {severity}: {i-1} pages')
             if i > 100:
                 logger.warning(
                     "Lacework API returned maximum pages of host vuln results (100 pages). Processed dataset is likely incomplete.")
 
-        logger.info(f'Total host vulnerability records retrieved: {len(results)}')
-        host_vulns = HostVulnerabilities(results)
+        logger.info(f'Total host vulnerability records retrieved: {len(host_vulns.records)}')
         return host_vulns
 
+    @traced(name='lacework.get_container_vulns', category='api')
     @cache_results
+    @checkpoint_results
     def get_container_vulns(self, start_time, end_time, severities=("Critical", "High", "Medium")):
-        results = []
+        # pages are added to the model as they arrive, only the fields it reads are kept
+        container_vulns = ContainerVulnerabilities([])
         for severity in severities:
-            filters = {
-                "timeFilter": {
-                    "startTime": start_time,
-                    "endTime": end_time
-                },
-            "filters":
-            [
-                {
-                    "field": "severity",
-                    "expression": "eq",
-                    "value": severity
-                }
-            ]
-        }
+            filters = severity_search_filters(start_time, end_time, severity, returns=ContainerVulnerabilities.returns)
             logger.debug(f'Getting Container Vulnerabilities with following filters:{filters}')
+            i = 1
             try:
-                container_vulns = self.lacework.vulnerabilities.containers.search(json=filters)
+                for page in self.request_executor.search(self.lacework.vulnerabilities.containers, filters,
+                                                         checkpoint=self.search_checkpoint('container_vulns', filters),
+                                                         fields=ContainerVulnerabilities.fields):
+                    logger.info('Saving page ' + str(i))
+                    i = i + 1
+                    current_span().add('pages')
+                    current_span().add('records', len(page['data']))
+                    container_vulns.add_records(page['data'])
             except Exception as e:
                 logger.error(f"Failed to retrieve list of container vulnerabilities from Lacework API:{str(e)}")
                 raise e
-
-            # logger.info('Found ' + len(container_vulns) + ' pages of data')
-            i = 1
-            for page in container_vulns:
-                logger.info('Saving page ' + str(i))
-                i = i + 1
-                results.extend(page['data'])
             if i > 100:
                 logger.warning(
                     "Lacework API returned maximum pages of container vuln results (100 pages). Processed dataset is likely incomplete.")
 
-        container_vulns = ContainerVulnerabilities(results)
         return container_vulns
 
+    @traced(name='lacework.get_compliance_reports', category='api')
     @cache_results
+    @checkpoint_results
     def get_compliance_reports(self, cloud_provider='AWS', report_type='CIS'):
         '''Retrieve all reports of specified type for specified cloud provider.
             Valid Cloud Providers are: AWS, GCP, AZURE
             Valid Report Types are: CIS, PCI
             '''
+        current_span().set(cloud_provider=cloud_provider, report_type=report_type)
         compliance_reports = []
         compliance_provider = self.compliance_provider_lookup[str(cloud_provider).upper()]
         compliance_accounts = self.get_cfg_account_ids()
@@ -228,12 +367,15 @@ class LaceworkInterface:
             if compliance_account['type'] == compliance_provider:
                 report_query_string = self.compliance_report_lookup[compliance_account['type']][report_type]
                 logger.debug(f"Getting {report_query_string} report for {compliance_account}")
+                report_request = {'primary_query_id': compliance_account['primary_query_id'],
+                                  'secondary_query_id': compliance_account['secondary_query_id'],
+                                  'format': "json",
+                                  'latest': True,
+                                  'report_type': report_query_string}
                 try:
-                    report = self.lacework.reports.get(primary_query_id=compliance_account['primary_query_id'],
-                                                       secondary_query_id=compliance_account['secondary_query_id'],
-                                                       format="json",
-                                                       latest=True,
-                                                       report_type=report_query_string)
+                    report = self.checkpointed(checkpoint_key('report', **report_request),
+                                               lambda: self.request_executor.call('reports', self.lacework.reports.get,
+                                                                                  **report_request))
                 except Exception as e:
                     logger.error(f"Failed to retrieve {report_type} report for {cloud_provider} from Lacework API:{str(e)}")
                     raise e
@@ -0,0 +1,176 @@
+import abc
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone, timedelta
+from logzero import logger
+from modules.instrumentation import span, current_span
+from modules.request_executor import is_retryable
+
+LACEWORK_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# The LQL execute API truncates result sets, a chunk returning this many rows is assumed to be incomplete
+LQL_MAX_RESULT_ROWS = 5000
+
+
+def parse_lacework_time(time_string: str) -> datetime:
+    return datetime.strptime(time_string, LACEWORK_TIME_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def format_lacework_time(time_value: datetime) -> str:
+    return time_value.astimezone(timezone.utc).strftime(LACEWORK_TIME_FORMAT)
+
+
+def is_splittable(exception: BaseException) -> bool:
+    '''A failure a shorter time window may avoid, a transient API error or a timeout. An invalid query or rejected
+    credentials (400, 401, 403) fail the same way for any window.'''
+    return is_retryable(exception) or isinstance(exception, TimeoutError)
+
+
+def split_time_range(start: datetime, end: datetime, chunk_size: timedelta) -> list:
+    '''Split start -> end into consecutive (start, end) windows no longer than chunk_size.'''
+    chunks = []
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + chunk_size, end)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return chunks
+
+
+def subtract_time_ranges(start: datetime, end: datetime, covered: list) -> list:
+    '''Return the (start, end) windows of start -> end not covered by any of the covered (start, end) windows.'''
+    remaining = []
+    cursor = start
+    for covered_start, covered_end in sorted(covered):
+        if covered_start > cursor:
+            remaining.append((cursor, min(covered_start, end)))
+        cursor = max(cursor, covered_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        remaining.append((cursor, end))
+    return [(window_start, window_end) for window_start, window_end in remaining if window_start < window_end]
+
+
+class LQLExecutor:
+    '''Execute an LQL query over a time window as concurrent, smaller time-sliced queries.
+
+    Each chunk is executed with the StartTimeRange/EndTimeRange arguments set to its own window. A chunk that
+    fails (e.g. times out) or hits the result size limit is split in half and re-queued until it is no longer
+    than min_chunk, at which point failures are raised and truncated results are kept with a warning.
+    '''
+
+    def __init__(self, lacework, max_workers: int = 4, chunk_size: timedelta = timedelta(days=1),
+                 min_chunk: timedelta = timedelta(minutes=15), max_rows: int = LQL_MAX_RESULT_ROWS,
+                 request_executor=None):
+        self.lacework = lacework
+        # transient failures are retried by the request executor before a chunk is split
+        self.request_executor = request_executor
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.min_chunk = min_chunk
+        self.max_rows = max_rows
+
+    def _execute_chunk(self, query_text: str, chunk_start: datetime, chunk_end: datetime, arguments: dict,
+                       parent_span=None) -> list:
+        lql_query_args = {**arguments,
+                          "StartTimeRange": format_lacework_time(chunk_start),
+                          "EndTimeRange": format_lacework_time(chunk_end)}
+        logger.debug(f'Executing LQL chunk {lql_query_args["StartTimeRange"]} -> {lql_query_args["EndTimeRange"]}')
+        with span('lql.chunk', category='api', parent=parent_span, start_time=lql_query_args["StartTimeRange"],
+                  end_time=lql_query_args["EndTimeRange"]) as chunk_span:
+            if self.request_executor:
+                result = self.request_executor.call('queries', self.lacework.queries.execute, query_text=query_text,
+                                                    arguments=lql_query_args)
+            else:
+                result = self.lacework.queries.execute(query_text=query_text, arguments=lql_query_args)
+            rows = result.get('data', []) if result else []
+            chunk_span.add('records', len(rows))
+        return rows
+
+    def _split(self, chunk_start: datetime, chunk_end: datetime) -> list:
+        if chunk_end - chunk_start <= self.min_chunk:
+            return []
+        midpoint = chunk_start + (chunk_end - chunk_start) / 2
+        return [(chunk_start, midpoint), (midpoint, chunk_end)]
+
+    def execute(self, query_text: str, start_time: str, end_time: str, arguments: dict = None, checkpoint=None):
+        '''Yield lists of result rows, one list per completed chunk, in completion order.
+
+        With a ChunkCheckpoint every completed chunk is saved, the chunks saved by an earlier run are yielded first
+        and only the rest of the time window is queried.
+        '''
+        arguments = arguments or {}
+        parent_span = current_span()
+        remaining = [(parse_lacework_time(start_time), parse_lacework_time(end_time))]
+        if checkpoint:
+            yield from checkpoint.rows()
+            completed = [(datetime.fromisoformat(chunk_start), datetime.fromisoformat(chunk_end))
+                         for chunk_start, chunk_end in checkpoint.completed_ranges()]
+            remaining = subtract_time_ranges(*remaining[0], completed)
+        pending_chunks = [chunk for window in remaining for chunk in split_time_range(*window, self.chunk_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            running = {}
+            while pending_chunks or running:
+                while pending_chunks:
+                    chunk = pending_chunks.pop(0)
+                    running[pool.submit(self._execute_chunk, query_text, chunk[0], chunk[1], arguments,
+                                        parent_span)] = chunk
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk_start, chunk_end = running.pop(future)
+                    try:
+                        rows = future.result()
+                    except Exception as e:
+                        sub_chunks = self._split(chunk_start, chunk_end) if is_splittable(e) else []
+                        if not sub_chunks:
+                            logger.error(f"LQL chunk {format_lacework_time(chunk_start)} -> "
+                                         f"{format_lacework_time(chunk_end)} failed: {str(e)}")
+                            for running_future in running:
+                                running_future.cancel()
+                            raise e
+                        logger.warning(f"LQL chunk {format_lacework_time(chunk_start)} -> "
+                                       f"{format_lacework_time(chunk_end)} failed, splitting and retrying: {str(e)}")
+                        pending_chunks.extend(sub_chunks)
+                        continue
+                    if len(rows) >= self.max_rows:
+                        sub_chunks = self._split(chunk_start, chunk_end)
+                        if sub_chunks:
+                            logger.info(f"LQL chunk {format_lacework_time(chunk_start)} -> "
+                                        f"{format_lacework_time(chunk_end)} hit the {self.max_rows} row limit, splitting.")
+                            pending_chunks.extend(sub_chunks)
+                            continue
+                        logger.warning(f"LQL chunk {format_lacework_time(chunk_start)} -> "
+                                       f"{format_lacework_time(chunk_end)} hit the {self.max_rows} row limit at minimum "
+                                       f"chunk size. Results are likely incomplete.")
+                    if checkpoint:
+                        checkpoint.add_chunk(chunk_start.isoformat(), chunk_end.isoformat(), rows)
+                    yield rows
+
+
+class LQLDataset(abc.ABC):
+    '''Base class for the LQL datasets declared in modules/datasets.
+
+    A dataset declares its LQL query, the columns it returns and the model class that receives the rows. Reports list
+    the dataset_name values they need in their "datasets" class attribute and the processed results are passed to the
+    template under template_variable.
+    '''
+
+    dataset_name = 'base'
+    template_variable = None
+    # which of the report's query windows ('alerts' or 'vulns') the dataset is queried over
+    time_window = 'alerts'
+    lql_query = None
+    columns = ()
+    # model class, constructed with {'data': []} and fed rows through add_rows()
+    model = None
+
+    def create_model(self):
+        return self.model({'data': []})
+
+    def project(self, rows: list) -> list:
+        if not self.columns:
+            return rows
+        return [{column: row.get(column) for column in self.columns} for row in rows]
+
+    @abc.abstractmethod
+    def process(self, model) -> dict:
+        '''The template data of the model once it received every row.'''
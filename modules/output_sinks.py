@@ -0,0 +1,138 @@
+import io
+from logzero import logger
+
+# S3 rejects multipart parts smaller than 5MB (except the last one)
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+S3_DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+
+class OutputSink(io.RawIOBase):
+    '''Write-only, file-like destination for a rendered report.
+
+    str writes are encoded as UTF-8 so the same sink can receive template output and PDF bytes. Closing the sink
+    finalizes the output, leaving a "with" block because of an exception calls abort() instead.
+    cancel() stops an output written in another thread, which aborts it at its next write or when leaving its "with"
+    block.
+    '''
+    cancelled = False
+
+    def writable(self):
+        return True
+
+    def cancel(self):
+        self.cancelled = True
+
+    def write(self, data):
+        if self.cancelled:
+            raise RuntimeError(f'Writing {self.location} was cancelled')
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._write_bytes(bytes(data))
+        return len(data)
+
+    def _write_bytes(self, data: bytes):
+        raise NotImplementedError
+
+    def abort(self):
+        super().close()
+
+    def __del__(self):
+        # never finalize a partially written output just because it was garbage collected
+        if not self.closed:
+            self.abort()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None or self.cancelled:
+            self.abort()
+        else:
+            self.close()
+        return False
+
+
+class FileSink(OutputSink):
+
+    def __init__(self, path):
+        super().__init__()
+        self.location = str(path)
+        self._file = open(path, 'wb')
+
+    def _write_bytes(self, data: bytes):
+        self._file.write(data)
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+    def abort(self):
+        self.close()
+
+
+class S3MultipartSink(OutputSink):
+    '''Stream an object to S3 in multipart upload parts, only one part is ever buffered in memory.
+
+    Objects smaller than a single part are sent with one put_object call instead.
+    '''
+
+    def __init__(self, s3_client, bucket, key, content_type=None, part_size=S3_DEFAULT_PART_SIZE):
+        super().__init__()
+        if part_size < S3_MIN_PART_SIZE:
+            raise ValueError(f'S3 multipart part size must be at least {S3_MIN_PART_SIZE} bytes')
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.location = f's3://{bucket}/{key}'
+        self.content_type = content_type
+        self.part_size = part_size
+        self.response = None
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+
+    def _extra_args(self) -> dict:
+        return {'ContentType': self.content_type} if self.content_type else {}
+
+    def _write_bytes(self, data: bytes):
+        self._buffer.extend(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+
+    def _upload_part(self, body: bytes):
+        if self._upload_id is None:
+            response = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self._extra_args())
+            self._upload_id = response['UploadId']
+        part_number = len(self._parts) + 1
+        response = self.s3_client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                              PartNumber=part_number, Body=body)
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        logger.debug(f'Uploaded part {part_number} ({len(body)} bytes) of {self.location}')
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                self.response = self.s3_client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer),
+                                                          **self._extra_args())
+            else:
+                if self._buffer:
+                    self._upload_part(bytes(self._buffer))
+                self.response = self.s3_client.complete_multipart_upload(Bucket=self.bucket, Key=self.key,
+                                                                         UploadId=self._upload_id,
+                                                                         MultipartUpload={'Parts': self._parts})
+        except Exception:
+            self.abort()
+            raise
+        self._buffer = bytearray()
+        super().close()
+
+    def abort(self):
+        if self._upload_id is not None:
+            try:
+                self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            except Exception as e:
+                logger.error(f'Failed to abort multipart upload of {self.location}: {str(e)}')
+            self._upload_id = None
+        self._buffer = bytearray()
+        super().close()
@@ -0,0 +1,133 @@
+'''
+Writing the output files of a report, several formats and page sizes from one gather.
+
+Each ReportOutput is a file to write: an HTML report, or a PDF at one page size. The data is gathered once. The
+charts are drawn once too, at the report's graph_scale, and every output shows them at its own size by scaling the
+SVGs (ReportAssets.chart_scale) rather than drawing them again.
+
+A single output is rendered in the calling process. With several, the gathered data is saved to a snapshot and each
+output is rendered from it by a worker process, so the HTML and every PDF are written at the same time.
+'''
+import importlib.util
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from logzero import logger
+
+from modules.instrumentation import span
+
+REPORT_FORMATS = ('HTML', 'PDF')
+# PDF pages are larger than a browser window, the charts of a PDF are shown at this scale
+PDF_GRAPH_SCALE = 1.4
+DEFAULT_PDF_PAGE_SIZE = 'a2'
+
+
+class ReportOutput:
+
+    def __init__(self, report_format: str, path: str, pagesize: str = None, asset_mode: str = 'embedded'):
+        self.report_format = report_format
+        self.path = path
+        self.pagesize = pagesize
+        self.asset_mode = asset_mode
+
+    def render_args(self, custom_logo=None) -> dict:
+        if self.report_format == 'PDF':
+            return {'custom_logo': custom_logo, 'pagesize': self.pagesize, 'pdf': True}
+        return {'custom_logo': custom_logo}
+
+    def chart_scale(self, graph_scale: float) -> float:
+        return (PDF_GRAPH_SCALE if self.report_format == 'PDF' else 1) / graph_scale
+
+
+def get_outputs(report_formats: list, file_name: str, page_sizes: list = None, asset_mode: str = 'embedded') -> list:
+    '''Return the ReportOutputs of a run, file_name is the path of the report without an extension.'''
+    outputs = []
+    if 'HTML' in report_formats:
+        html_file_name = file_name
+        if asset_mode == 'external':
+            # a report directory, holding the report and its images
+            os.makedirs(file_name, exist_ok=True)
+            html_file_name = os.path.join(file_name, os.path.basename(os.path.normpath(file_name)))
+        outputs.append(ReportOutput('HTML', html_file_name + '.html', asset_mode=asset_mode))
+    if 'PDF' in report_formats:
+        page_sizes = page_sizes or [DEFAULT_PDF_PAGE_SIZE]
+        for pagesize in page_sizes:
+            suffix = f'_{pagesize}' if len(page_sizes) > 1 else ''
+            outputs.append(ReportOutput('PDF', f'{file_name}{suffix}.pdf', pagesize=pagesize))
+    return outputs
+
+
+def get_graph_scale(report_formats: list) -> float:
+    # charts are drawn at the PDF scale when no HTML is written, so a PDF only run draws them as it always has
+    return PDF_GRAPH_SCALE if 'HTML' not in report_formats else 1
+
+
+def write_output(report, output: ReportOutput, customer: str, author: str, custom_logo=None):
+    report.assets.chart_scale = output.chart_scale(report.graph_scale)
+    if output.report_format == 'HTML':
+        report.assets.mode = output.asset_mode
+        with span('write_html', category='output', path=output.path):
+            report.render_to(output.path, customer, author, **output.render_args(custom_logo))
+        return
+    write_pdf(report, output.path, customer, author, **output.render_args(custom_logo))
+
+
+def write_pdf(report, target, customer: str, author: str, font_config=None, **render_args):
+    '''Write the PDF of a report to target, a path or a writable file-like object such as an OutputSink.'''
+    from weasyprint import HTML
+    from weasyprint.text.fonts import FontConfiguration
+    import logging as log
+    weasyprint_log = log.getLogger('weasyprint')
+    if not weasyprint_log.handlers:
+        weasyprint_log.addHandler(log.FileHandler('weasyprint.log'))
+    # weasyprint reads the html from a file rather than one string held in memory, and the images from files next
+    # to it rather than decoding data URIs
+    report.assets.mode = 'external'
+    with tempfile.TemporaryDirectory() as html_dir:
+        html_file_name = os.path.join(html_dir, 'report.html')
+        with span('write_html', category='output', path=html_file_name):
+            report.render_to(html_file_name, customer, author, **render_args)
+        with span('write_pdf', category='output', path=getattr(target, 'location', target)):
+            html = HTML(filename=html_file_name, encoding='utf-8')
+            html.write_pdf(target, font_config=font_config or FontConfiguration())
+
+
+def write_output_from_snapshot(report_class, basedir: str, snapshot_directory: str, recompress_png: bool,
+                               recommendations: str, output: ReportOutput, customer: str, author: str, custom_logo=None):
+    '''Worker process entry point, write output from the report data saved in a snapshot.'''
+    report = report_class(basedir)
+    report.assets.recompress_png = recompress_png
+    if recommendations is not None:
+        report.recommendations = recommendations
+    report.load_snapshot(snapshot_directory)
+    write_output(report, output, customer, author, custom_logo=custom_logo)
+    return output.path
+
+
+def write_outputs(report, outputs: list, customer: str, author: str, custom_logo=None):
+    '''Write every output of a gathered report, in worker processes when there are several.
+
+    The workers load a snapshot of the report as it is now, written to a temporary directory: data set after the report
+    was gathered or loaded (e.g. trends and deltas) is rendered by every worker.
+    '''
+    if len(outputs) == 1 or importlib.util.find_spec('pyarrow') is None:
+        # report snapshots are read and written with pyarrow
+        for output in outputs:
+            logger.info(f'Writing report to {output.path}')
+            write_output(report, output, customer, author, custom_logo=custom_logo)
+        return
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        report.save_snapshot(temporary_directory)
+        # spawned, the workers start from a clean interpreter (and work in frozen binaries)
+        with ProcessPoolExecutor(max_workers=min(len(outputs), os.cpu_count() or 1),
+                                 mp_context=get_context('spawn')) as pool:
+            futures = []
+            for output in outputs:
+                logger.info(f'Writing report to {output.path}')
+                futures.append(pool.submit(write_output_from_snapshot, type(report), report.basedir, temporary_directory,
+                                           report.assets.recompress_png, getattr(report, 'recommendations', None),
+                                           output, customer, author, custom_logo))
+            for future in futures:
+                future.result()
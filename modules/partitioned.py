@@ -0,0 +1,99 @@
+'''
+Partitioned, multi-process execution of the per-host and per-image vulnerability aggregations.
+
+The record columns a method needs are dictionary encoded (pd.factorize) into one int32 array placed in shared memory.
+Workers of a process pool attach to it and each rebuilds the DataFrame of one hash partition of the rows, partitioned
+on the column every group of the aggregation contains (a host or an image), so no group is split between workers.
+Rows keep their relative order within a partition, so each worker computes exactly what a single process computes
+for those groups. The partial results are concatenated and sorted by the aggregation's group keys, which is the
+order the single-process groupby produces, before the model finishes the (small) rest of the method.
+
+Datasets smaller than PARTITIONED_MIN_ROWS, or with LW_REPORT_WORKERS left at 1, run in the calling process.
+'''
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+import pandas as pd
+
+from modules.instrumentation import current_span
+from modules.records import RecordColumns
+
+DEFAULT_WORKERS = int(os.getenv('LW_REPORT_WORKERS', '1'))
+# below this many records the cost of starting workers and encoding the columns outweighs the gain
+PARTITIONED_MIN_ROWS = int(os.getenv('LW_REPORT_PARTITIONED_MIN_ROWS', '250000'))
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown()
+            # spawned workers are safe to start while other threads (API fetches) are running
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def decode_column(codes: np.ndarray, uniques):
+    values = pd.Series(uniques.take(codes))
+    missing = codes == -1
+    if missing.any():
+        values = values.where(~missing)
+    return values
+
+
+def run_partition(func, shm_name: str, shape: tuple, columns: list, uniques: list, key_index: int,
+                  partition: int, partitions: int, args: tuple):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        codes = np.ndarray(shape, dtype=np.int32, buffer=shm.buf)
+        rows = np.flatnonzero(codes[key_index] % partitions == partition)
+        df = pd.DataFrame({name: decode_column(codes[i][rows], uniques[i]) for i, name in enumerate(columns)})
+        del codes
+    finally:
+        shm.close()
+    return func(df, *args)
+
+
+def merge_partitions(results: list, sort_by: list) -> pd.DataFrame:
+    non_empty = [result for result in results if not result.empty]
+    if not non_empty:
+        return results[0]
+    return pd.concat(non_empty).sort_values(sort_by).reset_index(drop=True)
+
+
+def run_partitioned(func, records: RecordColumns, columns: list, key: str, sort_by: list, *args, workers: int = None):
+    '''Return func(DataFrame of columns, *args), computed over hash partitions of key when the dataset is large.
+
+    func must be a module level function whose result rows are unique on sort_by and only group rows sharing key.
+    '''
+    workers = workers or DEFAULT_WORKERS
+    if workers <= 1 or len(records) < PARTITIONED_MIN_ROWS:
+        return func(records.to_frame(columns), *args)
+    current_span().set(workers=workers)
+    # factorized as arrays, an Index of uniques would turn lists of tags (tuples) into a MultiIndex
+    encoded = [pd.factorize(pd.Series(records.columns[name]).to_numpy()) for name in columns]
+    shape = (len(columns), len(records))
+    shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 4))
+    try:
+        codes = np.ndarray(shape, dtype=np.int32, buffer=shm.buf)
+        for i, (column_codes, _) in enumerate(encoded):
+            codes[i] = column_codes
+        del codes
+        uniques = [column_uniques for _, column_uniques in encoded]
+        pool = get_pool(workers)
+        futures = [pool.submit(run_partition, func, shm.name, shape, columns, uniques, columns.index(key),
+                               partition, workers, args) for partition in range(workers)]
+        results = [future.result() for future in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+    return merge_partitions(results, sort_by)
@@ -5,7 +5,11 @@ import os
 import re
 import logzero
 from logzero import logger
-from modules.utils import LaceworkTime
+from modules.utils import LaceworkTime, load_report_class
+from modules.checkpoints import FileCheckpointStore
+from modules.snapshots import find_latest_snapshot, read_snapshot_metadata
+from modules.outputs import REPORT_FORMATS
+from modules.results_store import DEFAULT_RESULTS_STORE
 from pathlib import Path
 import json
 
@@ -72,10 +76,32 @@ def get_arguments():
     parser.add_argument("--v", help="Set Verbose Logging", action='store_true')
     parser.add_argument("--vv", help="Set Extremely Verbose Logging", action='store_true')
     parser.add_argument("--report", help="Choose which report to execute. Default is 'CSA_Detailed'", default="CSA_Detailed")
-    parser.add_argument("--report-format", help="Specify output format, HTML or PDF. Default is HTML", default="HTML")
+    parser.add_argument("--report-format", help="Specify output format, HTML or PDF, or several separated by commas (HTML,PDF). Default is HTML", default="HTML")
+    parser.add_argument("--page-size", help="Page size of PDF reports, or several separated by commas to write a PDF for each (a2,a3). Default is a2", default="a2")
+    parser.add_argument("--asset-mode", help="How images are included in HTML reports. 'embedded' writes one self-contained file, 'external' writes "
+                                             "a report directory holding the report and its images. Default is embedded",
+                        default="embedded", choices=["embedded", "external"])
+    parser.add_argument("--compress-images", help="Losslessly recompress the PNG images included in the report.", action='store_true')
     parser.add_argument("--gui", help="Run this tool in GUI mode, which provides additional customization options.", action='store_true')
     parser.add_argument("--logo", type=str, help="Specify a custom logo (PNG file) to add to the report.")
     parser.add_argument("--list-reports", help="List the available reports to generate. Default is 'CSA'", action='store_true')
+    parser.add_argument("--resume", type=str, metavar="RUN_ID",
+                        help="Resume a run that did not finish, reusing the data it had already downloaded.")
+    parser.add_argument("--checkpoint", help="Save downloaded data as it arrives, so a run that fails can be continued with --resume.", action='store_true')
+    parser.add_argument("--save-snapshot", type=str, metavar="DIRECTORY",
+                        help="Save the data gathered for the report to a snapshot directory, the report can be rendered again from it with --from-snapshot.")
+    parser.add_argument("--from-snapshot", type=str, metavar="DIRECTORY",
+                        help="Render the report from a snapshot saved with --save-snapshot instead of downloading data from Lacework.")
+    parser.add_argument("--baseline-snapshot", type=str, metavar="DIRECTORY",
+                        help="Delta report only: compare with this snapshot, or with the latest snapshot of the customer saved in this directory "
+                             "with --save-snapshot.")
+    parser.add_argument("--results-store", type=str, metavar="FILE", nargs="?", const=DEFAULT_RESULTS_STORE,
+                        help="Record the summary of this run in a local results store (SQLite) and chart the trends of the runs "
+                             f"recorded for the customer in the report. Default file is {DEFAULT_RESULTS_STORE}")
+    parser.add_argument("--trace-file", type=str,
+                        help="Record the time, CPU and memory used by each stage of report generation to this file.")
+    parser.add_argument("--trace-format", help="Format of the trace file, json or chrome (chrome://tracing / Perfetto). Default is json",
+                        default="json", choices=["json", "chrome"])
 
     return parser.parse_args()
 
@@ -119,9 +145,37 @@ def get_validated_arguments():
             logger.error(
                 "The API key file you specified either does not exist or is not readable. Please check the file and it's permissions.")
             sys.exit()
-    if args.report_format not in ["HTML", "PDF"]:
+    if args.from_snapshot:
+        if "~" in args.from_snapshot:
+            args.from_snapshot = args.from_snapshot.replace("~", os.path.expanduser("~"))
+        try:
+            # the snapshot decides which report is rendered
+            args.report = read_snapshot_metadata(args.from_snapshot)['report']
+        except ValueError as e:
+            logger.error(str(e))
+            sys.exit()
+    args.report_formats = [report_format.strip().upper() for report_format in args.report_format.split(',')]
+    if not set(args.report_formats) <= set(REPORT_FORMATS):
         logger.error("Please specify a valid report format of either HTML or PDF.")
         sys.exit()
+    if args.baseline_snapshot:
+        if "~" in args.baseline_snapshot:
+            args.baseline_snapshot = args.baseline_snapshot.replace("~", os.path.expanduser("~"))
+        if args.report != 'Delta':
+            logger.error("--baseline-snapshot only applies to the Delta report.")
+            sys.exit()
+        if not os.path.isdir(args.baseline_snapshot):
+            logger.error(f"The baseline snapshot directory {args.baseline_snapshot} does not exist.")
+            sys.exit()
+        # looked up before this run saves its own snapshot
+        baseline_snapshot = find_latest_snapshot(args.baseline_snapshot, report=args.report, customer=args.customer)
+        if baseline_snapshot is None:
+            logger.warning(f"No snapshot of report {args.report} for {args.customer} was found in {args.baseline_snapshot}, "
+                           f"this run is the baseline of the next one.")
+        args.baseline_snapshot = baseline_snapshot
+    if args.results_store and "~" in args.results_store:
+        args.results_store = args.results_store.replace("~", os.path.expanduser("~"))
+    args.page_sizes = [page_size.strip() for page_size in args.page_size.split(',') if page_size.strip()]
         
     return args
 
@@ -145,12 +199,6 @@ def pre_process_args(args, available_reports):
     elif args.vv:
         logzero.loglevel(logzero.DEBUG)
 
-    # Convert query time args to a date format the Lacework API understands
-    vulns_start_time = LaceworkTime(args.vulns_start_time)
-    vulns_end_time = LaceworkTime(args.vulns_end_time)
-    alerts_start_time = LaceworkTime(args.alerts_start_time)
-    alerts_end_time = LaceworkTime(args.alerts_end_time)
-
     # Check to see if creds were provided
     api_key_file = None
     lacework_toml_exists = Path(str(Path.home()) + '/.lacework.toml').exists()
@@ -166,6 +214,9 @@ def pre_process_args(args, available_reports):
         except Exception as e:
             logger.error(f"Failed to read keyfile: {str(e)}")
             sys.exit()
+    elif args.from_snapshot:
+        # rendering from a snapshot does not use the Lacework API
+        pass
     elif not lacework_toml_exists and not env_var_creds_exist:
         logger.error("You have failed to provide Lacework API credentials")
         logger.error("Please read the github page for instructions.")
@@ -176,12 +227,38 @@ def pre_process_args(args, available_reports):
     elif lacework_toml_exists:
         logger.warning("Using default credentials from .lacework.toml file")
     # search the list of available reports for the one specified on the command line. CSA is the default arg
-    report_to_run = [report['report_class'] for report in available_reports if report['report_short_name'] == args.report][0]
+    report_to_run = load_report_class([report for report in available_reports if report['report_short_name'] == args.report][0])
+
+    # With --checkpoint, save everything downloaded under a run ID so a failed run can be resumed, or pick up a run that failed
+    checkpoints = None
+    time_args = {'vulns_start_time': args.vulns_start_time,
+                 'vulns_end_time': args.vulns_end_time,
+                 'alerts_start_time': args.alerts_start_time,
+                 'alerts_end_time': args.alerts_end_time}
+    if args.resume:
+        checkpoints = FileCheckpointStore(args.resume)
+        if not checkpoints.exists():
+            logger.error(f"No saved data was found for run ID {args.resume}, it cannot be resumed.")
+            sys.exit()
+        # the resumed run covers the same time windows as the original one
+        time_args = checkpoints.metadata['time_args']
+        logger.warning(f"Resuming run {args.resume} started at {checkpoints.metadata['reference_time']}")
+    elif args.checkpoint and not args.from_snapshot:
+        checkpoints = FileCheckpointStore().start(report=args.report, time_args=time_args)
+        logger.warning(f"Run ID: {checkpoints.run_id} (if this run fails, continue it with --resume {checkpoints.run_id})")
+
+    # Convert query time args to a date format the Lacework API understands
+    reference_time = checkpoints.reference_time if checkpoints else None
+    vulns_start_time = LaceworkTime(time_args['vulns_start_time'], reference_time=reference_time)
+    vulns_end_time = LaceworkTime(time_args['vulns_end_time'], reference_time=reference_time)
+    alerts_start_time = LaceworkTime(time_args['alerts_start_time'], reference_time=reference_time)
+    alerts_end_time = LaceworkTime(time_args['alerts_end_time'], reference_time=reference_time)
     processed_args = {'vulns_start_time': vulns_start_time,
                       'vulns_end_time': vulns_end_time,
                       'alerts_start_time': alerts_start_time,
                       'alerts_end_time': alerts_end_time,
                       'api_key_file': api_key_file,
-                      'report_to_run': report_to_run}
+                      'report_to_run': report_to_run,
+                      'checkpoints': checkpoints}
     return processed_args
 
@@ -0,0 +1,72 @@
+'''
+Compact storage of the records returned by the Lacework API.
+
+Vulnerability searches return millions of deeply nested records of which the models only read a handful of fields.
+RecordColumns keeps just those fields, one list per field (struct of arrays), with every string interned so the
+hostnames, packages, severities, versions, repositories and tags repeated across records are stored once. The
+models build their DataFrames straight from the columns, using the same dotted column names pd.json_normalize
+would have produced. The same fields, reduced to their top level keys by search_returns(), are requested as the
+'returns' of the searches, so the API does not send the rest of each record in the first place.
+'''
+import sys
+
+import pandas as pd
+
+
+def get_path(record: dict, path: tuple):
+    for key in path:
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return record
+
+
+def search_returns(fields: dict) -> list:
+    '''The top level fields of the API records holding fields (RecordColumns fields), in order.'''
+    return list(dict.fromkeys(path[0] for path in fields.values()))
+
+
+class RecordColumns:
+
+    def __init__(self, fields: dict, records: list = None):
+        # column name -> keys leading to the field in an API record, e.g. 'evalCtx.hostname': ('evalCtx', 'hostname')
+        self.fields = fields
+        self.columns = {name: [] for name in fields}
+        self._tuples = {}
+        if records:
+            self.add(records)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), []))
+
+    def _intern(self, value):
+        if isinstance(value, str):
+            return sys.intern(value)
+        if isinstance(value, list):
+            # lists (e.g. image tags) are stored as shared tuples
+            value = tuple(self._intern(item) for item in value)
+            return self._tuples.setdefault(value, value)
+        return value
+
+    def add(self, records: list):
+        for name, path in self.fields.items():
+            self.columns[name].extend(self._intern(get_path(record, path)) for record in records)
+
+    def to_frame(self, columns: list = None) -> pd.DataFrame:
+        return pd.DataFrame({name: self.columns[name] for name in columns or self.fields})
+
+    def to_records(self):
+        '''Yield the records as nested dicts holding the stored fields, missing fields are left out.'''
+        names = list(self.fields)
+        for values in zip(*(self.columns[name] for name in names)):
+            record = {}
+            for name, value in zip(names, values):
+                if value is None:
+                    continue
+                *parents, key = self.fields[name]
+                target = record
+                for parent in parents:
+                    target = target.setdefault(parent, {})
+                target[key] = list(value) if isinstance(value, tuple) else value
+            yield record
+
@@ -3,15 +3,45 @@ import sys
 import traceback
 import jinja2
 import base64
-from datetime import datetime
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from logzero import logger
 from modules.lacework_interface import LaceworkInterface
 from modules.compliance import Compliance
 from modules.alerts import Alerts
 from modules.host_vulnerabilities import HostVulnerabilities
 from modules.container_vulnerabilities import ContainerVulnerabilities
-from modules.secrets import Secrets
-from modules.utils import LaceworkTime
+from modules.fetch_plan import FetchPlan
+from modules.utils import LaceworkTime, get_available_datasets
+from modules.instrumentation import traced
+from modules.html_tables import html_table
+from modules.assets import AssetImage, ReportAssets
+from modules.snapshots import read_snapshot, write_snapshot
+from modules.results_store import ResultsStore, trend_line_graph
+
+# jinja2 environments by template directory, shared by every report instance so compiled templates are reused
+_template_environments = {}
+# template output events collected before each write when a report is streamed with render_to
+RENDER_BUFFER_SIZE = 100
+# the severities read by the sections of the gather methods below, reports plan them in fetch_needs
+VULNERABILITY_SUMMARY_SEVERITIES = ("Critical", "High", "Medium", "Low")
+FIXABLE_VULNERABILITY_SEVERITIES = ("Critical",)
+ALERT_SEVERITIES = ("Critical", "High")
+# the fetch_needs of the host, container and alert sections of gather_host_vulnerability_data,
+# gather_container_vulnerability_data and gather_alert_data
+SECTION_FETCH_NEEDS = (('host_vulns', 'vulns', VULNERABILITY_SUMMARY_SEVERITIES),
+                       ('host_vulns', 'vulns', FIXABLE_VULNERABILITY_SEVERITIES),
+                       ('container_vulns', 'vulns', VULNERABILITY_SUMMARY_SEVERITIES),
+                       ('container_vulns', 'vulns', FIXABLE_VULNERABILITY_SEVERITIES),
+                       ('alerts', 'alerts', ALERT_SEVERITIES))
+
+
+def time_windows(vulns_start_time: LaceworkTime, vulns_end_time: LaceworkTime, alerts_start_time: LaceworkTime,
+                 alerts_end_time: LaceworkTime) -> dict:
+    '''(start, end) time strings by the time window names of datasets and fetch needs.'''
+    return {'alerts': (alerts_start_time.generate_time_string(), alerts_end_time.generate_time_string()),
+            'vulns': (vulns_start_time.generate_time_string(), vulns_end_time.generate_time_string())}
 
 
 class ReportGen:
@@ -19,20 +49,57 @@ class ReportGen:
     report_short_name = 'Base'
     report_name = "Base Report Class"
     report_description = "This is the base report class, it should be inherited from, not imported directly."
+    # dataset_name values of the LQL datasets (modules/datasets) this report needs, fetched alongside gather_data
+    datasets = ()
+    # row limits of the tables rendered by the html_table filter, by section, e.g. {'alerts': {'max_rows': 1000}}
+    table_options = {}
+    # attributes gather_data sets, saved to and loaded from report snapshots along with the datasets
+    sections = ()
+    # (source, time window, severities) read by the sections, each source is searched once for all of them, see
+    # FetchPlan
+    fetch_needs = ()
 
     def __init__(self, basedir, use_cache=False, api_key_file=None, graph_scale=1):
         self.basedir = basedir
         self.use_cache = use_cache
         self.graph_scale = graph_scale
-        self.lacework_interface = LaceworkInterface(use_cache=use_cache, api_key_file=api_key_file)
+        self.api_key_file = api_key_file
+        self.datasets_data = {}
+        # critical findings of the earlier runs recorded in a results store, see gather_trend_data()
+        self.trend_data = False
+        # every image of the report, how they are written out is chosen with assets.mode before rendering
+        self.assets = ReportAssets()
+        self._lacework_interface = None
+        # the searches of the current gather(), see fetch()
+        self.fetch_plan = None
+
+    @property
+    def lacework_interface(self) -> LaceworkInterface:
+        # connected on first use, a report rendered from a snapshot never needs the Lacework API
+        if self._lacework_interface is None:
+            self.connect(api_key_file=self.api_key_file)
+        return self._lacework_interface
 
-    def file_to_image_tag(self, img_file: str, file_format: str, align="left") -> str:
+    @lacework_interface.setter
+    def lacework_interface(self, lacework_interface: LaceworkInterface):
+        self._lacework_interface = lacework_interface
+
+    def connect(self, api_key_file=None):
+        # (re)create the Lacework connection, everything else loaded by the report is kept
+        self.lacework_interface = LaceworkInterface(use_cache=self.use_cache, api_key_file=api_key_file)
+
+    def fetch(self, source: str, begin_time: str, end_time: str, severities):
+        '''The model of a source (host_vulns, container_vulns or alerts) holding severities.'''
+        if self.fetch_plan is None:
+            self.fetch_plan = FetchPlan(self.lacework_interface)
+        return self.fetch_plan.get(source, begin_time, end_time, severities)
+
+    def file_to_image_tag(self, img_file: str, file_format: str, align="left") -> AssetImage:
         img_bytes = self.load_binary_file(img_file)
         return self.bytes_to_image_tag(img_bytes,file_format, align=align)
 
-    def bytes_to_image_tag(self, img_bytes: bytes, file_format: str, align="left") -> str:
-        b64content = base64.b64encode(img_bytes).decode('utf-8')
-        return f"<img src='data:image/{file_format};charset=utf-8;base64,{b64content}' align='{align}'/>"
+    def bytes_to_image_tag(self, img_bytes: bytes, file_format: str, align="left") -> AssetImage:
+        return self.assets.image_tag(img_bytes, file_format, align=align)
 
     def file_to_css_background(self, img_file: str, file_format: str) -> str:
         img_bytes = self.load_binary_file(img_file)
@@ -51,8 +118,13 @@ class ReportGen:
         return file_bytes
 
     def get_jinja2_template(self, file_name: str) -> jinja2.Template:
-        template_loader = jinja2.FileSystemLoader(searchpath=os.path.join(self.basedir, "templates/"))
-        template_env = jinja2.Environment(loader=template_loader, autoescape=True, trim_blocks=True, lstrip_blocks=True)
+        template_dir = os.path.join(self.basedir, "templates/")
+        template_env = _template_environments.get(template_dir)
+        if template_env is None:
+            template_loader = jinja2.FileSystemLoader(searchpath=template_dir)
+            template_env = jinja2.Environment(loader=template_loader, autoescape=True, trim_blocks=True, lstrip_blocks=True)
+            template_env.filters['html_table'] = html_table
+            _template_environments[template_dir] = template_env
         template_file = file_name
         try:
             return template_env.get_template(template_file)
@@ -63,18 +135,20 @@ class ReportGen:
     def get_current_date(self) -> str:
         return datetime.now().strftime("%A %B %d, %Y")
 
+    @traced(category='gather')
     def gather_host_vulnerability_data(self, begin_time: str, end_time: str, host_limit: int = 25):
         print('Gathering vulnerability data for hosts.')
         try:
             self.lacework_interface.use_cache = self.use_cache
-            host_vulnerabilities: HostVulnerabilities = self.lacework_interface.get_host_vulns(begin_time, end_time)
+            host_vulnerabilities: HostVulnerabilities = self.fetch('host_vulns', begin_time, end_time,
+                                                                   VULNERABILITY_SUMMARY_SEVERITIES)
         except Exception as e:
             logger.error(
                 f'Failed to retrieve host vulnerability data from Lacework, omitting it from the report.')
             logger.error(f"Exception: {str(e)}")
             logger.error(traceback.format_exc())
             return False
-        if not host_vulnerabilities.data:
+        if not host_vulnerabilities.records:
             logger.error("No host vulnerability data was returned by Lacework, omitting it from the report.")
             return False
         total_evaluated = host_vulnerabilities.total_evaluated()
@@ -85,7 +159,7 @@ class ReportGen:
         critical_vulnerability_count = summary.loc[summary['Severity'] == 'Critical', 'Hosts Affected'].values[0]
         summary_bar_graphic = host_vulnerabilities.host_vulns_by_severity_bar(width=1200 * self.graph_scale, height=350 * self.graph_scale)
         summary_bar_graphic_encoded = self.bytes_to_image_tag(summary_bar_graphic, "svg+xml", align='middle')
-        fixable_vulns = host_vulnerabilities.fixable_vulns(severities=["Critical"])
+        fixable_vulns = host_vulnerabilities.fixable_vulns(severities=FIXABLE_VULNERABILITY_SEVERITIES)
         return {
             'hosts_scanned_count': total_evaluated,
             'host_vulns_summary': summary,
@@ -96,11 +170,13 @@ class ReportGen:
             'fixable_vulns': fixable_vulns
         }
 
+    @traced(category='gather')
     def gather_container_vulnerability_data(self, begin_time: str, end_time: str, container_limit: int = 25):
         print('Gathering vulnerability data for containers.')
         try:
             self.lacework_interface.use_cache = self.use_cache
-            container_vulnerabilities: ContainerVulnerabilities = self.lacework_interface.get_container_vulns(begin_time, end_time)
+            container_vulnerabilities: ContainerVulnerabilities = self.fetch('container_vulns', begin_time, end_time,
+                                                                             VULNERABILITY_SUMMARY_SEVERITIES)
         except Exception as e:
             logger.error(
                 f'Failed to retrieve container vulnerability data from Lacework, omitting it from the report.')
@@ -108,7 +184,7 @@ class ReportGen:
             logger.error(traceback.format_exc())
             return False
 
-        if not container_vulnerabilities.data:
+        if not container_vulnerabilities.records:
             logger.error("No container vulnerability data was returned by Lacework, omitting it from the report.")
             return False
         total_evaluated = container_vulnerabilities.total_evaluated()
@@ -119,7 +195,7 @@ class ReportGen:
         critical_vulnerability_count = summary.loc[summary['Severity'] == 'Critical', 'Images Affected'].values[0]
         summary_by_package_bar = container_vulnerabilities.top_packages_bar(width=1200 * self.graph_scale, height=350 * self.graph_scale)
         summary_by_package_bar_encoded = self.bytes_to_image_tag(summary_by_package_bar, 'svg+xml', align='middle')
-        fixable_vulns = container_vulnerabilities.fixable_vulns(severities=['Critical'])
+        fixable_vulns = container_vulnerabilities.fixable_vulns(severities=FIXABLE_VULNERABILITY_SEVERITIES)
         return {
             'containers_scanned_count': total_evaluated,
             'container_vulns_summary': summary,
@@ -130,6 +206,7 @@ class ReportGen:
             'fixable_vulns': fixable_vulns
         }
 
+    @traced(category='gather')
     def gather_compliance_data(self, cloud_provider='AWS', report_type='CIS'):
         print(f'Getting {report_type} compliance reports for {cloud_provider}')
         try:
@@ -173,32 +250,16 @@ class ReportGen:
             'compliance_detail': details,
             'summary_count': summary_count,
             'critical_finding_count': critical_finding_count,
-            'critical_details': critical_details
-        }
-
-    def gather_secrets(self, begin_time: str, end_time: str):
-        print('Getting secrets...')
-        try:
-            self.lacework_interface.use_cache = self.use_cache
-            secrets: Secrets = self.lacework_interface.get_secrets(begin_time, end_time)
-        except Exception as e:
-            logger.error(
-                f'Failed to retrieve secrets data from Lacework, omitting it from the report.')
-            logger.error(f"Exception: {str(e)}")
-            logger.error(traceback.format_exc())
-            return False
-        print(f'Found {secrets.count_secrets()} total secrets')
-        processed_secrets = secrets.processed_secrets()
-        return {
-            "secrets_raw": processed_secrets,
-            "secrets_count": secrets.count_secrets()
+            'critical_details': critical_details,
+            'summary_by_account': summary_by_account
         }
 
+    @traced(category='gather')
     def gather_alert_data(self, begin_time: str, end_time: str):
         print('Getting alert data...')
         try:
             self.lacework_interface.use_cache = self.use_cache
-            alerts: Alerts = self.lacework_interface.get_alerts(begin_time, end_time)
+            alerts: Alerts = self.fetch('alerts', begin_time, end_time, ALERT_SEVERITIES)
         except Exception as e:
             logger.error(
                 f'Failed to retrieve alert data from Lacework, omitting it from the report.')
@@ -212,11 +273,68 @@ class ReportGen:
             print(f'Found {high_critical_finding_count} high and critical alerts.')
             return {
                 'alerts_raw': processed_alerts,
-                'high_critical_finding_count': high_critical_finding_count
+                'high_critical_finding_count': high_critical_finding_count,
+                'alerts_count': alerts.count_alerts(),
+                'alerts_by_severity': alerts.count_alerts_by_severity()
             }
         else:
             return None
 
+    @traced(category='gather')
+    def gather_dataset_data(self,
+                            vulns_start_time: LaceworkTime,
+                            vulns_end_time: LaceworkTime,
+                            alerts_start_time: LaceworkTime,
+                            alerts_end_time: LaceworkTime) -> dict:
+        if not self.datasets:
+            return {}
+        print(f'Getting datasets: {", ".join(self.datasets)}')
+        available_datasets = get_available_datasets(self.basedir)
+        windows = time_windows(vulns_start_time, vulns_end_time, alerts_start_time, alerts_end_time)
+        datasets_by_window = {}
+        for dataset_name in self.datasets:
+            dataset_class = available_datasets[dataset_name]
+            datasets_by_window.setdefault(dataset_class.time_window, []).append(dataset_class)
+        datasets_data = {}
+        self.lacework_interface.use_cache = self.use_cache
+        for window, dataset_classes in datasets_by_window.items():
+            results = self.lacework_interface.get_datasets(dataset_classes, *windows[window])
+            for dataset_class in dataset_classes:
+                result = results[dataset_class.dataset_name]
+                if isinstance(result, Exception):
+                    logger.error(f'Failed to retrieve dataset {dataset_class.dataset_name} from Lacework, omitting it from the report.')
+                    logger.error(f"Exception: {str(result)}")
+                    datasets_data[dataset_class.template_variable] = False
+                    continue
+                datasets_data[dataset_class.template_variable] = dataset_class().process(result)
+        return datasets_data
+
+    @traced(category='gather')
+    def gather(self,
+               vulns_start_time: LaceworkTime,
+               vulns_end_time: LaceworkTime,
+               alerts_start_time: LaceworkTime,
+               alerts_end_time: LaceworkTime):
+        # one reference time for every section, so they search (and show) the same time windows
+        reference_time = datetime.now(timezone.utc)
+        vulns_start_time, vulns_end_time, alerts_start_time, alerts_end_time = (
+            time.pinned(reference_time) for time in (vulns_start_time, vulns_end_time, alerts_start_time, alerts_end_time))
+        # the searches of every section are planned before the first one is made
+        self.fetch_plan = FetchPlan(self.lacework_interface, self.fetch_needs,
+                                    time_windows(vulns_start_time, vulns_end_time, alerts_start_time, alerts_end_time))
+        # the declared datasets are fetched in the background while gather_data runs its own sections
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            datasets_future = pool.submit(self.gather_dataset_data,
+                                          vulns_start_time,
+                                          vulns_end_time,
+                                          alerts_start_time,
+                                          alerts_end_time)
+            self.gather_data(vulns_start_time,
+                             vulns_end_time,
+                             alerts_start_time,
+                             alerts_end_time)
+            self.datasets_data = datasets_future.result()
+
     def gather_data(self,
                  vulns_start_time: LaceworkTime,
                  vulns_end_time: LaceworkTime,
@@ -224,9 +342,87 @@ class ReportGen:
                  alerts_end_time: LaceworkTime):
         pass
 
-    def render(self, customer, author, custom_logo=None, pagesize="a3", pdf=False):
+    def record_results(self, store: ResultsStore, tenant: str, run_time: datetime = None, **time_ranges) -> int:
+        '''Record the summary metrics of the gathered sections in store, returns the run id.'''
+        sections = {name: getattr(self, name) for name in self.sections}
+        return store.record_run(tenant, self.report_short_name, sections, run_time=run_time, **time_ranges)
+
+    @traced(category='gather')
+    def gather_trend_data(self, store: ResultsStore, tenant: str, days: int = 365):
+        print('Gathering trend data from the results store.')
+        compliance_sections = ('aws_compliance_data', 'azure_compliance_data', 'gcp_compliance_data')
+        trends = {
+            'Critical host vulnerabilities': store.trends(
+                tenant, 'cves', sections=('host_vulns_data',), severities=('Critical',), days=days),
+            'Critical container vulnerabilities': store.trends(
+                tenant, 'cves', sections=('container_vulns_data',), severities=('Critical',), days=days),
+            'Critical non-compliant resources': store.trends(
+                tenant, 'non_compliant_resources', sections=compliance_sections, severities=('Critical',), days=days),
+            'Critical and high alerts': store.trends(
+                tenant, 'alerts', sections=('alerts_data',), severities=('Critical', 'High'), days=days)
+        }
+        trends = {name: df.sum(axis=1) for name, df in trends.items() if not df.empty}
+        trend_summary = pd.DataFrame(trends).fillna(0).astype(int).sort_index()
+        if len(trend_summary) < 2:
+            logger.info('Fewer than two runs were recorded in the results store, omitting trends from the report.')
+            return False
+        first_run = trend_summary.index[0]
+        trend_summary.index = trend_summary.index.strftime('%Y-%m-%d %H:%M')
+        trend_summary = trend_summary.rename_axis('Assessment (UTC)').reset_index()
+        trend_graphic = trend_line_graph(trends, 'Critical Findings by Assessment',
+                                         width=1200 * self.graph_scale, height=350 * self.graph_scale)
+        return {
+            'run_count': len(trend_summary),
+            'first_run_date': first_run.strftime('%B %d, %Y'),
+            'trend_summary': trend_summary,
+            'trend_graphic': self.bytes_to_image_tag(trend_graphic, "svg+xml", align='middle')
+        }
+
+    @traced(category='output')
+    def save_snapshot(self, directory: str, **metadata):
+        '''Save the gathered data to a snapshot directory, load_snapshot() restores it without the Lacework API.'''
+        sections = {name: getattr(self, name) for name in self.sections}
+        sections['datasets_data'] = self.datasets_data
+        write_snapshot(directory, sections, report=self.report_short_name, graph_scale=self.graph_scale, **metadata)
+
+    @traced(category='gather')
+    def load_snapshot(self, directory: str) -> dict:
+        '''Load the data of a snapshot saved by save_snapshot() in place of gather(), returns its metadata.'''
+        sections, metadata = read_snapshot(directory, self.assets)
+        if metadata['report'] != self.report_short_name:
+            raise ValueError(f"The snapshot in {directory} holds the data of report {metadata['report']}, "
+                             f"not {self.report_short_name}")
+        for name, value in sections.items():
+            setattr(self, name, value)
+        # the scale the charts of the snapshot were drawn at
+        self.graph_scale = metadata['graph_scale']
+        return metadata
+
+    def template_context(self, customer, author, custom_logo=None, pagesize="a3", pdf=False) -> dict:
         pass
 
+    @traced(category='render')
+    def render(self, *args, **kwargs) -> str:
+        return self.template.render(**self.template_context(*args, **kwargs))
+
+    @traced(category='render')
+    def render_to(self, sink, *args, **kwargs):
+        '''Write the report to sink, a file path or writable file-like object, as the template produces it.
+
+        Unlike render() the report is never held in memory as one string. Paths are written UTF-8 encoded, file-like
+        objects receive str chunks.
+        '''
+        stream = self.template.stream(**self.template_context(*args, **kwargs))
+        stream.enable_buffering(RENDER_BUFFER_SIZE)
+        if isinstance(sink, os.PathLike):
+            sink = os.fspath(sink)
+        stream.dump(sink, encoding='utf-8' if isinstance(sink, str) else None)
+        if self.assets.mode == 'external':
+            if isinstance(sink, str):
+                self.assets.write(os.path.dirname(os.path.abspath(sink)))
+            else:
+                logger.warning('The report was rendered with external assets, write them with assets.write()')
+
     def generate(self,
                  customer: str,
                  author: str,
@@ -234,10 +430,10 @@ class ReportGen:
                  vulns_end_time: LaceworkTime,
                  alerts_start_time: LaceworkTime,
                  alerts_end_time: LaceworkTime):
-        self.gather_data(vulns_start_time,
-                         vulns_end_time,
-                         alerts_start_time,
-                         alerts_end_time)
+        self.gather(vulns_start_time,
+                    vulns_end_time,
+                    alerts_start_time,
+                    alerts_end_time)
         return self.render(customer, author, custom_logo=None, pdf=False)
 
 
@@ -1,4 +1,4 @@
-from modules.reportgen import ReportGen
+from modules.reportgen import ReportGen, SECTION_FETCH_NEEDS
 from modules.utils import LaceworkTime
 import os
 
@@ -7,6 +7,9 @@ class ReportGenCSA(ReportGen):
     report_short_name = 'CSA'
     report_name = 'Cloud Security Assessment (CIS)'
     report_description = "This is the FortiCNAPP provided Cloud Security Assessment with CIS compliance reporting."
+    sections = ('aws_compliance_data', 'azure_compliance_data', 'gcp_compliance_data',
+                'host_vulns_data', 'container_vulns_data', 'alerts_data')
+    fetch_needs = SECTION_FETCH_NEEDS
     default_recommendations = """<h3>Recommendations</h3>
             <p>
               Based on the findings of this assessment, Fortinet recommends the following action plan and next steps:
@@ -36,12 +39,12 @@ class ReportGenCSA(ReportGen):
         self.container_vulns_data=self.gather_container_vulnerability_data(vulns_start_time.generate_time_string(), vulns_end_time.generate_time_string())
         self.alerts_data=self.gather_alert_data(alerts_start_time.generate_time_string(), alerts_end_time.generate_time_string())
 
-    def render(self, customer, author, custom_logo=None, pagesize="a3"):
+    def template_context(self, customer, author, custom_logo=None, pagesize="a3", pdf=False):
         if custom_logo and os.path.isfile(custom_logo):
             self.custom_logo_html = self.file_to_image_tag(custom_logo, 'png', align='right')
         else:
             self.custom_logo_html = None
-        return self.template.render(
+        return dict(
             customer=str(customer),
             date=self.get_current_date(),
             author=str(author),
@@ -53,7 +56,9 @@ class ReportGenCSA(ReportGen):
             host_vulns_data=self.host_vulns_data,
             container_vulns_data=self.container_vulns_data,
             alerts_data=self.alerts_data,
-            recommendations=self.recommendations
+            recommendations=self.recommendations,
+            table_options=self.table_options,
+            **self.datasets_data
         )
 
     def generate(self,
@@ -65,10 +70,10 @@ class ReportGenCSA(ReportGen):
                  alerts_end_time: LaceworkTime = LaceworkTime('0:0'),
                  custom_logo=None,
                  pagesize="a3"):
-        self.gather_data(vulns_start_time,
-                         vulns_end_time,
-                         alerts_start_time,
-                         alerts_end_time)
+        self.gather(vulns_start_time,
+                    vulns_end_time,
+                    alerts_start_time,
+                    alerts_end_time)
         return self.render(customer, author, custom_logo=custom_logo, pagesize=pagesize)
 
 
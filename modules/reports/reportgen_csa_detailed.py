@@ -1,4 +1,4 @@
-from modules.reportgen import ReportGen
+from modules.reportgen import ReportGen, SECTION_FETCH_NEEDS
 from modules.utils import LaceworkTime
 import os
 
@@ -7,6 +7,10 @@ class ReportGenCSADetailed(ReportGen):
     report_short_name = 'CSA_Detailed'
     report_name = 'Detailed Cloud Security Assessment (CIS)'
     report_description = "This is the detailed version of the FortiCNAPP Cloud Security Assessment with CIS compliance reporting."
+    datasets = ('ssh_private_keys',)
+    sections = ('aws_compliance_data', 'azure_compliance_data', 'gcp_compliance_data',
+                'host_vulns_data', 'container_vulns_data', 'alerts_data', 'trend_data')
+    fetch_needs = SECTION_FETCH_NEEDS
     default_recommendations = """<h2>Recommendations</h2>
             <p>
               Based on the findings of this assessment, Fortinet recommends the following action plan and next steps:
@@ -35,15 +39,14 @@ class ReportGenCSADetailed(ReportGen):
         self.host_vulns_data=self.gather_host_vulnerability_data(vulns_start_time.generate_time_string(), vulns_end_time.generate_time_string())
         self.container_vulns_data=self.gather_container_vulnerability_data(vulns_start_time.generate_time_string(), vulns_end_time.generate_time_string())
         self.alerts_data=self.gather_alert_data(alerts_start_time.generate_time_string(), alerts_end_time.generate_time_string())
-        self.secrets_data=self.gather_secrets(alerts_start_time.generate_time_string(), alerts_end_time.generate_time_string())
 
-    def render(self, customer, author, pagesize="a3", custom_logo=None, pdf=False):
+    def template_context(self, customer, author, pagesize="a3", custom_logo=None, pdf=False):
         if custom_logo and os.path.isfile(custom_logo):
             self.custom_logo_html = self.file_to_image_tag(custom_logo, 'png', align='right')
         else:
             self.custom_logo_html = None
         self.template = self.get_jinja2_template('csa_detailed_report.jinja2')
-        return self.template.render(
+        return dict(
             customer=str(customer),
             date=self.get_current_date(),
             author=str(author),
@@ -56,10 +59,12 @@ class ReportGenCSADetailed(ReportGen):
             host_vulns_data=self.host_vulns_data,
             container_vulns_data=self.container_vulns_data,
             alerts_data=self.alerts_data,
-            secrets_data=self.secrets_data,
+            trend_data=self.trend_data,
             recommendations=self.recommendations,
+            table_options=self.table_options,
             pagesize=pagesize,
-            pdf=pdf
+            pdf=pdf,
+            **self.datasets_data
         )
 
     def generate(self,
@@ -72,10 +77,10 @@ class ReportGenCSADetailed(ReportGen):
                  custom_logo=None,
                  pagesize="a3",
                  pdf=False):
-        self.gather_data(vulns_start_time,
-                         vulns_end_time,
-                         alerts_start_time,
-                         alerts_end_time)
+        self.gather(vulns_start_time,
+                    vulns_end_time,
+                    alerts_start_time,
+                    alerts_end_time)
         return self.render(customer, author, custom_logo=custom_logo, pagesize=pagesize, pdf=pdf)
 
 
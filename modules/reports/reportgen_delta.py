@@ -0,0 +1,131 @@
+from modules.reportgen import ReportGen
+from modules.utils import LaceworkTime
+from modules.delta import diff_findings
+from modules.snapshots import read_snapshot
+from logzero import logger
+import pandas as pd
+import traceback
+import os
+
+class ReportGenDelta(ReportGen):
+
+    report_short_name = 'Delta'
+    report_name = 'Changes Since the Previous Assessment'
+    report_description = "Only what changed since the previous assessment of the customer: new and resolved vulnerabilities, new and fixed compliance violations and new alerts."
+    sections = ('host_findings', 'container_findings', 'compliance_findings', 'alert_findings', 'delta_data')
+    # the findings compared across runs: (section, label, key columns, name of the new findings, name of the
+    # resolved findings)
+    findings = (
+        ('host_findings', 'Host vulnerabilities', ('Hostname', 'CVE'), 'new_host_vulns', 'resolved_host_vulns'),
+        ('container_findings', 'Container vulnerabilities', ('Repository', 'CVE'), 'new_container_vulns',
+         'resolved_container_vulns'),
+        ('compliance_findings', 'Compliance violations', ('Cloud', 'Account', 'Control'), 'new_compliance_violations',
+         'fixed_compliance_violations'),
+        # alerts of the previous run are not resolved by falling out of the alert time range
+        ('alert_findings', 'Alerts', ('Alert ID',), 'new_alerts', None))
+    table_options = {name: {'max_rows': 1000} for *_, new, resolved in findings for name in (new, resolved) if name}
+    # only critical and high severity findings are compared
+    finding_severities = ("Critical", "High")
+    fetch_needs = (('host_vulns', 'vulns', finding_severities),
+                   ('container_vulns', 'vulns', finding_severities),
+                   ('alerts', 'alerts', finding_severities))
+
+    def __init__(self, basedir, use_cache=False, api_key_file=None, graph_scale=1):
+        super().__init__(basedir, use_cache=use_cache, api_key_file=api_key_file, graph_scale=graph_scale)
+        self.template = self.get_jinja2_template('delta_report.jinja2')
+        self.company_logo_html = self.file_to_image_tag('assets/Fortinet_logo.png', 'png')
+        self.delta_data = False
+
+    def gather_findings(self, description: str, fetch):
+        print(f'Gathering {description}.')
+        try:
+            self.lacework_interface.use_cache = self.use_cache
+            return fetch()
+        except Exception as e:
+            logger.error(f'Failed to retrieve {description} from Lacework, omitting them from the report.')
+            logger.error(f"Exception: {str(e)}")
+            logger.error(traceback.format_exc())
+            return False
+
+    def get_compliance_findings(self) -> pd.DataFrame:
+        findings = []
+        for cloud_provider in ('AWS', 'AZURE', 'GCP'):
+            compliance_reports = self.lacework_interface.get_compliance_reports(cloud_provider=cloud_provider)
+            if compliance_reports.reports:
+                df = compliance_reports.violations().rename(columns={compliance_reports.account_id_rename_string: 'Account'})
+                df.insert(0, 'Cloud', cloud_provider)
+                findings.append(df)
+        if not findings:
+            return pd.DataFrame(columns=['Cloud', 'Account', 'Category', 'Control', 'Severity', 'Resources'])
+        return pd.concat(findings, ignore_index=True)
+
+    def get_alert_findings(self, begin_time: str, end_time: str) -> pd.DataFrame:
+        alerts = self.fetch('alerts', begin_time, end_time, self.finding_severities)
+        if not alerts.count_alerts():
+            return pd.DataFrame(columns=['Alert ID', 'Severity', 'Alert Time', 'Alert Name'])
+        return alerts.processed_alerts(detailed=False).reset_index(drop=True)
+
+    def gather_data(self,
+                    vulns_start_time: LaceworkTime,
+                    vulns_end_time: LaceworkTime,
+                    alerts_start_time: LaceworkTime,
+                    alerts_end_time: LaceworkTime):
+        vulns_window = (vulns_start_time.generate_time_string(), vulns_end_time.generate_time_string())
+        alerts_window = (alerts_start_time.generate_time_string(), alerts_end_time.generate_time_string())
+        self.host_findings = self.gather_findings(
+            'vulnerability data for hosts',
+            lambda: self.fetch('host_vulns', *vulns_window, self.finding_severities).findings(self.finding_severities))
+        self.container_findings = self.gather_findings(
+            'vulnerability data for containers',
+            lambda: self.fetch('container_vulns', *vulns_window, self.finding_severities).findings(self.finding_severities))
+        self.compliance_findings = self.gather_findings('compliance violations', self.get_compliance_findings)
+        self.alert_findings = self.gather_findings('alerts', lambda: self.get_alert_findings(*alerts_window))
+        # compared with an earlier run by compare_to_snapshot()
+        self.delta_data = False
+
+    def compare_to_snapshot(self, directory: str) -> dict:
+        '''Compare the findings with those of the Delta snapshot in directory, returns its metadata.'''
+        sections, metadata = read_snapshot(directory, self.assets)
+        if metadata['report'] != self.report_short_name:
+            raise ValueError(f"The snapshot in {directory} holds the data of report {metadata['report']}, "
+                             f"not {self.report_short_name}")
+        delta_data = {'baseline_created': metadata['created']}
+        summary = []
+        for section, label, keys, new_name, resolved_name in self.findings:
+            current, previous = getattr(self, section), sections.get(section)
+            if current is False or previous is None or previous is False:
+                # without the findings of both runs nothing can be told apart
+                logger.warning(f'{label} of this or the previous run are missing, omitting their changes from the report.')
+                continue
+            new, resolved = diff_findings(current, previous, keys)
+            delta_data[new_name] = new
+            if resolved_name:
+                delta_data[resolved_name] = resolved
+            summary.append({'Findings': label, 'Current': len(current), 'New': len(new),
+                            'Resolved': str(len(resolved)) if resolved_name else ''})
+        delta_data['summary'] = pd.DataFrame(summary, columns=['Findings', 'Current', 'New', 'Resolved'])
+        self.delta_data = delta_data
+        return metadata
+
+    def finding_counts(self) -> dict:
+        '''Findings of this run by label, for a first run there is nothing to compare with.'''
+        return {label: len(getattr(self, section)) for section, label, *_ in self.findings
+                if getattr(self, section, False) is not False}
+
+    def template_context(self, customer, author, custom_logo=None, pagesize="a3", pdf=False):
+        if custom_logo and os.path.isfile(custom_logo):
+            self.custom_logo_html = self.file_to_image_tag(custom_logo, 'png', align='right')
+        else:
+            self.custom_logo_html = None
+        return dict(
+            customer=str(customer),
+            date=self.get_current_date(),
+            author=str(author),
+            company_logo_html=self.company_logo_html,
+            custom_logo_html=self.custom_logo_html,
+            delta_data=self.delta_data,
+            finding_counts=self.finding_counts(),
+            table_options=self.table_options,
+            pagesize=pagesize,
+            pdf=pdf
+        )
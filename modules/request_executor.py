@@ -0,0 +1,228 @@
+'''
+Retrying, rate limited execution of Lacework API requests.
+
+Every request LaceworkInterface makes goes through a RequestExecutor. Transient failures (connection errors, timeouts,
+429 and 5xx responses) are retried with exponential backoff and jitter according to the endpoint's RetryPolicy, and a
+429's Retry-After is honored. Requests made with the same Lacework account share one token bucket, so concurrent
+fetches are budgeted together and all of them back off when the API starts returning 429s. Paginated searches are
+iterated here rather than by the SDK so a failed page is retried on its own instead of restarting the search.
+'''
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from laceworksdk.exceptions import ApiError
+from logzero import logger
+from requests.adapters import HTTPAdapter
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, stop_after_delay, wait_exponential, wait_random
+
+from modules.instrumentation import current_span
+from modules.json_decode import decode_response
+
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+# requests per second (and burst size) allowed per Lacework account, shared by all concurrent fetches
+DEFAULT_RATE_LIMIT = float(os.getenv('LW_API_RATE_LIMIT', '10'))
+DEFAULT_RATE_LIMIT_BURST = float(os.getenv('LW_API_RATE_LIMIT_BURST', '20'))
+# (connect, read) timeout in seconds for every request, the SDK sets none
+DEFAULT_TIMEOUT = (10, float(os.getenv('LW_API_READ_TIMEOUT', '300')))
+# keep-alive connections kept open per host, a session is shared by every thread using its account
+DEFAULT_MAX_CONNECTIONS = int(os.getenv('LW_API_MAX_CONNECTIONS', '100'))
+
+
+class RetryPolicy:
+
+    def __init__(self, attempts: int = 5, initial_wait: float = 1, max_wait: float = 60, max_delay: float = 600):
+        self.attempts = attempts
+        self.initial_wait = initial_wait
+        self.max_wait = max_wait
+        self.max_delay = max_delay
+
+
+# pages of long paginated pulls are worth waiting for, LQL chunks are split by LQLExecutor when they keep failing
+RETRY_POLICIES = {'default': RetryPolicy(),
+                  'search': RetryPolicy(attempts=8),
+                  'next_page': RetryPolicy(attempts=8),
+                  'queries': RetryPolicy(attempts=2, max_wait=10)}
+
+
+class RateLimiter:
+    '''Token bucket, acquire() blocks until a request may be made.'''
+
+    def __init__(self, rate: float = DEFAULT_RATE_LIMIT, capacity: float = DEFAULT_RATE_LIMIT_BURST):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        '''Take a token, returns 0 on success or the number of seconds to wait before trying again.'''
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while delay := self._reserve():
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        # the same bucket, so threads and coroutines requesting with one account are budgeted together
+        while delay := self._reserve():
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        '''Hold back every request for seconds, used when the API signals it is rate limiting us.'''
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(key: str) -> RateLimiter:
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = RateLimiter()
+        return _rate_limiters[key]
+
+
+def is_retryable(exception: BaseException) -> bool:
+    if isinstance(exception, ApiError):
+        return exception.status_code in RETRYABLE_STATUS_CODES
+    # connection errors, timeouts and responses cut short (invalid JSON)
+    return isinstance(exception, (requests.ConnectionError, requests.Timeout, requests.exceptions.JSONDecodeError))
+
+
+def get_retry_after(exception: BaseException):
+    '''Return the seconds a 429 response asked us to wait, or None.'''
+    if not isinstance(exception, ApiError) or exception.status_code != 429:
+        return None
+    retry_after = exception.response.headers.get('Retry-After')
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_wait(policy: RetryPolicy, rate_limiter: RateLimiter):
+    backoff = wait_exponential(multiplier=policy.initial_wait, max=policy.max_wait) + wait_random(0, policy.initial_wait)
+
+    def wait(retry_state):
+        exception = retry_state.outcome.exception()
+        delay = get_retry_after(exception)
+        if delay is None:
+            delay = backoff(retry_state)
+        if isinstance(exception, ApiError) and exception.status_code == 429:
+            # being rate limited, every request sharing the bucket backs off
+            rate_limiter.pause(delay)
+        return delay
+    return wait
+
+
+def log_retry(endpoint: str):
+    def log(retry_state):
+        current_span().add('retries')
+        logger.warning(f"Lacework API {endpoint} request failed ({str(retry_state.outcome.exception())}), "
+                       f"retry {retry_state.attempt_number} in {retry_state.next_action.sleep:.1f}s")
+    return log
+
+
+def retry_options(endpoint: str, policy: RetryPolicy, rate_limiter: RateLimiter, retryable=is_retryable) -> dict:
+    '''Keyword arguments of the tenacity Retrying (or AsyncRetrying) of a request to endpoint.'''
+    return dict(stop=stop_after_attempt(policy.attempts) | stop_after_delay(policy.max_delay),
+                wait=retry_wait(policy, rate_limiter),
+                retry=retry_if_exception(retryable),
+                before_sleep=log_retry(endpoint),
+                reraise=True)
+
+
+class LaceworkHTTPAdapter(HTTPAdapter):
+    '''Adapter without urllib3 level retries (RequestExecutor owns them) that applies a default timeout.'''
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, pool_maxsize=DEFAULT_MAX_CONNECTIONS, **kwargs):
+        self.timeout = timeout
+        super().__init__(max_retries=0, pool_maxsize=pool_maxsize, **kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=timeout or self.timeout, **kwargs)
+
+
+class RequestExecutor:
+
+    def __init__(self, lacework, rate_limiter: RateLimiter = None, policies: dict = None, before_request=None):
+        self.lacework = lacework
+        # called before every request attempt, e.g. to renew the access token of a shared client
+        self.before_request = before_request
+        self.rate_limiter = rate_limiter or get_rate_limiter(lacework._session._base_url)
+        self.policies = {**RETRY_POLICIES, **(policies or {})}
+        session = lacework._session._session
+        if not isinstance(session.get_adapter('https://'), LaceworkHTTPAdapter):
+            adapter = LaceworkHTTPAdapter()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+
+    def _execute(self, func, *args, **kwargs):
+        self.rate_limiter.acquire()
+        if self.before_request:
+            self.before_request()
+        return func(*args, **kwargs)
+
+    def call(self, endpoint: str, func, *args, **kwargs):
+        '''Call func(*args, **kwargs) with the retry policy of endpoint, the last exception is raised once it gives up.'''
+        policy = self.policies.get(endpoint, self.policies['default'])
+        retrying = Retrying(**retry_options(endpoint, policy, self.rate_limiter))
+        return retrying(self._execute, func, *args, **kwargs)
+
+    def search(self, search_endpoint, json: dict, checkpoint=None, fields: dict = None):
+        '''Yield the pages of a laceworksdk SearchEndpoint search, with fields (RecordColumns fields) the records only
+        hold those fields (see decode_json).
+
+        Each page request is retried on its own, a failure part way through a long pull resumes at the failed page.
+        With a SearchCheckpoint every page is saved as it arrives and a search saved by an earlier run continues from
+        its last page (or starts over if the API no longer accepts the saved nextPage URL).
+        '''
+        session = search_endpoint.session
+        url = search_endpoint._build_url(resource=search_endpoint.RESOURCE or None, action='search')
+        page = None
+        if checkpoint and checkpoint.page_count:
+            if checkpoint.complete:
+                yield from checkpoint.pages()
+                return
+            try:
+                page = self.call('next_page', lambda: decode_response(session.get(checkpoint.next_page), fields))
+                yield from checkpoint.pages()
+            except ApiError as e:
+                if is_retryable(e):
+                    raise e
+                logger.warning(f"Could not continue search from checkpoint ({str(e)}), starting it over.")
+                checkpoint.reset()
+        if page is None:
+            page = self.call('search', lambda: decode_response(session.post(url, json=json), fields))
+        while True:
+            if checkpoint:
+                checkpoint.add_page(page)
+            yield page
+            next_page = (page.get('paging') or {}).get('urls', {}).get('nextPage')
+            if not next_page:
+                break
+            page = self.call('next_page', lambda: decode_response(session.get(next_page), fields))
@@ -0,0 +1,157 @@
+'''
+Local store of the summary metrics of every report run, for trends across assessments.
+
+Each run of a report records the summaries it gathered in a SQLite database: the vulnerabilities and affected
+hosts and images by severity, the non-compliant resources by account and severity, and the alerts by severity.
+Every metric is a row of the metrics table, identified by the section of the report it comes from, the metric,
+its severity and subject (a cloud account, '' for totals):
+
+    runs     id, tenant, report, run_time, vulns/alerts time ranges
+    metrics  run_id, section, metric, severity, subject, value
+
+trends() returns a metric by run, so a report can chart it without fetching months of data from the API again.
+pandas and plotly are imported by the functions using them, the CLI imports this module on every start.
+'''
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from modules.instrumentation import traced
+
+DEFAULT_RESULTS_STORE = 'lw_report_results.sqlite'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    tenant TEXT NOT NULL,
+    report TEXT NOT NULL,
+    run_time TEXT NOT NULL,
+    vulns_start_time TEXT,
+    vulns_end_time TEXT,
+    alerts_start_time TEXT,
+    alerts_end_time TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_tenant_time ON runs (tenant, run_time);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    section TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    severity TEXT NOT NULL DEFAULT '',
+    subject TEXT NOT NULL DEFAULT '',
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS metrics_run_section ON metrics (run_id, section, metric);
+'''
+
+SEVERITIES = ("Critical", "High", "Medium", "Low", "Info")
+
+
+def severity_metrics(section: str, df: 'pd.DataFrame', columns: dict) -> list:
+    '''Rows of a summary with a Severity column, columns maps the summary columns to metric names.'''
+    return [(section, metric, str(row['Severity']), '', row[column])
+            for _, row in df.iterrows() for column, metric in columns.items()]
+
+
+def section_metrics(section: str, data) -> list:
+    '''Return the (section, metric, severity, subject, value) rows of the data gathered for a report section.'''
+    import pandas as pd
+    if section == 'host_vulns_data' and data:
+        return [(section, 'hosts_scanned', '', '', data['hosts_scanned_count'])] + \
+            severity_metrics(section, data['host_vulns_summary'], {'Total CVEs': 'cves', 'Hosts Affected': 'hosts_affected'})
+    if section == 'container_vulns_data' and data:
+        return [(section, 'containers_scanned', '', '', data['containers_scanned_count'])] + \
+            severity_metrics(section, data['container_vulns_summary'], {'Total CVEs': 'cves', 'Images Affected': 'images_affected'})
+    if section.endswith('_compliance_data') and data:
+        rows = [(section, 'accounts_evaluated', '', '', data['cloud_accounts_count'])]
+        summary_by_account = data['summary_by_account']
+        for account, counts in summary_by_account.iterrows():
+            rows += [(section, 'non_compliant_resources', str(severity), str(account), value)
+                     for severity, value in counts.items() if pd.notna(value)]
+        return rows
+    if section == 'alerts_data' and data is not False:
+        # None is a successful fetch that found no alerts
+        counts = data['alerts_by_severity'] if data else {}
+        return [(section, 'alerts', '', '', data['alerts_count'] if data else 0)] + \
+            [(section, 'alerts', severity, '', count) for severity, count in counts.items()]
+    return []
+
+
+class ResultsStore:
+
+    def __init__(self, path: str = DEFAULT_RESULTS_STORE):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    @traced(category='output')
+    def record_run(self, tenant: str, report: str, sections: dict, run_time: datetime = None, **time_ranges) -> int:
+        '''Record the metrics of the gathered sections (name -> data) of a report run, returns the run id.'''
+        run_time = (run_time or datetime.now(timezone.utc)).astimezone(timezone.utc)
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (tenant, report, run_time, vulns_start_time, vulns_end_time, alerts_start_time, '
+                'alerts_end_time) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (tenant, report, run_time.isoformat(), time_ranges.get('vulns_start_time'),
+                 time_ranges.get('vulns_end_time'), time_ranges.get('alerts_start_time'),
+                 time_ranges.get('alerts_end_time')))
+            run_id = cursor.lastrowid
+            rows = [row for section, data in sections.items() for row in section_metrics(section, data)]
+            self.connection.executemany(
+                'INSERT INTO metrics (run_id, section, metric, severity, subject, value) VALUES (?, ?, ?, ?, ?, ?)',
+                [(run_id, section, metric, severity, subject, float(value))
+                 for section, metric, severity, subject, value in rows])
+        return run_id
+
+    def runs(self, tenant: str, report: str = None, days: int = None) -> 'pd.DataFrame':
+        import pandas as pd
+        query = 'SELECT * FROM runs WHERE tenant = ?'
+        params = [tenant]
+        if report:
+            query += ' AND report = ?'
+            params.append(report)
+        if days:
+            query += ' AND run_time >= ?'
+            params.append((datetime.now(timezone.utc) - timedelta(days=days)).isoformat())
+        return pd.read_sql_query(query + ' ORDER BY run_time', self.connection, params=params)
+
+    def trends(self, tenant: str, metric: str, sections: tuple = None, severities: tuple = None,
+               report: str = None, days: int = None) -> 'pd.DataFrame':
+        '''Return a metric of the runs of tenant, summed over subjects, one row per run and a column per severity.
+
+        sections limits the sections the metric is summed over, e.g. every *_compliance_data section by default.
+        '''
+        import pandas as pd
+        query = ('SELECT runs.run_time, metrics.severity, SUM(metrics.value) AS value FROM runs '
+                 'JOIN metrics ON metrics.run_id = runs.id WHERE runs.tenant = ? AND metrics.metric = ?')
+        params = [tenant, metric]
+        for column, values in (('metrics.section', sections), ('metrics.severity', severities)):
+            if values:
+                query += f' AND {column} IN ({", ".join("?" * len(values))})'
+                params += list(values)
+        if report:
+            query += ' AND runs.report = ?'
+            params.append(report)
+        if days:
+            query += ' AND runs.run_time >= ?'
+            params.append((datetime.now(timezone.utc) - timedelta(days=days)).isoformat())
+        query += ' GROUP BY runs.id, metrics.severity ORDER BY runs.run_time'
+        df = pd.read_sql_query(query, self.connection, params=params)
+        if df.empty:
+            return pd.DataFrame(index=pd.DatetimeIndex([], tz='UTC', name='run_time'))
+        df['run_time'] = pd.to_datetime(df['run_time'], utc=True)
+        df = df.pivot_table(values='value', index='run_time', columns='severity', aggfunc='sum', fill_value=0)
+        df.columns = [column or 'Total' for column in df.columns]
+        return df.reindex(columns=[column for column in ('Total',) + SEVERITIES if column in df.columns])
+
+
+def trend_line_graph(trends: dict, title: str, width=600, height=350, format='svg') -> bytes:
+    '''Line chart of series (name -> pandas Series indexed by run time).'''
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    for name, series in trends.items():
+        fig.add_trace(go.Scatter(name=name, x=series.index, y=series.values, mode='lines+markers'))
+    fig.update_layout(title=title, yaxis=dict(title='Findings', rangemode='tozero'))
+    return fig.to_image(format=format, width=width, height=height)
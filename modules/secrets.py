@@ -1,17 +1,31 @@
 import pandas as pd
 from logzero import logger
+from modules.instrumentation import traced
 from datetime import *
 
 
 class Secrets:
 
+    # rows are unique per key file on a host, the same key is returned once per overlapping query window
+    dedup_columns = ('HOSTNAME', 'FILE_PATH')
+
     def __init__(self, raw_data):
+        self.data = []
+        self._seen_keys = set()
+        self.add_rows(raw_data['data'])
 
-        self.data = raw_data['data']
+    def add_rows(self, rows):
+        for row in rows:
+            key = tuple(row.get(column) for column in self.dedup_columns)
+            if key in self._seen_keys:
+                continue
+            self._seen_keys.add(key)
+            self.data.append(row)
 
     def count_secrets(self):
         return len(self.data)
 
+    @traced(category='model')
     def processed_secrets(self):
         df = pd.DataFrame(self.data)
         df.rename(
@@ -0,0 +1,127 @@
+'''
+Snapshots of the data a report gathered, so it can be rendered again without the Lacework API.
+
+A snapshot is a directory written after gather():
+
+    snapshot.json       format version, metadata (report, creation time, graph scale, ...) and the report sections
+    tables/<n>.parquet  every DataFrame of the sections
+    images/<file>       every image of the sections (the charts), as the original SVG or PNG
+
+The sections are the dicts the gather_* methods return. In snapshot.json their DataFrames and images are replaced by
+{"$table": ...} and {"$image": ...} references, numpy scalars are stored as plain numbers. Loading rebuilds the same
+values, the DataFrames with their dtypes and index, so a report rendered from a snapshot is the report rendered
+straight after gather. Writing and reading Parquet needs pyarrow. pandas is imported when a snapshot is written or
+read, so the CLI can look up snapshot metadata without loading it.
+'''
+import json
+import os
+from datetime import datetime, timezone
+
+from modules.assets import AssetImage, ReportAssets
+
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_FILE = 'snapshot.json'
+
+
+class SnapshotWriter:
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.table_count = 0
+        os.makedirs(os.path.join(directory, 'tables'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'images'), exist_ok=True)
+
+    def encode(self, value):
+        import numpy as np
+        import pandas as pd
+        if isinstance(value, dict):
+            return {str(key): self.encode(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.encode(item) for item in value]
+        if isinstance(value, pd.DataFrame):
+            path = f'tables/{self.table_count}.parquet'
+            self.table_count += 1
+            value.to_parquet(os.path.join(self.directory, path))
+            return {'$table': path}
+        if isinstance(value, AssetImage):
+            asset = value.asset
+            path = f'images/{asset.file_name}'
+            with open(os.path.join(self.directory, path), 'wb') as image_file:
+                image_file.write(asset.original)
+            return {'$image': path, 'format': asset.file_format, 'align': value.align}
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+
+class SnapshotReader:
+
+    def __init__(self, directory: str, assets: ReportAssets):
+        self.directory = directory
+        self.assets = assets
+
+    def decode(self, value):
+        import pandas as pd
+        if isinstance(value, list):
+            return [self.decode(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        if '$table' in value:
+            return pd.read_parquet(os.path.join(self.directory, value['$table']))
+        if '$image' in value:
+            with open(os.path.join(self.directory, value['$image']), 'rb') as image_file:
+                return self.assets.image_tag(image_file.read(), value['format'], align=value['align'])
+        return {key: self.decode(item) for key, item in value.items()}
+
+
+def write_snapshot(directory: str, sections: dict, **metadata):
+    '''Write sections (name -> gathered data) and metadata to the snapshot directory.'''
+    writer = SnapshotWriter(directory)
+    snapshot = {'format_version': SNAPSHOT_FORMAT_VERSION,
+                'metadata': {**metadata, 'created': datetime.now(timezone.utc).isoformat()},
+                'sections': writer.encode(sections)}
+    with open(os.path.join(directory, SNAPSHOT_FILE), 'w') as snapshot_file:
+        json.dump(snapshot, snapshot_file, indent=1)
+
+
+def read_snapshot_file(directory: str) -> dict:
+    path = os.path.join(directory, SNAPSHOT_FILE)
+    try:
+        with open(path) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except (OSError, ValueError) as e:
+        raise ValueError(f'Could not read report snapshot {path}: {str(e)}')
+    if snapshot.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f'Report snapshot {path} has format version {snapshot.get("format_version")}, '
+                         f'only format version {SNAPSHOT_FORMAT_VERSION} can be read')
+    return snapshot
+
+
+def read_snapshot_metadata(directory: str) -> dict:
+    return read_snapshot_file(directory)['metadata']
+
+
+def read_snapshot(directory: str, assets: ReportAssets) -> tuple:
+    '''Return the sections and metadata of a snapshot, its images are added to assets.'''
+    snapshot = read_snapshot_file(directory)
+    return SnapshotReader(directory, assets).decode(snapshot['sections']), snapshot['metadata']
+
+
+def find_latest_snapshot(directory: str, **metadata) -> str:
+    '''Return directory if it is a snapshot, else the latest snapshot in its subdirectories whose metadata has the
+    given values (e.g. report and customer), None when there is none.'''
+    if os.path.isfile(os.path.join(directory, SNAPSHOT_FILE)):
+        return directory
+    latest, latest_created = None, None
+    for entry in os.scandir(directory):
+        if not entry.is_dir() or not os.path.isfile(os.path.join(entry.path, SNAPSHOT_FILE)):
+            continue
+        try:
+            snapshot_metadata = read_snapshot_metadata(entry.path)
+        except ValueError:
+            continue
+        if any(snapshot_metadata.get(key) != value for key, value in metadata.items()):
+            continue
+        if latest_created is None or snapshot_metadata['created'] > latest_created:
+            latest, latest_created = entry.path, snapshot_metadata['created']
+    return latest
@@ -9,18 +9,27 @@ import importlib
 import ast
 from pathlib import Path
 from logzero import logger
-import os, sys, requests, json, time
+import os, sys, json, time
 
 
 class LaceworkTime:
 
-    def __init__(self, time_input: str):
+    def __init__(self, time_input: str, reference_time: datetime = None):
         days_and_hours = time_input.split(":")
         self.delta_hours: int = int(days_and_hours[1])
         self.delta_days: int = int(days_and_hours[0])
+        # the time the delta is relative to, now unless it is pinned (e.g. by a resumed run)
+        self.reference_time = reference_time
 
     def generate_time_string(self) -> str:
-        return (datetime.now(timezone.utc) - timedelta(days=self.delta_days, hours=self.delta_hours)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        reference_time = self.reference_time or datetime.now(timezone.utc)
+        return (reference_time - timedelta(days=self.delta_days, hours=self.delta_hours)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def pinned(self, reference_time: datetime) -> 'LaceworkTime':
+        '''This time relative to reference_time, unless it is pinned already.'''
+        if self.reference_time:
+            return self
+        return LaceworkTime(f'{self.delta_days}:{self.delta_hours}', reference_time=reference_time)
 
 
 def generate_md5_from_obj(obj_to_hash):
@@ -57,8 +66,11 @@ def cache_results(func):
     return wrapper
 
 
-def get_report_class_name_from_file(file: pathlib.Path):
-
+def get_report_metadata_from_file(file: pathlib.Path):
+    '''Parse a report module without importing it.
+        Returns the name of its first class along with the string constants assigned in that class body
+        (report_short_name, report_name, report_description...), or False.
+        '''
     try:
         with file.open('r') as f:
             contents = f.read()
@@ -70,38 +82,72 @@ def get_report_class_name_from_file(file: pathlib.Path):
     if len(report_classes) == 0:
         logger.error(f'File {str(file.name)} does not contain a class to import. Skipping')
         return False
-    return report_classes[0].name
+    metadata = {'class_name': report_classes[0].name}
+    for statement in report_classes[0].body:
+        if isinstance(statement, ast.Assign) and isinstance(statement.value, ast.Constant) \
+                and isinstance(statement.value.value, str):
+            for target in statement.targets:
+                if isinstance(target, ast.Name):
+                    metadata[target.id] = statement.value.value
+    return metadata
+
+
+def get_report_class_name_from_file(file: pathlib.Path):
+    metadata = get_report_metadata_from_file(file)
+    if not metadata:
+        return False
+    return metadata['class_name']
 
 
 def get_available_reports(basedir):
-    # load available reports from the
+    # list the available reports in "modules/reports" from their source, report modules (and the pandas, plotly,
+    # jinja2 and laceworksdk imports that come with them) are only imported by load_report_class()
     available_reports = []
     modules_dir = pathlib.Path(basedir + '/modules/reports')
     modules_dir_contents = modules_dir.glob('*.py')
-    reports_to_load = []
     for module_path in modules_dir_contents:
-        class_name = get_report_class_name_from_file(module_path)
-        if class_name:
-            module_name = str(str(module_path.name).split('.')[0])
-            reports_to_load.append({'class_name': class_name, 'module_name': module_name})
-        else:
+        metadata = get_report_metadata_from_file(module_path)
+        if not metadata:
             continue
-    for report_to_load in reports_to_load:
-        module_name = 'modules.reports.' + report_to_load['module_name']
-        globals()[module_name] = importlib.import_module(module_name)
-        #  These following three lines are confusing:
-        #  First we get the name of the class as a string from the module
-        #  Then we use that string to get the class itself
-        #  Then we instantiate it.
-        #class_name = getattr(globals()[module_name], 'class_name')
-        class_ = getattr(globals()[module_name], report_to_load['class_name'])
-        available_reports.append({'report_class': class_,
-                                  'report_short_name': class_.report_short_name,
-                                  'report_name': class_.report_name,
-                                  'report_description': class_.report_description})
-        logger.info(f'Found and imported class {class_.__name__} from module {module_name}')
+        available_report = {'class_name': metadata['class_name'],
+                            'module_name': 'modules.reports.' + str(str(module_path.name).split('.')[0]),
+                            'report_short_name': metadata.get('report_short_name'),
+                            'report_name': metadata.get('report_name'),
+                            'report_description': metadata.get('report_description')}
+        if None in available_report.values():
+            # metadata that is not a plain string literal can only be read from the imported class
+            report_class = load_report_class(available_report)
+            available_report.update({'report_short_name': report_class.report_short_name,
+                                     'report_name': report_class.report_name,
+                                     'report_description': report_class.report_description})
+        available_reports.append(available_report)
+        logger.info(f'Found class {metadata["class_name"]} in module {available_report["module_name"]}')
     return available_reports
 
+
+def load_report_class(available_report: dict):
+    # import the module of a report returned by get_available_reports() and return its class
+    module = importlib.import_module(available_report['module_name'])
+    class_ = getattr(module, available_report['class_name'])
+    logger.info(f'Imported class {class_.__name__} from module {available_report["module_name"]}')
+    return class_
+
+
+def get_available_datasets(basedir):
+    # load available LQL datasets from the "modules/datasets" directory, keyed by dataset_name
+    available_datasets = {}
+    datasets_dir = pathlib.Path(basedir + '/modules/datasets')
+    for module_path in datasets_dir.glob('*.py'):
+        class_name = get_report_class_name_from_file(module_path)
+        if not class_name:
+            continue
+        module_name = 'modules.datasets.' + str(module_path.name).split('.')[0]
+        class_ = getattr(importlib.import_module(module_name), class_name)
+        available_datasets[class_.dataset_name] = class_
+        logger.info(f'Found and imported dataset {class_.__name__} from module {module_name}')
+    return available_datasets
+
+
 def alert_new_release():
     WARNING = '\033[93m'
     ENDC = '\033[0m'
@@ -116,6 +162,7 @@ def alert_new_release():
             tag_ref = version_current['tag_ref']
             tag_current = version_current['tag_val']
             upgrade_url = version_current['upgrade_url']
+            import requests
             response = requests.get(tag_ref)
             tag_latest = response.json()["tag_name"]
 
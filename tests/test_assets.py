@@ -0,0 +1,64 @@
+import io
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+from modules.assets import ReportAssets, minify_svg
+
+SVG = (b'<svg class="main-svg" xmlns="http://www.w3.org/2000/svg" width="600" height="350" style="">'
+       b'<g class="gradients"/><g class="layer"><g class="imagelayer"/></g>'
+       b'<path class="ygrid crisp" transform="translate(0,216.17000000000002)" '
+       b'style="stroke: rgb(255, 255, 255); stroke-width: 1px;"/>'
+       b'<text class="gtitle" x="300" y="50">Vulnerable: openssl 1.1.1234, libc</text></svg>')
+
+
+def test_minified_svg_keeps_text():
+    minified = minify_svg(SVG)
+    assert len(minified) < len(SVG)
+    root = ElementTree.fromstring(minified)
+    assert root.find('{http://www.w3.org/2000/svg}text').text == 'Vulnerable: openssl 1.1.1234, libc'
+    path = root.find('{http://www.w3.org/2000/svg}path')
+    assert path.get('transform') == 'translate(0,216.17)'
+    assert path.get('style') == 'stroke:rgb(255,255,255);stroke-width:1px;'
+    assert b'<g' not in minified and b'class=' not in minified
+
+
+def test_repeated_assets_are_stored_once(tmp_path):
+    assets = ReportAssets()
+    first = assets.image_tag(b'not really a png', 'png')
+    second = assets.image_tag(b'not really a png', 'png', align='right')
+    chart = assets.image_tag(SVG, 'svg+xml')
+    assert first.asset is second.asset
+    assert len(assets.assets) == 2
+    assert str(first).startswith("<img src='data:image/png;charset=utf-8;base64,")
+    assert str(first).replace("'left'", "'right'") == str(second)
+
+    assets.mode = 'external'
+    assets.write(tmp_path)
+    assert str(second) == f"<img src='assets/{first.asset.file_name}' align='right'/>"
+    assert (tmp_path / 'assets' / first.asset.file_name).read_bytes() == b'not really a png'
+    assert (tmp_path / 'assets' / chart.asset.file_name).read_bytes() == minify_svg(SVG)
+    with pytest.raises(ValueError):
+        assets.mode = 'inline'
+
+
+def test_png_recompression_is_lossless():
+    Image = pytest.importorskip('PIL.Image')
+    image = Image.new('RGB', (200, 200), 'white')
+    png = io.BytesIO()
+    image.save(png, format='PNG', compress_level=0)
+    assets = ReportAssets(recompress_png=True)
+    asset = assets.add(png.getvalue(), 'png')
+    assert len(asset.data) < len(png.getvalue())
+    with Image.open(io.BytesIO(asset.data)) as recompressed:
+        assert list(recompressed.getdata()) == list(image.getdata())
+
+
+def test_charts_are_scaled_without_drawing_them_again():
+    assets = ReportAssets(chart_scale=1.4)
+    chart = assets.image_tag(SVG, 'svg+xml', align='middle')
+    logo = assets.image_tag(b'not really a png', 'png')
+    assert str(chart).endswith("align='middle' width='840' height='490'/>")
+    assert str(logo).endswith("align='left'/>")
+    assets.chart_scale = 1
+    assert str(chart).endswith("align='middle'/>")
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from laceworksdk.exceptions import ApiError
+
+from benchmarks.mock_lacework_api import MockLaceworkAPI
+from modules.lacework_interface import LaceworkInterface
+from modules.request_executor import RateLimiter, RetryPolicy
+from modules.utils import LaceworkTime
+
+aiohttp = pytest.importorskip('aiohttp')
+from modules.async_lacework_interface import AsyncLaceworkInterface, api_error  # noqa: E402
+
+start_time = LaceworkTime('7:0').generate_time_string()
+end_time = LaceworkTime('0:0').generate_time_string()
+api_key_file = {'account': 'mock', 'keyId': 'MOCK_KEY_ID', 'secret': '_mock_secret'}
+
+
+def test_async_interface_matches_sync_interface():
+    with MockLaceworkAPI(scale=1000, page_size=50, latency=0.01) as api:
+        lacework_interface = LaceworkInterface(lacework_client=api.client())
+        host_vulns = lacework_interface.get_host_vulns(start_time, end_time)
+        alerts = lacework_interface.get_alerts(start_time, end_time)
+        compliance = lacework_interface.get_compliance_reports(cloud_provider='AZURE')
+        secrets = lacework_interface.get_secrets(start_time, end_time)
+
+        async def gather():
+            async with AsyncLaceworkInterface(api_key_file, base_url=api.base_url,
+                                              rate_limiter=RateLimiter(1000, 1000)) as lacework:
+                return await asyncio.gather(lacework.get_host_vulns(start_time, end_time),
+                                            lacework.get_container_vulns(start_time, end_time),
+                                            lacework.get_alerts(start_time, end_time),
+                                            lacework.get_compliance_reports(cloud_provider='AZURE'),
+                                            lacework.get_secrets(start_time, end_time))
+        api.reset_stats()
+        async_host_vulns, async_container_vulns, async_alerts, async_compliance, async_secrets = asyncio.run(gather())
+        stats = api.get_stats()
+
+    assert len(async_host_vulns.data) == len(host_vulns.data)
+    assert len(async_container_vulns.data) > 0
+    assert async_alerts.count_alerts() == alerts.count_alerts()
+    assert len(async_compliance.reports) == len(compliance.reports) == 3
+    assert async_secrets.count_secrets() == secrets.count_secrets()
+    # one token for every request, the searches of all severities in flight at once
+    assert stats['by_endpoint']['access_tokens'] == 1
+    assert stats['max_in_flight'] > 1
+
+
+def test_async_interface_retries_injected_errors():
+    with MockLaceworkAPI(scale=1000, page_size=10, max_pages=2, error_rate=0.2) as api:
+        async def get_host_vulns():
+            fast_retries = {name: RetryPolicy(initial_wait=0.01, max_wait=0.05)
+                            for name in ('default', 'access_tokens', 'search', 'next_page')}
+            async with AsyncLaceworkInterface(api_key_file, base_url=api.base_url, policies=fast_retries,
+                                              rate_limiter=RateLimiter(1000, 1000)) as lacework:
+                return await lacework.get_host_vulns(start_time, end_time)
+        api.reset_stats()
+        host_vulns = asyncio.run(get_host_vulns())
+        assert len(host_vulns.data) == 60
+        assert api.get_stats()['injected_errors'] > 0
+
+
+def test_async_queries_split_only_transient_failures():
+    lacework = AsyncLaceworkInterface(api_key_file, base_url='https://mock.lacework.net')
+    calls = []
+
+    def failing_request(status):
+        async def request(endpoint, method, path, **kwargs):
+            calls.append(path)
+            raise api_error(status, 'error', {}, b'{}', method, f'https://mock.lacework.net{path}')
+        return request
+    window_end = datetime(2024, 1, 8, tzinfo=timezone.utc)
+    window = (window_end - timedelta(days=1), window_end)
+    lacework.request = failing_request(400)
+    with pytest.raises(ApiError):
+        asyncio.run(lacework.execute_query('query', *window))
+    assert len(calls) == 1
+    # a 503 is retried on shorter windows
+    calls.clear()
+    lacework.request = failing_request(503)
+    with pytest.raises(ApiError):
+        asyncio.run(lacework.execute_query('query', *window, min_chunk=timedelta(hours=6)))
+    assert len(calls) > 1
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.mock_lacework_api import MockLaceworkAPI
+from modules.checkpoints import FileCheckpointStore
+from modules.lql import LQLExecutor, subtract_time_ranges
+from tests.test_lql import FakeLacework, FakeQueries, make_rows, query
+from tests.test_request_executor import expected_vulns, mock_interface
+
+
+def test_subtract_time_ranges():
+    day = timedelta(days=1)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    covered = [(start + day, start + 2 * day), (start + 4 * day, start + 9 * day)]
+    assert subtract_time_ranges(start, start + 7 * day, covered) == [(start, start + day),
+                                                                     (start + 2 * day, start + 4 * day)]
+    assert subtract_time_ranges(start, start + day, [(start, start + day)]) == []
+
+
+def test_saved_data_is_private(tmp_path):
+    checkpoints = FileCheckpointStore(directory=tmp_path / 'checkpoints').start()
+    assert (tmp_path / 'checkpoints').stat().st_mode & 0o777 == 0o700
+    assert checkpoints.path.stat().st_mode & 0o777 == 0o700
+
+
+def test_lql_chunks_completed_by_earlier_run_are_skipped(tmp_path):
+    rows = make_rows(200, hosts=200)
+    checkpoints = FileCheckpointStore(directory=tmp_path).start()
+    chunk_checkpoint = checkpoints.chunks('lql_secrets')
+    # the first run dies after three chunks
+    first_run = LQLExecutor(FakeLacework(FakeQueries(rows)), max_workers=1).execute(
+        query, '2024-01-01T00:00:00Z', '2024-01-08T00:00:00Z', checkpoint=chunk_checkpoint)
+    for _ in range(3):
+        next(first_run)
+    first_run.close()
+
+    queries = FakeQueries(rows)
+    resumed = LQLExecutor(FakeLacework(queries), max_workers=1).execute(
+        query, '2024-01-01T00:00:00Z', '2024-01-08T00:00:00Z', checkpoint=checkpoints.chunks('lql_secrets'))
+    resumed_rows = [row for chunk_rows in resumed for row in chunk_rows]
+    assert queries.calls == 4
+    assert sorted((row['TIME'], row['HOSTNAME']) for row in resumed_rows) == \
+        sorted((row['TIME'], row['HOSTNAME']) for row in rows)
+
+
+def test_interrupted_search_resumes_from_last_page(tmp_path):
+    with MockLaceworkAPI(scale=1000, page_size=5) as api:
+        lacework_interface = mock_interface(api)
+        lacework_interface.checkpoints = FileCheckpointStore(directory=tmp_path).start()
+        executor = lacework_interface.request_executor
+        filters = {'filters': [{'field': 'severity', 'expression': 'eq', 'value': 'Critical'}]}
+        # the first run dies after three pages
+        first_run = executor.search(lacework_interface.lacework.vulnerabilities.hosts, filters,
+                                    checkpoint=lacework_interface.search_checkpoint('host_vulns', filters))
+        pages = [next(first_run) for _ in range(3)]
+        first_run.close()
+
+        api.reset_stats()
+        resumed = list(executor.search(lacework_interface.lacework.vulnerabilities.hosts, filters,
+                                       checkpoint=lacework_interface.search_checkpoint('host_vulns', filters)))
+        expected = [record for record in api.records['host_vulns'] if record['severity'] == 'Critical']
+        assert resumed[:3] == pages
+        assert sum(len(page['data']) for page in resumed) == len(expected)
+        # only the pages after the third one were requested again
+        assert api.get_stats()['requests'] == len(resumed) - 3
+
+
+def test_getter_results_are_reused_on_resume(tmp_path):
+    with MockLaceworkAPI(scale=500, page_size=100) as api:
+        lacework_interface = mock_interface(api)
+        checkpoints = FileCheckpointStore(directory=tmp_path).start()
+        lacework_interface.checkpoints = checkpoints
+        start_time = checkpoints.lacework_time('7:0').generate_time_string()
+        end_time = checkpoints.lacework_time('0:0').generate_time_string()
+        host_vulns = lacework_interface.get_host_vulns(start_time, end_time)
+        assert len(host_vulns.data) == len(expected_vulns(api, 'host_vulns'))
+
+        resumed_store = FileCheckpointStore(checkpoints.run_id, directory=tmp_path)
+        assert resumed_store.exists()
+        resumed_interface = mock_interface(api)
+        resumed_interface.checkpoints = resumed_store
+        assert resumed_store.lacework_time('7:0').generate_time_string() == start_time
+        resumed_host_vulns = resumed_interface.get_host_vulns(start_time, end_time)
+        assert len(resumed_host_vulns.data) == len(host_vulns.data)
+        assert api.get_stats()['requests'] == 0
+        resumed_store.delete()
+        assert not FileCheckpointStore(checkpoints.run_id, directory=tmp_path).exists()
@@ -0,0 +1,11 @@
+import subprocess
+import sys
+from pathlib import Path
+
+
+def test_cli_entry_point_does_not_import_pandas():
+    # --help and --list-reports only need the entry point's own imports, see benchmarks/import_time.py
+    code = "import sys, lw_report_gen; print(sorted({'pandas', 'plotly', 'numpy'} & set(sys.modules)))"
+    completed = subprocess.run([sys.executable, '-c', code], cwd=Path(__file__).parent.parent, capture_output=True,
+                               text=True, check=True)
+    assert completed.stdout.strip() == '[]'
@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from benchmarks.run_benchmarks import SyntheticLaceworkInterface, basedir
+from modules.delta import diff_findings
+from modules.reports.reportgen_delta import ReportGenDelta
+from modules.snapshots import find_latest_snapshot
+from modules.utils import LaceworkTime
+
+
+class SyntheticDeltaReport(ReportGenDelta):
+
+    def __init__(self, lacework_interface):
+        self._synthetic_interface = lacework_interface
+        super().__init__(basedir)
+
+    def connect(self, api_key_file=None):
+        self.lacework_interface = self._synthetic_interface
+
+
+def test_diff_findings():
+    previous = pd.DataFrame({'Hostname': ['a', 'a', 'b'], 'CVE': ['CVE-1', 'CVE-2', 'CVE-1'], 'Severity': 'High'})
+    current = pd.DataFrame({'Hostname': ['a', 'b', 'c'], 'CVE': ['CVE-1', 'CVE-1', 'CVE-2'], 'Severity': 'Critical'})
+    new, resolved = diff_findings(current, previous, ('Hostname', 'CVE'))
+    assert new.to_dict('records') == [{'Hostname': 'c', 'CVE': 'CVE-2', 'Severity': 'Critical'}]
+    assert resolved.to_dict('records') == [{'Hostname': 'a', 'CVE': 'CVE-2', 'Severity': 'High'}]
+    # the key is compared as a whole, not column by column
+    new, resolved = diff_findings(current[['CVE', 'Hostname']].rename(columns={'CVE': 'Hostname', 'Hostname': 'CVE'}),
+                                  current, ('Hostname', 'CVE'))
+    assert len(new) == len(resolved) == 3
+
+
+def test_delta_report_compares_with_previous_snapshot(tmp_path):
+    pytest.importorskip('pyarrow')
+    times = (LaceworkTime('7:0'), LaceworkTime('0:0'), LaceworkTime('7:0'), LaceworkTime('0:0'))
+    previous_interface = SyntheticLaceworkInterface(200)
+    previous_report = SyntheticDeltaReport(previous_interface)
+    previous_report.gather(*times)
+    assert previous_report.delta_data is False
+    assert 'There is no earlier assessment' in previous_report.render('Customer', 'Author')
+    previous_report.save_snapshot(tmp_path / 'week1', customer='Customer')
+    previous_report.save_snapshot(tmp_path / 'other', customer='Other Customer')
+
+    interface = SyntheticLaceworkInterface(200)
+    interface.host_vulns = interface.host_vulns[10:]
+    resolved_alert = interface.alerts.pop(0)
+    new_alert = {**resolved_alert, 'alertId': 1, 'severity': 'Critical'}
+    interface.alerts.append(new_alert)
+    report = SyntheticDeltaReport(interface)
+    report.gather(*times)
+    baseline = find_latest_snapshot(str(tmp_path), report='Delta', customer='Customer')
+    assert baseline == str(tmp_path / 'week1')
+    report.compare_to_snapshot(baseline)
+
+    delta_data = report.delta_data
+    assert list(delta_data['new_alerts']['Alert ID']) == [1]
+    assert delta_data['new_host_vulns'].empty
+    removed = previous_report.host_findings.merge(report.host_findings, how='left', indicator=True)
+    assert len(delta_data['resolved_host_vulns']) == (removed['_merge'] == 'left_only').sum()
+    assert delta_data['new_container_vulns'].empty and delta_data['fixed_compliance_violations'].empty
+    html = report.render('Customer', 'Author')
+    assert 'New Alerts' in html and 'New Container Vulnerabilities' not in html
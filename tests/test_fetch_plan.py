@@ -0,0 +1,50 @@
+import pytest
+
+from benchmarks.run_benchmarks import SyntheticLaceworkInterface
+from modules.fetch_plan import FetchPlan
+from modules.reportgen import SECTION_FETCH_NEEDS
+from modules.utils import LaceworkTime
+from tests.test_delta import SyntheticDeltaReport
+
+
+class RecordingLaceworkInterface(SyntheticLaceworkInterface):
+
+    def __init__(self, scale: int):
+        super().__init__(scale)
+        self.searches = []
+
+    def get_host_vulns(self, start_time, end_time, **kwargs):
+        self.searches.append(('host_vulns', start_time, end_time, kwargs['severities']))
+        return super().get_host_vulns(start_time, end_time, **kwargs)
+
+    def get_container_vulns(self, start_time, end_time, **kwargs):
+        self.searches.append(('container_vulns', start_time, end_time, kwargs['severities']))
+        return super().get_container_vulns(start_time, end_time, **kwargs)
+
+    def get_alerts(self, start_time, end_time, **kwargs):
+        self.searches.append(('alerts', start_time, end_time, kwargs['severities']))
+        return super().get_alerts(start_time, end_time, **kwargs)
+
+
+def test_fetch_plan_searches_each_source_once():
+    interface = RecordingLaceworkInterface(100)
+    windows = {'vulns': ('v0', 'v1'), 'alerts': ('a0', 'a1')}
+    plan = FetchPlan(interface, SECTION_FETCH_NEEDS, windows)
+    host_vulns = plan.get('host_vulns', 'v0', 'v1', ('Critical',))
+    assert plan.get('host_vulns', 'v0', 'v1', ('Low', 'Critical')) is host_vulns
+    plan.get('alerts', 'a0', 'a1', ('High',))
+    assert interface.searches == [('host_vulns', 'v0', 'v1', ('Critical', 'High', 'Medium', 'Low')),
+                                  ('alerts', 'a0', 'a1', ('Critical', 'High'))]
+    # severities no section declared are searched again rather than missing
+    plan.get('alerts', 'a0', 'a1', ('Medium',))
+    assert interface.searches[-1] == ('alerts', 'a0', 'a1', ('Critical', 'High', 'Medium'))
+    with pytest.raises(ValueError):
+        plan.get('compliance', 'v0', 'v1', ('Critical',))
+
+
+def test_delta_report_searches_only_compared_severities():
+    interface = RecordingLaceworkInterface(100)
+    report = SyntheticDeltaReport(interface)
+    report.gather(LaceworkTime('7:0'), LaceworkTime('0:0'), LaceworkTime('7:0'), LaceworkTime('0:0'))
+    assert sorted(source for source, *_ in interface.searches) == ['alerts', 'container_vulns', 'host_vulns']
+    assert {severities for *_, severities in interface.searches} == {('Critical', 'High')}
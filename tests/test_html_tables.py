@@ -0,0 +1,55 @@
+import jinja2
+import numpy as np
+import pandas as pd
+
+from modules.html_tables import generate_table, html_table
+
+
+def make_table(rows):
+    return pd.DataFrame({'Hostname': [f'host-{i}' for i in range(rows)],
+                         'CVE': [f'CVE-2024-{i}\nCVE-2023-{i}' for i in range(rows)],
+                         'Count': list(range(rows))})
+
+
+def test_chunked_table_matches_to_html():
+    df = make_table(1234)
+    chunks = list(generate_table(df, index=False, chunk_rows=100))
+    assert len(chunks) == 14
+    assert ''.join(chunks) == df.to_html(index=False)
+    assert ''.join(generate_table(df, chunk_rows=100, newlines_to_br=True)) == df.to_html().replace("\\n", "<br>")
+
+
+def test_chunks_format_values_as_the_whole_table():
+    df = make_table(40)
+    # the decimals of a float column and the time of a datetime column are shown as needed by any of their values
+    df['Score'] = [1.5, 2.25, np.nan, 10.0] * 10
+    df['Seen'] = pd.to_datetime(['2024-01-01', '2024-01-02 10:30', None, '2024-01-03'] * 10)
+    assert ''.join(generate_table(df, index=False, chunk_rows=3)) == df.to_html(index=False)
+    paged = ''.join(generate_table(df, index=False, page_rows=4, chunk_rows=4))
+    assert paged.count('<td>1.50</td>') == 10
+    assert paged.count('<td>2024-01-01 00:00:00</td>') == 10
+
+
+def test_table_truncation_and_pages():
+    df = make_table(250)
+    truncated = ''.join(generate_table(df, max_rows=100))
+    assert truncated.count('<tr>') == 100
+    assert 'Showing the first 100 of 250 rows.' in truncated
+    paged = ''.join(generate_table(df, page_rows=100, chunk_rows=30))
+    assert paged.count('<table') == 3
+    assert paged.count('<thead>') == 3
+    assert paged.count('<tr>') == 250
+    # an empty table is written with its header
+    empty = make_table(0)
+    assert ''.join(generate_table(empty, page_rows=100)) == empty.to_html()
+
+
+def test_html_table_filter_streams_with_section_options():
+    env = jinja2.Environment(autoescape=True)
+    env.filters['html_table'] = html_table
+    template = env.from_string("{% for chunk in df | html_table(index=False, section='alerts') %}{{ chunk }}{% endfor %}")
+    df = make_table(40)
+    assert template.render(df=df, table_options={}) == df.to_html(index=False)
+    chunks = list(template.generate(df=df, table_options={'alerts': {'max_rows': 10, 'chunk_rows': 5}}))
+    assert len(chunks) == 4
+    assert ''.join(chunks).count('<tr>') == 10
@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import pytest
+
+from modules.instrumentation import Tracer, NOOP_SPAN, traced, tracer
+
+
+def run_chunk(test_tracer, parent_span):
+    with test_tracer.span('chunk', category='api', parent=parent_span):
+        pass
+
+
+def test_spans_nest_and_count():
+    test_tracer = Tracer()
+    test_tracer.enable()
+    with test_tracer.span('gather', category='gather', window='7d') as gather_span:
+        with test_tracer.span('fetch', category='api') as fetch_span:
+            test_tracer.current_span().add('pages')
+            test_tracer.current_span().add('records', 500)
+            test_tracer.current_span().add('records', 250)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(run_chunk, test_tracer, gather_span).result()
+    spans = {span['name']: span for span in test_tracer.to_dict()['spans']}
+    assert spans['fetch']['parent_id'] == spans['gather']['id']
+    assert spans['fetch']['counters'] == {'pages': 1, 'records': 750}
+    assert spans['gather']['attributes'] == {'window': '7d'}
+    assert spans['gather']['wall_s'] >= spans['fetch']['wall_s']
+    assert spans['chunk']['parent_id'] == spans['gather']['id']
+    assert spans['chunk']['thread'] != spans['gather']['thread']
+    assert fetch_span.span_id != gather_span.span_id
+
+
+def test_span_records_errors_and_exports_chrome_trace(tmp_path):
+    test_tracer = Tracer()
+    test_tracer.enable()
+    with pytest.raises(ValueError):
+        with test_tracer.span('render', category='render'):
+            raise ValueError('template failed')
+    trace_file = tmp_path / 'trace.json'
+    test_tracer.export(str(trace_file), trace_format='chrome')
+    events = json.loads(trace_file.read_text())['traceEvents']
+    complete_events = [event for event in events if event['ph'] == 'X']
+    assert complete_events[0]['name'] == 'render'
+    assert complete_events[0]['args']['error'] == 'ValueError: template failed'
+
+
+def test_tracing_disabled_by_default():
+    @traced(category='model')
+    def transform():
+        return tracer.current_span()
+
+    assert not tracer.enabled
+    assert transform() is NOOP_SPAN
+    assert tracer.to_dict()['spans'] == []
+
+
+class UnreadResponse:
+    @property
+    def content(self):
+        raise AssertionError('the response body was read')
+
+
+def test_http_responses_not_read_while_disabled():
+    test_tracer = Tracer()
+    test_tracer.record_http_response(UnreadResponse())
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from benchmarks.synthetic_data import container_vulns
+from modules import json_decode
+from modules.container_vulnerabilities import ContainerVulnerabilities
+from modules.json_decode import decode_json
+
+page = {'paging': {'urls': {'nextPage': None}}, 'data': container_vulns(50)}
+content = json.dumps(page).encode()
+
+
+def test_pages_decode_to_the_model_fields():
+    pytest.importorskip('msgspec')
+    decoded = decode_json(content, ContainerVulnerabilities.fields)
+    assert decoded['paging'] == page['paging']
+    assert set(decoded['data'][0]) == {'imageId', 'severity', 'vulnId', 'evalCtx', 'featureKey', 'fixInfo'}
+    assert set(decoded['data'][0]['evalCtx']['image_info']) == {'repo', 'tags'}
+    assert ContainerVulnerabilities(decoded['data']).data == ContainerVulnerabilities(page['data']).data
+    # a record that does not match the schema, the page is decoded as a whole by the json module
+    unexpected = json.dumps({'data': [{'evalCtx': 'not an object'}] + page['data']}).encode()
+    assert decode_json(unexpected, ContainerVulnerabilities.fields) == json.loads(unexpected)
+    with pytest.raises(json.JSONDecodeError):
+        decode_json(content[:-10], ContainerVulnerabilities.fields)
+
+
+def test_decoding_without_optional_decoders(monkeypatch):
+    monkeypatch.setattr(json_decode, 'optional_module', lambda name: None)
+    json_decode.page_decoder.cache_clear()
+    try:
+        assert decode_json(content, ContainerVulnerabilities.fields) == page
+    finally:
+        json_decode.page_decoder.cache_clear()
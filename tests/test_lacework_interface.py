@@ -1,12 +1,18 @@
 from modules.lacework_interface import LaceworkInterface
-from modules.reportgen import ReportGen
+from modules.utils import LaceworkTime
+from pathlib import Path
 import os
+import pytest
 
-basedir = os.path.dirname(os.path.abspath(__file__))
-rg = ReportGen(basedir)
-now = rg.generate_time_string()
-minus_25h = rg.generate_time_string(hours=25)
-minus_7d = rg.generate_time_string(days=7)
+now = LaceworkTime('0:0').generate_time_string()
+minus_25h = LaceworkTime('1:1').generate_time_string()
+minus_7d = LaceworkTime('7:0').generate_time_string()
+
+# these tests run against a live Lacework tenant
+lacework_credentials_exist = Path(str(Path.home()) + '/.lacework.toml').exists() or \
+    (bool(os.environ.get('LW_ACCOUNT')) and bool(os.environ.get('LW_API_KEY')) and
+     bool(os.environ.get('LW_API_SECRET'))) or bool(os.environ.get('LW_API_TOKEN'))
+pytestmark = pytest.mark.skipif(not lacework_credentials_exist, reason="Lacework API credentials are not configured")
 
 
 def test_lacework_interface_reports():
@@ -35,4 +41,3 @@ def test_lacework_interface_host_vulns():
 
 
 
-
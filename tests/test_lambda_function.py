@@ -0,0 +1,123 @@
+import io
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from benchmarks.run_benchmarks import basedir
+from modules import lacework_interface as lacework_interface_module
+from modules.lacework_interface import clear_lacework_clients
+
+try:
+    import lambda_function
+except (ImportError, OSError) as e:
+    # weasyprint needs the pango system libraries
+    pytest.skip(f'The lambda dependencies are not installed: {e}', allow_module_level=True)
+
+
+def tenant_client(account, api_key, api_secret, subaccount=None):
+    return SimpleNamespace(account=account, subaccount=subaccount,
+                           _session=SimpleNamespace(_session=requests.Session(), _base_url=f'https://{account}.lacework.net'))
+
+
+def test_warm_invocations_connect_to_their_own_tenant(monkeypatch, tmp_path):
+    monkeypatch.setattr(lacework_interface_module, 'LaceworkClient', tenant_client)
+    monkeypatch.setattr(lambda_function, '_report_generator', None)
+    monkeypatch.setenv('HOME', str(tmp_path))
+    clear_lacework_clients()
+    try:
+        clients = []
+        for tenant in ('tenant-a', 'tenant-b'):
+            # the LW_* variables left behind by another invocation are not used
+            monkeypatch.setenv('LW_ACCOUNT', 'previous-tenant')
+            monkeypatch.setenv('LW_API_KEY', 'PREVIOUS_KEY')
+            monkeypatch.setenv('LW_API_SECRET', 'previous_secret')
+            event = {'lacework_instance': f'{tenant}.lacework.net', 'key': f'{tenant}-key', 'secret': f'{tenant}-secret'}
+            report_gen = lambda_function.get_report_generator(basedir, lambda_function.lacework_api_key_file(event))
+            clients.append(report_gen.lacework_interface.lacework)
+        assert [client.account for client in clients] == ['tenant-a', 'tenant-b']
+        assert lambda_function.lacework_api_key_file({'lacework_instance': 'tenant-a.lacework.net', 'key': 'k',
+                                                      'secret': 's', 'lacework_subaccount': 'sub'})['subAccount'] == 'sub'
+    finally:
+        clear_lacework_clients()
+
+
+class BucketS3:
+    exceptions = SimpleNamespace(NoSuchKey=KeyError)
+
+    def __init__(self):
+        self.objects = {}
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = Body
+
+
+def test_checkpoints_are_opt_in_and_resumed_by_their_customer():
+    s3 = BucketS3()
+    event = {'lacework_instance': 'tenant-a.lacework.net', 'key': 'key', 'secret': 'secret', 'customer': 'Customer A'}
+    api_key_file = lambda_function.lacework_api_key_file(event)
+    assert lambda_function.get_checkpoints(s3, 'bucket', event, api_key_file) is None
+    assert s3.objects == {}
+    with pytest.raises(ValueError):
+        lambda_function.get_checkpoints(s3, 'bucket', {**event, 'run_id': 'earlier-run'}, api_key_file)
+
+    started = lambda_function.get_checkpoints(s3, 'bucket', {**event, 'checkpoint': True}, api_key_file)
+    resume = {**event, 'checkpoint': True, 'run_id': started.run_id}
+    resumed = lambda_function.get_checkpoints(s3, 'bucket', resume, api_key_file)
+    assert resumed.reference_time == started.reference_time
+    # the run of one customer is never resumed for another
+    other_customer = {**resume, 'customer': 'Customer B'}
+    with pytest.raises(ValueError):
+        lambda_function.get_checkpoints(s3, 'bucket', other_customer, api_key_file)
+    other_account = {**resume, 'lacework_instance': 'tenant-b.lacework.net'}
+    with pytest.raises(ValueError):
+        lambda_function.get_checkpoints(s3, 'bucket', other_account, lambda_function.lacework_api_key_file(other_account))
+
+
+class MemorySink(io.BytesIO):
+    location = 'memory'
+    response = 'uploaded'
+
+    def __exit__(self, *exc_info):
+        # kept open to read what was written
+        pass
+
+
+class RecordingReport:
+    def __init__(self, calls):
+        self.calls = calls
+        self.assets = SimpleNamespace(mode='embedded')
+
+    def render_to(self, sink, customer, author, **kwargs):
+        self.calls.append(('render', self.assets.mode, kwargs.get('pdf', False)))
+        if isinstance(sink, str):
+            with open(sink, 'w') as html_file:
+                html_file.write('<html></html>')
+        else:
+            sink.write(b'<html></html>')
+
+
+def test_the_pdf_is_rendered_with_external_assets(monkeypatch):
+    import weasyprint
+    calls = []
+
+    class RecordingHTML:
+        def __init__(self, filename, encoding):
+            calls.append(('read', filename.endswith('.html')))
+
+        def write_pdf(self, target, font_config=None):
+            target.write(b'%PDF')
+
+    monkeypatch.setattr(weasyprint, 'HTML', RecordingHTML)
+    monkeypatch.setattr(lambda_function, 'get_font_config', lambda: None)
+    report_gen = RecordingReport(calls)
+    html_sink, pdf_sink = MemorySink(), MemorySink()
+    assert lambda_function.write_html_report(report_gen, 'Customer A', html_sink) == 'uploaded'
+    assert lambda_function.write_pdf_report(report_gen, 'Customer A', pdf_sink) == 'uploaded'
+    # the standalone html embeds its images, weasyprint reads them from files next to the html it renders
+    assert calls == [('render', 'embedded', False), ('render', 'external', True), ('read', True)]
+    assert html_sink.getvalue() == b'<html></html>'
+    assert pdf_sink.getvalue() == b'%PDF'
@@ -0,0 +1,114 @@
+import os
+from datetime import timedelta
+
+import pytest
+import requests
+from laceworksdk.exceptions import ApiError
+
+from modules.lql import LQLDataset, LQLExecutor, parse_lacework_time
+from modules.secrets import Secrets
+from modules.datasets.ssh_private_keys import SSHPrivateKeys
+from modules.utils import get_available_datasets
+
+query = "{source { LW_HE_SECRETS_SSH_PRIVATE_KEYS } return {HOSTNAME, FILE_PATH, SSH_KEY_TYPE} }"
+
+
+class FakeQueries:
+
+    def __init__(self, rows, max_rows=None, fail_longer_than=None, error=None):
+        self.rows = rows
+        self.max_rows = max_rows
+        self.fail_longer_than = fail_longer_than
+        self.error = error
+        self.calls = 0
+
+    def execute(self, query_text=None, arguments=None):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        start = parse_lacework_time(arguments['StartTimeRange'])
+        end = parse_lacework_time(arguments['EndTimeRange'])
+        if self.fail_longer_than and end - start > self.fail_longer_than:
+            raise TimeoutError('query timed out')
+        data = [row for row in self.rows if start <= parse_lacework_time(row['TIME']) < end]
+        if self.max_rows:
+            data = data[:self.max_rows]
+        return {'data': data}
+
+
+class FakeLacework:
+
+    def __init__(self, queries):
+        self.queries = queries
+
+
+def make_rows(count, hosts=10):
+    return [{'TIME': f'2024-01-0{1 + i % 7}T{i % 24:02d}:00:00Z',
+             'HOSTNAME': f'host-{i % hosts}',
+             'FILE_PATH': f'/home/user{i % 3}/.ssh/id_rsa',
+             'SSH_KEY_TYPE': 'RSA'} for i in range(count)]
+
+
+def run_secrets(lacework, **kwargs):
+    secrets = Secrets({'data': []})
+    for rows in LQLExecutor(lacework, **kwargs).execute(query, '2024-01-01T00:00:00Z', '2024-01-08T00:00:00Z'):
+        secrets.add_rows(rows)
+    return secrets
+
+
+def test_lql_executor_deduplicates_across_chunks():
+    rows = make_rows(200)
+    secrets = run_secrets(FakeLacework(FakeQueries(rows)))
+    expected = {(row['HOSTNAME'], row['FILE_PATH']) for row in rows}
+    assert secrets.count_secrets() == len(expected)
+
+
+def test_lql_executor_splits_chunks_at_row_limit():
+    rows = make_rows(100, hosts=100)
+    queries = FakeQueries(rows, max_rows=10)
+    secrets = run_secrets(FakeLacework(queries), max_rows=10, min_chunk=timedelta(minutes=30))
+    assert secrets.count_secrets() == len({(row['HOSTNAME'], row['FILE_PATH']) for row in rows})
+    assert queries.calls > 7
+
+
+def test_lql_executor_splits_failed_chunks():
+    rows = make_rows(50, hosts=50)
+    queries = FakeQueries(rows, fail_longer_than=timedelta(hours=6))
+    secrets = run_secrets(FakeLacework(queries))
+    assert secrets.count_secrets() == len({(row['HOSTNAME'], row['FILE_PATH']) for row in rows})
+
+
+def api_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = b'{"message": "rejected"}'
+    response.url = 'https://mock.lacework.net/api/v2/Queries/execute'
+    response.request = requests.Request('POST', response.url).prepare()
+    return ApiError(response)
+
+
+def test_lql_executor_raises_query_errors_without_splitting():
+    for status_code in (400, 401, 403):
+        queries = FakeQueries(make_rows(10), error=api_error(status_code))
+        with pytest.raises(ApiError):
+            run_secrets(FakeLacework(queries), max_workers=1, chunk_size=timedelta(days=7))
+        assert queries.calls == 1
+
+
+def test_available_datasets_are_discovered():
+    basedir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    available_datasets = get_available_datasets(basedir)
+    assert available_datasets['ssh_private_keys'] is SSHPrivateKeys
+    dataset = SSHPrivateKeys()
+    model = dataset.create_model()
+    model.add_rows(dataset.project(make_rows(20, hosts=2)))
+    assert model.count_secrets() == 6
+    assert 'TIME' not in model.data[0]
+
+
+def test_datasets_implement_process():
+    class Unprocessed(LQLDataset):
+        dataset_name = 'unprocessed'
+
+    with pytest.raises(TypeError):
+        Unprocessed()
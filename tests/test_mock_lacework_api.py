@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import os
+from types import SimpleNamespace
+
+from benchmarks.mock_lacework_api import MockLaceworkAPI
+from modules import lacework_interface as lacework_interface_module
+from modules.host_vulnerabilities import HostVulnerabilities
+from modules.lacework_interface import (LaceworkInterface, clear_lacework_clients, get_lacework_client,
+                                        severity_search_filters)
+from modules.request_executor import RetryPolicy
+from modules.utils import LaceworkTime
+
+start_time = LaceworkTime('7:0').generate_time_string()
+end_time = LaceworkTime('0:0').generate_time_string()
+
+
+def test_lacework_interface_pages_through_mock_api():
+    with MockLaceworkAPI(scale=1000, page_size=50) as api:
+        lacework_interface = LaceworkInterface(lacework_client=api.client())
+        api.reset_stats()
+        host_vulns = lacework_interface.get_host_vulns(start_time, end_time)
+        expected = [record for record in api.records['host_vulns'] if record['severity'] in ("Critical", "High", "Medium")]
+        assert len(host_vulns.data) == len(expected)
+        stats = api.get_stats()
+        assert stats['by_endpoint']['host_vulns_search'] == 3
+        assert stats['by_endpoint']['next_page'] > 3
+
+        compliance = lacework_interface.get_compliance_reports(cloud_provider='AZURE')
+        assert len(compliance.reports) == 3
+        secrets = lacework_interface.get_secrets(start_time, end_time)
+        assert secrets.count_secrets() > 0
+
+
+def test_mock_api_page_cap_and_injected_errors():
+    with MockLaceworkAPI(scale=1000, page_size=10, max_pages=2, error_rate=0.2) as api:
+        lacework_interface = LaceworkInterface(lacework_client=api.client())
+        lacework_interface.request_executor.policies['default'] = RetryPolicy(initial_wait=0.01, max_wait=0.05)
+        lacework_interface.request_executor.policies['search'] = RetryPolicy(initial_wait=0.01, max_wait=0.05)
+        lacework_interface.request_executor.policies['next_page'] = RetryPolicy(initial_wait=0.01, max_wait=0.05)
+        api.reset_stats()
+        host_vulns = lacework_interface.get_host_vulns(start_time, end_time)
+        # three severities, each truncated at two pages of ten records
+        assert len(host_vulns.data) == 60
+        stats = api.get_stats()
+        assert stats['injected_errors'] > 0
+        assert stats['by_status']['503'] == stats['injected_errors']
+
+
+def test_lacework_clients_are_pooled_by_api_key(monkeypatch):
+    with MockLaceworkAPI(scale=100, page_size=50) as api:
+        monkeypatch.setattr(lacework_interface_module, 'LaceworkClient',
+                            lambda subaccount=None, **credentials: api.client(subaccount=subaccount))
+        api_key_file = {'account': 'mock', 'keyId': 'MOCK_KEY_ID', 'secret': '_mock_secret'}
+        clear_lacework_clients()
+        api.reset_stats()
+        try:
+            def get_alerts(_):
+                return LaceworkInterface(api_key_file=api_key_file).get_alerts(start_time, end_time).count_alerts()
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                alert_counts = list(pool.map(get_alerts, range(8)))
+            assert len(set(alert_counts)) == 1
+            # one access token for all of them, another for a subaccount
+            assert api.get_stats()['by_endpoint']['access_tokens'] == 1
+            first, second = LaceworkInterface(api_key_file=api_key_file), LaceworkInterface(api_key_file=api_key_file)
+            assert first.lacework is second.lacework
+            subaccount = LaceworkInterface(api_key_file={**api_key_file, 'subAccount': 'other'})
+            assert subaccount.lacework is not first.lacework
+            assert api.get_stats()['by_endpoint']['access_tokens'] == 2
+            # an expired token is renewed by one of the threads using it
+            first.lacework._session._access_token_expiry = datetime(2000, 1, 1, tzinfo=timezone.utc)
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                list(pool.map(get_alerts, range(8)))
+            assert api.get_stats()['by_endpoint']['access_tokens'] == 3
+        finally:
+            clear_lacework_clients()
+
+
+def test_lacework_clients_of_environment_credentials_follow_the_environment(monkeypatch, tmp_path):
+    def environment_client(**arguments):
+        # as LaceworkClient(), the credentials are read from the environment when it is created
+        return SimpleNamespace(account=os.environ['LW_ACCOUNT'],
+                               _session=SimpleNamespace(_session=SimpleNamespace(close=lambda: None)))
+    monkeypatch.setattr(lacework_interface_module, 'LaceworkClient', environment_client)
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('LW_API_KEY', 'KEY')
+    monkeypatch.setenv('LW_API_SECRET', 'secret')
+    clear_lacework_clients()
+    try:
+        monkeypatch.setenv('LW_ACCOUNT', 'tenant-a')
+        tenant_a = get_lacework_client()
+        monkeypatch.setenv('LW_ACCOUNT', 'tenant-b')
+        tenant_b = get_lacework_client()
+        assert (tenant_a.account, tenant_b.account) == ('tenant-a', 'tenant-b')
+        monkeypatch.setenv('LW_ACCOUNT', 'tenant-a')
+        assert get_lacework_client() is tenant_a
+    finally:
+        clear_lacework_clients()
+
+
+def test_vulnerability_searches_request_only_model_fields():
+    assert HostVulnerabilities.returns == ['mid', 'severity', 'vulnId', 'evalCtx', 'featureKey', 'fixInfo']
+    with MockLaceworkAPI(scale=1000, page_size=100) as api:
+        lacework_interface = LaceworkInterface(lacework_client=api.client())
+        api.reset_stats()
+        host_vulns = lacework_interface.get_host_vulns(start_time, end_time)
+        projected_bytes = api.get_stats()['bytes_served']
+        full_records = HostVulnerabilities([])
+        api.reset_stats()
+        for severity in ("Critical", "High", "Medium"):
+            for page in lacework_interface.request_executor.search(lacework_interface.lacework.vulnerabilities.hosts,
+                                                                   severity_search_filters(start_time, end_time, severity)):
+                full_records.add_records(page['data'])
+        assert host_vulns.data == full_records.data
+        assert projected_bytes < api.get_stats()['bytes_served'] / 2
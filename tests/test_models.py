@@ -0,0 +1,89 @@
+import pandas as pd
+
+from benchmarks import synthetic_data
+from modules import partitioned
+from modules.alerts import Alerts
+from modules.compliance import Compliance
+from modules.container_vulnerabilities import ContainerVulnerabilities
+from modules.host_vulnerabilities import HostVulnerabilities
+from modules.secrets import Secrets
+
+
+def test_host_vulnerabilities_models():
+    raw_data = synthetic_data.host_vulns(2000, hosts=40)
+    host_vulns = HostVulnerabilities(raw_data)
+    assert host_vulns.total_evaluated() == len({record['mid'] for record in raw_data})
+    summary_by_host = host_vulns.summary_by_host(limit=25)
+    assert list(summary_by_host.columns) == ['Hostname', 'Severity Count']
+    assert len(summary_by_host) == 25
+    summary = host_vulns.summary()
+    assert list(summary['Severity']) == ["Critical", "High", "Medium", "Low"]
+    assert summary['Total CVEs'].sum() == len([r for r in raw_data if r['severity'] != 'Info'])
+    fixable = host_vulns.fixable_vulns(severities=["Critical"])
+    assert set(fixable['Severity']) == {"Critical"}
+
+
+def test_container_vulnerabilities_models():
+    raw_data = synthetic_data.container_vulns(2000, images=30)
+    container_vulns = ContainerVulnerabilities(raw_data)
+    assert container_vulns.total_evaluated() == len({record['imageId'] for record in raw_data})
+    summary_by_image = container_vulns.summary_by_image(limit=25)
+    assert list(summary_by_image.columns) == ['Repository / Tag', 'CVE Count', 'Image ID']
+    assert len(summary_by_image) == 25
+    assert list(container_vulns.summary()['Severity']) == ["Critical", "High", "Medium", "Low"]
+    assert not container_vulns.summary_by_package().empty
+    assert set(container_vulns.fixable_vulns(severities=['Critical'])['Severity']) == {"Critical"}
+
+
+def test_alerts_compliance_and_secrets_models():
+    alerts = Alerts(synthetic_data.alerts(300))
+    processed_alerts = alerts.processed_alerts(limit=25)
+    assert len(processed_alerts) <= 25
+    assert set(processed_alerts['Severity']).issubset({"Critical", "High"})
+
+    compliance = Compliance(synthetic_data.compliance(500, accounts=5))
+    assert compliance.get_total_accounts_evaluated() == 5
+    assert len(compliance.get_summary_by_account()) == 5
+    assert not compliance.get_compliance_details().empty
+
+    secrets = Secrets(synthetic_data.secrets(100))
+    assert secrets.count_secrets() == len(secrets.processed_secrets())
+
+
+def test_vulnerability_records_keep_only_read_fields():
+    raw_data = synthetic_data.host_vulns(100, hosts=5)
+    host_vulns = HostVulnerabilities(raw_data[:50])
+    host_vulns.add_records(raw_data[50:])
+    assert len(host_vulns.records) == 100
+    record = host_vulns.data[0]
+    assert 'cveProps' not in record
+    assert record['evalCtx'] == {'hostname': raw_data[0]['evalCtx']['hostname']}
+    assert record['fixInfo'] == raw_data[0]['fixInfo']
+
+    raw_data = synthetic_data.container_vulns(100, images=5)
+    container_vulns = ContainerVulnerabilities(raw_data)
+    assert container_vulns.data[0]['evalCtx']['image_info']['tags'] == raw_data[0]['evalCtx']['image_info']['tags']
+    # strings repeated across records are stored once
+    image_ids = container_vulns.records.columns['imageId']
+    assert len({id(image_id) for image_id in image_ids}) == len(set(image_ids))
+
+
+def test_partitioned_aggregations_match_single_process(monkeypatch):
+    monkeypatch.setattr(partitioned, 'PARTITIONED_MIN_ROWS', 0)
+    host_vulns = HostVulnerabilities(synthetic_data.host_vulns(3000, hosts=50))
+    partitioned_host_vulns = HostVulnerabilities(synthetic_data.host_vulns(3000, hosts=50), workers=3)
+    pd.testing.assert_frame_equal(partitioned_host_vulns.summary_by_host(), host_vulns.summary_by_host())
+    pd.testing.assert_frame_equal(partitioned_host_vulns.fixable_vulns(), host_vulns.fixable_vulns())
+
+    container_vulns = ContainerVulnerabilities(synthetic_data.container_vulns(3000, images=40))
+    partitioned_container_vulns = ContainerVulnerabilities(synthetic_data.container_vulns(3000, images=40), workers=3)
+    pd.testing.assert_frame_equal(partitioned_container_vulns.summary_by_image(), container_vulns.summary_by_image())
+    pd.testing.assert_frame_equal(partitioned_container_vulns.fixable_vulns(), container_vulns.fixable_vulns())
+
+
+def test_limited_summaries_match_full_summaries():
+    host_vulns = HostVulnerabilities(synthetic_data.host_vulns(5000, hosts=300))
+    pd.testing.assert_frame_equal(host_vulns.summary_by_host(limit=25), host_vulns.summary_by_host().head(25))
+    container_vulns = ContainerVulnerabilities(synthetic_data.container_vulns(5000, images=200))
+    pd.testing.assert_frame_equal(container_vulns.summary_by_image(limit=25),
+                                  container_vulns.summary_by_image().head(25))
@@ -0,0 +1,87 @@
+import pytest
+from modules.output_sinks import FileSink, S3MultipartSink, S3_MIN_PART_SIZE
+
+
+class LocalS3:
+    '''Minimal in-memory stand-in for the boto3 S3 client calls used by S3MultipartSink.'''
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.put_object_calls = 0
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.put_object_calls += 1
+        self.objects[(Bucket, Key)] = bytes(Body)
+        return {'ETag': 'single'}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = f'upload-{len(self.uploads) + 1}'
+        self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = bytes(Body)
+        return {'ETag': f'etag-{PartNumber}'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.objects[(Bucket, Key)] = b''.join(parts[part['PartNumber']] for part in MultipartUpload['Parts'])
+        return {'ETag': 'multipart'}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+
+
+def test_s3_sink_small_object_uses_put_object():
+    s3 = LocalS3()
+    with S3MultipartSink(s3, 'bucket', 'report.html', 'text/html') as sink:
+        sink.write('<html></html>')
+    assert s3.objects[('bucket', 'report.html')] == b'<html></html>'
+    assert s3.put_object_calls == 1
+
+
+def test_s3_sink_streams_multipart_parts():
+    s3 = LocalS3()
+    chunk = b'x' * (1024 * 1024)
+    with S3MultipartSink(s3, 'bucket', 'report.pdf', part_size=S3_MIN_PART_SIZE) as sink:
+        for _ in range(12):
+            sink.write(chunk)
+        assert len(sink._buffer) < S3_MIN_PART_SIZE
+    assert s3.objects[('bucket', 'report.pdf')] == chunk * 12
+    assert s3.put_object_calls == 0
+    assert sink.response == {'ETag': 'multipart'}
+
+
+def test_s3_sink_aborts_on_error():
+    s3 = LocalS3()
+    with pytest.raises(RuntimeError):
+        with S3MultipartSink(s3, 'bucket', 'report.pdf', part_size=S3_MIN_PART_SIZE) as sink:
+            sink.write(b'x' * (S3_MIN_PART_SIZE + 1))
+            raise RuntimeError('render failed')
+    assert ('bucket', 'report.pdf') not in s3.objects
+    assert s3.uploads == {}
+
+
+def test_s3_sink_cancelled_while_written():
+    s3 = LocalS3()
+    with pytest.raises(RuntimeError):
+        with S3MultipartSink(s3, 'bucket', 'report.pdf', part_size=S3_MIN_PART_SIZE) as sink:
+            sink.write(b'x' * (S3_MIN_PART_SIZE + 1))
+            sink.cancel()
+            sink.write(b'x')
+    assert s3.uploads == {}
+    # cancelled after its last write, the upload is aborted rather than completed
+    with S3MultipartSink(s3, 'bucket', 'report.pdf', part_size=S3_MIN_PART_SIZE) as sink:
+        sink.write(b'x' * (S3_MIN_PART_SIZE + 1))
+        sink.cancel()
+    assert ('bucket', 'report.pdf') not in s3.objects
+    assert s3.uploads == {}
+
+
+def test_file_sink(tmp_path):
+    path = tmp_path / 'report.html'
+    with FileSink(path) as sink:
+        sink.write('héllo ')
+        sink.write(b'world')
+    assert path.read_bytes() == 'héllo world'.encode('utf-8')
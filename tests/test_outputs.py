@@ -0,0 +1,54 @@
+import pytest
+
+from benchmarks.run_benchmarks import SyntheticLaceworkInterface, SyntheticReport, basedir
+from modules.outputs import ReportOutput, get_graph_scale, get_outputs, write_outputs
+from modules.reports.reportgen_csa_detailed import ReportGenCSADetailed
+from modules.results_store import ResultsStore
+from modules.utils import LaceworkTime
+
+
+def test_outputs_of_formats_and_page_sizes(tmp_path):
+    outputs = get_outputs(['HTML', 'PDF'], str(tmp_path / 'report'), page_sizes=['a2', 'a3'])
+    assert [(output.report_format, output.path, output.pagesize) for output in outputs] == \
+        [('HTML', str(tmp_path / 'report.html'), None),
+         ('PDF', str(tmp_path / 'report_a2.pdf'), 'a2'),
+         ('PDF', str(tmp_path / 'report_a3.pdf'), 'a3')]
+    assert get_outputs(['PDF'], 'report')[0].path == 'report.pdf'
+    external = get_outputs(['HTML'], str(tmp_path / 'report'), asset_mode='external')[0]
+    assert external.path == str(tmp_path / 'report' / 'report.html')
+    # charts are drawn once, the PDFs of a run writing HTML too show them scaled up
+    assert get_graph_scale(['HTML', 'PDF']) == 1
+    assert outputs[1].chart_scale(1) == 1.4
+    assert outputs[1].chart_scale(get_graph_scale(['PDF'])) == 1
+
+
+def test_outputs_written_by_workers_match(tmp_path):
+    pytest.importorskip('pyarrow')
+    pytest.importorskip('kaleido')
+    gathered = SyntheticReport(SyntheticLaceworkInterface(300))
+    gathered.gather(LaceworkTime('7:0'), LaceworkTime('0:0'), LaceworkTime('7:0'), LaceworkTime('0:0'))
+    gathered.save_snapshot(tmp_path / 'snapshot')
+    report = ReportGenCSADetailed(basedir)
+    report.load_snapshot(tmp_path / 'snapshot')
+    # trends are set after the snapshot is loaded, the workers render them too
+    store = ResultsStore(str(tmp_path / 'results.sqlite'))
+    for _ in range(2):
+        report.record_results(store, 'Customer')
+    report.trend_data = report.gather_trend_data(store, 'Customer')
+    store.close()
+
+    outputs = [ReportOutput('HTML', str(tmp_path / 'embedded.html')),
+               ReportOutput('HTML', str(tmp_path / 'external' / 'report.html'), asset_mode='external')]
+    (tmp_path / 'external').mkdir()
+    write_outputs(report, outputs, 'Customer', 'Author')
+
+    embedded = (tmp_path / 'embedded.html').read_text(encoding='utf-8')
+    # the trend line graph is one more chart
+    assert embedded.count("<img src='data:image/svg+xml") == 5
+    assert 'Trends Since' in embedded
+    external = (tmp_path / 'external' / 'report.html').read_text(encoding='utf-8')
+    assert "<img src='data:image" not in external
+    assert len(list((tmp_path / 'external' / 'assets').iterdir())) == 7
+    # the workers wrote what the report renders in this process
+    report.assets.mode = 'embedded'
+    assert embedded == report.render('Customer', 'Author')
@@ -0,0 +1,38 @@
+import io
+
+import pytest
+
+from benchmarks.run_benchmarks import SyntheticLaceworkInterface, SyntheticReport
+from modules.output_sinks import OutputSink
+from modules.utils import LaceworkTime
+
+pytest.importorskip('kaleido')
+
+
+class MemorySink(OutputSink):
+
+    def __init__(self):
+        super().__init__()
+        self.buffer = io.BytesIO()
+        self.writes = 0
+
+    def _write_bytes(self, data: bytes):
+        self.writes += 1
+        self.buffer.write(data)
+
+
+def test_render_to_streams_the_rendered_report(tmp_path):
+    report = SyntheticReport(SyntheticLaceworkInterface(200))
+    report.gather(LaceworkTime('7:0'), LaceworkTime('0:0'), LaceworkTime('7:0'), LaceworkTime('0:0'))
+    # the charts are rendered once by gather, only the date differs between renders
+    report.get_current_date = lambda: 'DATE'
+    expected = report.render('Customer', 'Author', pagesize='a2', pdf=True)
+
+    report.render_to(tmp_path / 'report.html', 'Customer', 'Author', pagesize='a2', pdf=True)
+    assert (tmp_path / 'report.html').read_text(encoding='utf-8') == expected
+
+    sink = MemorySink()
+    with sink:
+        report.render_to(sink, 'Customer', 'Author', pagesize='a2', pdf=True)
+    assert sink.buffer.getvalue().decode('utf-8') == expected
+    assert sink.writes > 1
@@ -0,0 +1,73 @@
+import time
+
+import requests
+from laceworksdk.exceptions import ApiError
+
+from benchmarks.mock_lacework_api import MockLaceworkAPI
+from modules.lacework_interface import LaceworkInterface
+from modules.request_executor import RateLimiter, RetryPolicy, get_retry_after, is_retryable
+from modules.utils import LaceworkTime
+
+start_time = LaceworkTime('7:0').generate_time_string()
+end_time = LaceworkTime('0:0').generate_time_string()
+fast_policies = {name: RetryPolicy(attempts=10, initial_wait=0.01, max_wait=0.05)
+                 for name in ('default', 'search', 'next_page', 'queries')}
+
+
+def make_api_error(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response.request = requests.Request('GET', 'https://test.lacework.net/api/v2/Alerts').prepare()
+    return ApiError(response)
+
+
+def test_retryable_errors_and_retry_after():
+    assert is_retryable(make_api_error(503))
+    assert is_retryable(make_api_error(429))
+    assert is_retryable(requests.ConnectionError())
+    assert not is_retryable(make_api_error(400))
+    assert not is_retryable(KeyError('data'))
+    assert get_retry_after(make_api_error(429, {'Retry-After': '7'})) == 7
+    assert get_retry_after(make_api_error(429)) is None
+    assert get_retry_after(make_api_error(503, {'Retry-After': '7'})) is None
+
+
+def test_rate_limiter_pause_holds_back_requests():
+    rate_limiter = RateLimiter(rate=1000, capacity=10)
+    rate_limiter.pause(0.2)
+    start = time.monotonic()
+    rate_limiter.acquire()
+    assert time.monotonic() - start >= 0.19
+
+
+def mock_interface(api):
+    lacework_interface = LaceworkInterface(lacework_client=api.client())
+    lacework_interface.request_executor.policies.update(fast_policies)
+    lacework_interface.request_executor.rate_limiter = RateLimiter(rate=1000, capacity=100)
+    api.reset_stats()
+    return lacework_interface
+
+
+def expected_vulns(api, dataset):
+    return [record for record in api.records[dataset] if record['severity'] in ("Critical", "High", "Medium")]
+
+
+def test_failed_pages_are_retried_without_restarting_search():
+    with MockLaceworkAPI(scale=2000, page_size=20, error_rate=0.3) as api:
+        host_vulns = mock_interface(api).get_host_vulns(start_time, end_time)
+        expected = expected_vulns(api, 'host_vulns')
+        assert len(host_vulns.data) == len(expected)
+        stats = api.get_stats()
+        assert stats['injected_errors'] > 0
+        # every page was received exactly once, a failure never restarted the search
+        pages = sum(-(-len([r for r in expected if r['severity'] == severity]) // 20)
+                    for severity in ("Critical", "High", "Medium"))
+        assert stats['by_status']['200'] == pages
+
+
+def test_rate_limited_requests_honor_retry_after():
+    with MockLaceworkAPI(scale=2000, page_size=50, rate_limit=10) as api:
+        container_vulns = mock_interface(api).get_container_vulns(start_time, end_time)
+        assert len(container_vulns.data) == len(expected_vulns(api, 'container_vulns'))
+        assert api.get_stats()['rate_limited'] > 0
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from benchmarks.run_benchmarks import SyntheticLaceworkInterface, SyntheticReport
+from modules.results_store import ResultsStore, section_metrics
+from modules.utils import LaceworkTime
+
+
+def test_section_metrics_and_trends(tmp_path):
+    store = ResultsStore(str(tmp_path / 'results.sqlite'))
+    run_time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for week, critical in enumerate((10, 7, 4)):
+        host_summary = pd.DataFrame({'Severity': ['Critical', 'High'], 'Total CVEs': [critical, 20],
+                                     'Hosts Affected': [2, 5]})
+        compliance_summary = pd.DataFrame({'Critical': [critical, 1], 'High': [3, None]}, index=['111', '222'])
+        sections = {
+            'host_vulns_data': {'hosts_scanned_count': 50, 'host_vulns_summary': host_summary},
+            'aws_compliance_data': {'cloud_accounts_count': 2, 'summary_by_account': compliance_summary},
+            'azure_compliance_data': False,
+            'alerts_data': None
+        }
+        store.record_run('customer', 'CSA', sections, run_time=run_time + timedelta(weeks=week))
+    store.record_run('other customer', 'CSA', {'alerts_data': None})
+
+    assert len(store.runs('customer')) == 3
+    cves = store.trends('customer', 'cves')
+    assert list(cves.columns) == ['Critical', 'High']
+    assert list(cves['Critical']) == [10, 7, 4]
+    # summed over the accounts, the missing High count of the second account is not recorded
+    resources = store.trends('customer', 'non_compliant_resources', severities=('Critical',))
+    assert list(resources['Critical']) == [11, 8, 5]
+    assert list(store.trends('customer', 'alerts')['Total']) == [0, 0, 0]
+    assert store.trends('customer', 'cves', days=30).empty
+    assert section_metrics('azure_compliance_data', False) == []
+    store.close()
+
+
+def test_report_trends_from_recorded_runs(tmp_path):
+    pytest.importorskip('kaleido')
+    store = ResultsStore(str(tmp_path / 'results.sqlite'))
+    report = SyntheticReport(SyntheticLaceworkInterface(100))
+    report.gather(LaceworkTime('7:0'), LaceworkTime('0:0'), LaceworkTime('7:0'), LaceworkTime('0:0'))
+    report.record_results(store, 'customer')
+    # a single run has no trend
+    assert report.gather_trend_data(store, 'customer') is False
+    report.record_results(store, 'customer')
+    report.trend_data = report.gather_trend_data(store, 'customer')
+    assert report.trend_data['run_count'] == 2
+    critical_cves = report.host_vulns_data['host_vulns_summary'].set_index('Severity').loc['Critical', 'Total CVEs']
+    assert list(report.trend_data['trend_summary']['Critical host vulnerabilities']) == [critical_cves] * 2
+    assert 'Trends Since' in report.render('Customer', 'Author')
+    store.close()
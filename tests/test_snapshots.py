@@ -0,0 +1,51 @@
+import json
+
+import pandas as pd
+import pytest
+
+from benchmarks.run_benchmarks import SyntheticLaceworkInterface, SyntheticReport, basedir
+from modules.reports.reportgen_csa import ReportGenCSA
+from modules.reports.reportgen_csa_detailed import ReportGenCSADetailed
+from modules.utils import LaceworkTime
+
+pytest.importorskip('pyarrow')
+pytest.importorskip('kaleido')
+
+
+@pytest.fixture(scope='module')
+def gathered_report():
+    report = SyntheticReport(SyntheticLaceworkInterface(300))
+    report.gather(LaceworkTime('7:0'), LaceworkTime('0:0'), LaceworkTime('7:0'), LaceworkTime('0:0'))
+    report.get_current_date = lambda: 'DATE'
+    return report
+
+
+def test_report_rendered_from_snapshot_matches(gathered_report, tmp_path):
+    gathered_report.save_snapshot(tmp_path, vulns_start_time='2024-01-01T00:00:00Z')
+
+    # no Lacework connection is made, credentials are not needed
+    report = ReportGenCSADetailed(basedir)
+    metadata = report.load_snapshot(tmp_path)
+    assert report._lacework_interface is None
+    assert metadata['report'] == 'CSA_Detailed'
+    assert metadata['vulns_start_time'] == '2024-01-01T00:00:00Z'
+    report.get_current_date = lambda: 'DATE'
+    for name in ('host_vulns_data', 'container_vulns_data'):
+        for key, value in getattr(gathered_report, name).items():
+            if isinstance(value, pd.DataFrame):
+                pd.testing.assert_frame_equal(getattr(report, name)[key], value)
+    for pdf in (False, True):
+        assert report.render('Customer', 'Author', pagesize='a2', pdf=pdf) == \
+            gathered_report.render('Customer', 'Author', pagesize='a2', pdf=pdf)
+
+
+def test_snapshot_checks_report_and_version(gathered_report, tmp_path):
+    gathered_report.save_snapshot(tmp_path)
+    with pytest.raises(ValueError):
+        ReportGenCSA(basedir).load_snapshot(tmp_path)
+    snapshot_file = tmp_path / 'snapshot.json'
+    snapshot = json.loads(snapshot_file.read_text())
+    snapshot['format_version'] = 0
+    snapshot_file.write_text(json.dumps(snapshot))
+    with pytest.raises(ValueError):
+        ReportGenCSADetailed(basedir).load_snapshot(tmp_path)